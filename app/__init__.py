@@ -1,6 +1,34 @@
-from .ecg_processor import ECGProcessor
-from .model_handler import ECGModel
-from .visualizer import Visualizer
-from .interface import ECGGradioApp
+import importlib
 
-__all__ = ["ECGProcessor", "ECGModel", "Visualizer", "ECGGradioApp"]
+# Submodules are imported on first attribute access, so `import app` does not pull in
+# TensorFlow, ml4h, Gradio or matplotlib until the class that needs them is used
+_LAZY_ATTRIBUTES = {
+    "ECGProcessor": ".ecg_processor",
+    "ECGModel": ".model_handler",
+    "BatchingPredictor": ".model_handler",
+    "Visualizer": ".visualizer",
+    "ECGGradioApp": ".interface",
+    "PredictionCache": ".prediction_cache",
+    "PackedECGDataset": ".packed_dataset",
+    "ReplicaPool": ".replica_pool",
+    "InferenceAPI": ".api",
+    "StreamingScorer": ".streaming",
+    "ModelRegistry": ".model_registry",
+    "EmbeddingStore": ".embedding_store",
+    "AdmissionController": ".admission",
+}
+
+__all__ = list(_LAZY_ATTRIBUTES)
+
+
+def __getattr__(name):
+    module_name = _LAZY_ATTRIBUTES.get(name)
+    if module_name is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(module_name, __name__), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(list(globals()) + __all__)
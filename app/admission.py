@@ -0,0 +1,263 @@
+from app.metrics import timed
+import collections
+import contextlib
+import contextvars
+import logging
+import threading
+import time
+
+# Initialize logger for the AdmissionController
+logger = logging.getLogger(__name__)
+
+# The controller and monotonic deadline of the request running in the current context
+_CURRENT_ADMISSION = contextvars.ContextVar("current_admission", default=None)
+
+
+class ServerBusy(RuntimeError):
+    """
+    Raised when a request is shed because the server is overloaded or the request ran out of time.
+
+    Attributes:
+        reason (str): "queue_full", "deadline" (expired while queued) or "expired" (expired before the model ran).
+        retry_after (float): The suggested number of seconds to wait before retrying.
+    """
+
+    def __init__(self, message, reason, retry_after=1.0):
+        super().__init__(message)
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class Ticket:
+    """
+    A place in the admission queue, reserved by `AdmissionController.reserve` and redeemed by `enter`.
+
+    Attributes:
+        deadline (float): The `time.monotonic` time after which the request is dropped.
+    """
+
+    __slots__ = ("deadline", "used")
+
+    def __init__(self, deadline):
+        self.deadline = deadline
+        self.used = False
+
+
+class AdmissionController:
+    """
+    Bounds the number of requests in the processing and inference stages and the number waiting for them.
+
+    At most `max_concurrency` requests run at once and at most `max_queue` more wait for a slot. A request
+    arriving when the queue is full is shed right away with `ServerBusy`, so bursts fail fast instead of
+    building an unbounded backlog. Every admitted request carries a deadline: it is dropped if it is still
+    queued when the deadline passes, and `check_deadline` drops it between stages before the model runs.
+
+    Reserving a place and waiting for a slot are separate steps, so an async handler can reserve on the event
+    loop, answering overload at once, and wait on a worker thread. A handler that gives up before the ticket is
+    entered, e.g. because the client disconnected, hands its place back with `cancel`.
+
+    Attributes:
+        max_concurrency (int): The number of requests in the guarded stages at the same time.
+        max_queue (int): The number of requests waiting for a slot.
+        deadline_seconds (float): The default time budget of a request, measured from its reservation.
+        retry_after (float): The retry delay suggested to shed clients, in seconds.
+    """
+
+    def __init__(self, max_concurrency=4, max_queue=16, deadline_seconds=30.0, retry_after=1.0):
+        """
+        Initialize the AdmissionController.
+
+        Args:
+            max_concurrency (int): The number of requests in the guarded stages at the same time. Defaults to 4.
+            max_queue (int): The number of requests waiting for a slot. Defaults to 16.
+            deadline_seconds (float): The default time budget of a request. Defaults to 30.
+            retry_after (float): The retry delay suggested to shed clients, in seconds. Defaults to 1.
+        """
+        self.max_concurrency = max(1, int(max_concurrency))
+        self.max_queue = max(0, int(max_queue))
+        self.deadline_seconds = float(deadline_seconds)
+        self.retry_after = float(retry_after)
+        self._condition = threading.Condition()
+        self._active = 0
+        self._waiting = 0
+        self._admitted = 0
+        self._shed = collections.Counter()
+        logger.info(
+            "AdmissionController initialized with max_concurrency: %s, max_queue: %s, deadline_seconds: %s",
+            self.max_concurrency, self.max_queue, self.deadline_seconds,
+        )
+
+    @contextlib.contextmanager
+    def admit(self, deadline_seconds=None):
+        """
+        Reserve a place and wait for a slot, holding it for the duration of the block.
+
+        Args:
+            deadline_seconds (float, optional): The time budget of the request. Defaults to `deadline_seconds`.
+
+        Yields:
+            float: The `time.monotonic` deadline of the request.
+
+        Raises:
+            ServerBusy: If the queue is full or the deadline passes while waiting.
+        """
+        with self.enter(self.reserve(deadline_seconds)) as deadline:
+            yield deadline
+
+    def reserve(self, deadline_seconds=None):
+        """
+        Reserve a place in the queue without blocking. The ticket must be passed to `enter`.
+
+        Args:
+            deadline_seconds (float, optional): The time budget of the request. Defaults to `deadline_seconds`.
+
+        Returns:
+            Ticket: The reservation.
+
+        Raises:
+            ServerBusy: If the running and waiting requests already fill the slots and the queue.
+        """
+        budget = self.deadline_seconds if deadline_seconds is None else deadline_seconds
+        with self._condition:
+            if self._active + self._waiting >= self.max_concurrency + self.max_queue:
+                self._record_shed("queue_full")
+                raise ServerBusy("The server is busy, please retry shortly", "queue_full", self.retry_after)
+            self._waiting += 1
+        return Ticket(time.monotonic() + budget)
+
+    @contextlib.contextmanager
+    def enter(self, ticket):
+        """
+        Wait for a slot with a reserved ticket and hold it for the duration of the block.
+
+        The request's deadline is available to `check_deadline` inside the block.
+
+        Args:
+            ticket (Ticket): The reservation from `reserve`.
+
+        Yields:
+            float: The `time.monotonic` deadline of the request.
+
+        Raises:
+            ServerBusy: If the deadline passes while waiting.
+            RuntimeError: If the ticket was already entered or cancelled.
+        """
+        with self._condition:
+            if ticket.used:
+                raise RuntimeError("An admission ticket can only be entered once")
+            ticket.used = True
+        self._wait_for_slot(ticket.deadline)
+        token = _CURRENT_ADMISSION.set((self, ticket.deadline))
+        try:
+            yield ticket.deadline
+        finally:
+            _CURRENT_ADMISSION.reset(token)
+            with self._condition:
+                self._active -= 1
+                self._condition.notify()
+
+    def cancel(self, ticket):
+        """
+        Give back the queue place of a ticket that was never entered. Does nothing once it has been entered.
+
+        Args:
+            ticket (Ticket): The reservation from `reserve`.
+
+        Returns:
+            bool: Whether the place was given back.
+        """
+        with self._condition:
+            if ticket.used:
+                return False
+            ticket.used = True
+            self._waiting -= 1
+            self._condition.notify()
+        logger.debug("Cancelled an admission ticket before it was entered")
+        return True
+
+    @timed("admission_wait")
+    def _wait_for_slot(self, deadline):
+        """
+        Block until a slot is free, releasing the reserved place in the queue either way.
+
+        The deadline is checked before every wait and once more before taking a free slot, so a request that
+        expired between `reserve` and `enter` is dropped before it is parsed.
+
+        Args:
+            deadline (float): The `time.monotonic` deadline of the request.
+
+        Raises:
+            ServerBusy: If the deadline passes first.
+        """
+        with self._condition:
+            try:
+                while True:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self._record_shed("deadline")
+                        raise ServerBusy("The request timed out waiting for the server, please retry", "deadline", self.retry_after)
+                    if self._active < self.max_concurrency:
+                        break
+                    self._condition.wait(remaining)
+            finally:
+                self._waiting -= 1
+            self._active += 1
+            self._admitted += 1
+
+    def _record_shed(self, reason):
+        """
+        Count a shed request.
+
+        Args:
+            reason (str): Why the request was shed.
+        """
+        with self._condition:
+            self._shed[reason] += 1
+        logger.info("Shed request: %s", reason)
+
+    def stats(self):
+        """
+        Report the admission counters.
+
+        Returns:
+            dict: The running and waiting requests, the admitted requests and the shed requests per reason.
+        """
+        with self._condition:
+            stats = {"active": self._active, "waiting": self._waiting, "admitted": self._admitted}
+            for reason in ("queue_full", "deadline", "expired"):
+                stats[f"shed_{reason}"] = self._shed[reason]
+        return stats
+
+
+def check_deadline():
+    """
+    Drop the current request if its admission deadline has passed, e.g. between reading an ECG and running the model.
+
+    Does nothing outside an admitted request.
+
+    Raises:
+        ServerBusy: If the deadline has passed.
+    """
+    current = _CURRENT_ADMISSION.get()
+    if current is None:
+        return
+    controller, deadline = current
+    if time.monotonic() > deadline:
+        controller._record_shed("expired")
+        raise ServerBusy("The request timed out before it reached the model, please retry", "expired", controller.retry_after)
+
+
+def admit(controller, deadline_seconds=None):
+    """
+    Admit a request through a controller, or run it unguarded without one.
+
+    Args:
+        controller (AdmissionController): The controller, or None.
+        deadline_seconds (float, optional): The time budget of the request.
+
+    Returns:
+        A context manager holding the admission for the duration of the block.
+    """
+    if controller is None:
+        return contextlib.nullcontext()
+    return controller.admit(deadline_seconds)
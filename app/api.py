@@ -0,0 +1,285 @@
+from concurrent.futures import ThreadPoolExecutor
+from fastapi import APIRouter, Body, HTTPException, Request
+from starlette.datastructures import UploadFile
+from starlette.formparsers import MultiPartException, MultiPartParser
+from app.postprocessing import OutputPostProcessor
+from app.metrics import METRICS
+from app.logging_setup import request_log
+from app.model_registry import lease_model
+from app.admission import ServerBusy, check_deadline
+import asyncio
+import contextlib
+import contextvars
+import functools
+import logging
+import math
+
+# Initialize logger for the InferenceAPI
+logger = logging.getLogger(__name__)
+
+# Name of the multipart form fields holding the uploaded ECG files
+UPLOAD_FIELD = "files"
+
+
+class InferenceAPI:
+    """
+    A headless HTTP endpoint returning the numeric model outputs of uploaded ECG files as JSON.
+
+    The endpoint shares the model, processor and post-processor of an `ECGGradioApp` but renders no charts. Uploads
+    are received on the event loop, so slow clients only hold a connection, and the HD5 parsing and forward pass
+    run on a bounded thread pool. All files of a request go through the model as one batch. With admission control
+    the pool has a thread for every request the controller can admit or queue, so requests wait for a slot in the
+    controller, under their deadline, rather than unseen in the pool's own queue.
+
+    The multipart body is parsed by the handler itself rather than declared as form parameters, which FastAPI
+    would receive and spool in full before the handler runs. The size limit is checked against the declared
+    content length first and then against the bytes received while the body streams in, and the files are
+    kept in memory.
+
+    Attributes:
+        ecg_app (ECGGradioApp): The app whose model, processor and post-processor are used.
+        max_files (int): The maximum number of files per request.
+        max_request_bytes (int): The maximum total upload size per request.
+        max_concurrency (int): The number of requests scored at the same time without admission control.
+        admission (AdmissionController): The admission control shared with the UI, or None.
+    """
+
+    def __init__(self, ecg_app, max_files=32, max_request_bytes=64 << 20, max_concurrency=4, admission=None):
+        """
+        Initialize the InferenceAPI.
+
+        Args:
+            ecg_app (ECGGradioApp): The app whose model, processor and post-processor are used.
+            max_files (int): The maximum number of files per request. Defaults to 32.
+            max_request_bytes (int): The maximum total upload size per request. Defaults to 64 MiB.
+            max_concurrency (int): The number of requests scored at the same time without admission control.
+                Defaults to 4.
+            admission (AdmissionController, optional): Bounds the requests waiting for and in scoring, replacing
+                max_concurrency. Overloaded or expired requests get status 503. Requests are not limited when omitted.
+        """
+        self.ecg_app = ecg_app
+        self.max_files = max(1, int(max_files))
+        self.max_request_bytes = int(max_request_bytes)
+        self.max_concurrency = max(1, int(max_concurrency))
+        self.admission = admission
+        workers = self.max_concurrency
+        if admission is not None:
+            workers = admission.max_concurrency + admission.max_queue
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="ecg-api")
+        logger.info(
+            "InferenceAPI initialized with max_files: %s, max_request_bytes: %s, max_concurrency: %s",
+            self.max_files, self.max_request_bytes, self.max_concurrency,
+        )
+
+    def router(self):
+        """
+        Build the FastAPI router serving `POST /api/predict` and `GET /api/health`, plus `GET /api/models` and
+        `POST /api/models/default` when the app serves a `ModelRegistry`.
+
+        Returns:
+            fastapi.APIRouter: The router to include in the FastAPI app.
+        """
+        router = APIRouter(prefix="/api")
+        router.add_api_route("/predict", self.predict, methods=["POST"])
+        router.add_api_route("/health", self.health, methods=["GET"])
+        if hasattr(self.ecg_app.model, "set_default"):
+            router.add_api_route("/models", self.models, methods=["GET"])
+            router.add_api_route("/models/default", self.set_default_model, methods=["POST"])
+        return router
+
+    async def health(self):
+        """
+        Report that the API is up and which model it serves.
+
+        Returns:
+            dict: The status and the model identity.
+        """
+        return {"status": "ok", "model_id": self.ecg_app.model.model_id}
+
+    async def models(self):
+        """
+        Report the registered model versions with their load time, memory and open leases.
+
+        Returns:
+            dict: The default model name and the stats of every model.
+        """
+        registry = self.ecg_app.model
+        return {"default": registry.default, "models": registry.stats()}
+
+    async def set_default_model(self, name: str = Body(..., embed=True)):
+        """
+        Swap the default model. Requests already running finish on the previous model.
+
+        Args:
+            name (str): The model name, sent as the JSON body {"name": ...}.
+
+        Returns:
+            dict: The new default model name and its identity.
+
+        Raises:
+            HTTPException: 404 if the model is unknown, 409 if its outputs differ from the current default's.
+        """
+        registry = self.ecg_app.model
+        loop = asyncio.get_running_loop()
+        try:
+            # Loading the new model can take a while, so it runs off the event loop and outside the scoring pool
+            await loop.run_in_executor(None, registry.set_default, name)
+        except KeyError:
+            raise HTTPException(404, f"Unknown model: {name}")
+        except ValueError as e:
+            raise HTTPException(409, str(e))
+        return {"default": name, "model_id": registry.model_id}
+
+    async def predict(self, request: Request):
+        """
+        Score the uploaded ECG files.
+
+        Args:
+            request (fastapi.Request): The incoming request, a multipart form with the HD5 files in fields named
+                "files".
+
+        Returns:
+            dict: The model identity and one result per file, in upload order, with the file name and the
+            numeric outputs of `OutputPostProcessor.to_records`.
+
+        Raises:
+            HTTPException: 400 if the Content-Length header is not a non-negative integer, 413 if the request
+            exceeds the size or file count limits, 422 if the body is not a
+            multipart form with files or a file is not a readable ECG, 503 with a Retry-After header if the server
+            is too busy or the request timed out, 500 if inference fails.
+        """
+        with METRICS.time("api_request"), request_log("api") as entry:
+            content_length = request.headers.get("content-length")
+            if content_length is not None:
+                try:
+                    declared_bytes = int(content_length)
+                except ValueError:
+                    declared_bytes = -1
+                if declared_bytes < 0:
+                    logger.warning("Rejected API request with Content-Length %r", content_length)
+                    raise HTTPException(400, "Content-Length must be a non-negative integer")
+                if declared_bytes > self.max_request_bytes:
+                    raise HTTPException(413, f"Request exceeds {self.max_request_bytes} bytes")
+
+            uploads = await self._read_uploads(request, entry)
+            entry["files"] = len(uploads)
+            if len(uploads) > self.max_files:
+                raise HTTPException(413, f"At most {self.max_files} files are accepted per request")
+            names, payloads = zip(*uploads)
+
+            try:
+                return await self._submit(list(payloads), list(names))
+            except ServerBusy as e:
+                entry["status"] = "shed"
+                raise HTTPException(503, str(e), headers={"Retry-After": str(math.ceil(e.retry_after))})
+
+    async def _submit(self, payloads, names):
+        """
+        Reserve an admission for the request and score it on the thread pool.
+
+        The reservation is made on the event loop, so an overloaded server answers at once instead of queueing the
+        upload. If the request is cancelled, e.g. by a client disconnect, or fails before `_score` has entered the
+        ticket, its place in the admission queue is given back.
+
+        Args:
+            payloads (list): The raw bytes of each HD5 file.
+            names (list): The uploaded file names.
+
+        Returns:
+            dict: The result of `_score`.
+
+        Raises:
+            ServerBusy: If the request is shed by the admission control.
+        """
+        loop = asyncio.get_running_loop()
+        ticket = self.admission.reserve() if self.admission is not None else None
+        # Run in a copy of the request context so the stage timings reach the request log line
+        score = functools.partial(contextvars.copy_context().run, self._score, payloads, names, ticket)
+        try:
+            return await loop.run_in_executor(self._executor, score)
+        finally:
+            if ticket is not None:
+                self.admission.cancel(ticket)
+
+    async def _read_uploads(self, request, entry):
+        """
+        Parse the multipart body into memory, aborting as soon as more than `max_request_bytes` have arrived.
+
+        Args:
+            request (fastapi.Request): The incoming request.
+            entry (dict): The request log entry, which receives the number of bytes received.
+
+        Returns:
+            list: The (file name, raw bytes) of each uploaded file, in upload order.
+
+        Raises:
+            HTTPException: 413 if the body exceeds the size limit, 422 if it is not a multipart form with files.
+        """
+        if not request.headers.get("content-type", "").startswith("multipart/form-data"):
+            raise HTTPException(422, f'ECG files must be uploaded as multipart/form-data fields named "{UPLOAD_FIELD}"')
+
+        async def capped_stream():
+            entry["bytes"] = 0
+            async for chunk in request.stream():
+                entry["bytes"] += len(chunk)
+                if entry["bytes"] > self.max_request_bytes:
+                    raise HTTPException(413, f"Request exceeds {self.max_request_bytes} bytes")
+                yield chunk
+
+        parser = MultiPartParser(request.headers, capped_stream())
+        # The body is capped, so files never need to roll over from memory to a temp file
+        parser.max_file_size = parser.spool_max_size = self.max_request_bytes
+        try:
+            form = await parser.parse()
+        except MultiPartException as e:
+            raise HTTPException(422, f"Malformed multipart body: {e.message}")
+        try:
+            uploads = [upload for upload in form.getlist(UPLOAD_FIELD) if isinstance(upload, UploadFile)]
+            if not uploads:
+                raise HTTPException(422, f'No ECG files in fields named "{UPLOAD_FIELD}"')
+            return [(upload.filename, await upload.read()) for upload in uploads]
+        finally:
+            await form.close()
+
+    def _score(self, payloads, names, ticket=None):
+        """
+        Parse the ECG payloads into one batch, run it through the model and convert the outputs to records.
+
+        Args:
+            payloads (list): The raw bytes of each HD5 file.
+            names (list): The uploaded file names, reported in errors and results.
+            ticket (Ticket, optional): The admission reserved for the request, entered before parsing.
+
+        Returns:
+            dict: The identity of the model that scored the batch and one result per file with the file name and
+            its numeric outputs.
+
+        Raises:
+            HTTPException: 422 if a file is not a readable ECG, 500 if inference fails.
+            ServerBusy: If the request is shed by the admission control.
+        """
+        admitted = self.admission.enter(ticket) if ticket is not None else contextlib.nullcontext()
+        with admitted, lease_model(self.ecg_app.model) as model:
+            try:
+                ecg_tensor = self.ecg_app.processor.ecg_as_tensor_many(payloads)
+            except ValueError as e:
+                logger.error("Rejected API upload: %s", e)
+                raise HTTPException(422, "Every file must be an ECG in HD5 format")
+
+            check_deadline()
+            try:
+                predictions = model.predict(ecg_tensor)
+            except Exception as e:
+                logger.error("Error during API prediction: %s", e)
+                raise HTTPException(500, "An error occurred while running the model")
+            model_id = model.model_id
+
+        records = OutputPostProcessor.to_records(self.ecg_app.postprocessor.process(predictions))
+        logger.debug("Scored %d ECG files through the API", len(records))
+        return {"model_id": model_id, "results": [{"file": name, **record} for name, record in zip(names, records)]}
+
+    def close(self):
+        """
+        Shut down the thread pool scoring requests.
+        """
+        self._executor.shutdown(wait=False)
@@ -0,0 +1,340 @@
+from concurrent.futures import ThreadPoolExecutor
+from app.postprocessing import OutputPostProcessor
+import numpy as np
+import collections
+import csv
+import glob
+import logging
+import os
+import time
+
+# Initialize logger for the cohort scorer
+logger = logging.getLogger(__name__)
+
+RESULT_COLUMNS = [
+    "file",
+    "af_risk",
+    "sex_male_prob",
+    "sex_female_prob",
+    "age",
+    "af_yes_prob",
+    "af_no_prob",
+]
+
+
+def list_ecg_files(source):
+    """
+    List the ECG files to score from a directory or a manifest file.
+
+    A directory is searched recursively for `.hd5` files. A manifest is a text file with one ECG path per line;
+    blank lines and lines starting with `#` are ignored and relative paths are resolved against the manifest's directory.
+
+    Args:
+        source (str): A directory containing HD5 files or the path to a manifest file.
+
+    Returns:
+        list: The sorted list of ECG file paths.
+
+    Raises:
+        ValueError: If the source does not exist.
+    """
+    if os.path.isdir(source):
+        files = glob.glob(os.path.join(source, "**", "*.hd5"), recursive=True)
+    elif os.path.isfile(source):
+        base_dir = os.path.dirname(os.path.abspath(source))
+        with open(source) as manifest:
+            lines = [line.strip() for line in manifest]
+        files = [
+            line if os.path.isabs(line) else os.path.join(base_dir, line)
+            for line in lines
+            if line and not line.startswith("#")
+        ]
+    else:
+        raise ValueError(f"ECG source does not exist: {source}")
+    logger.info("Found %d ECG files in %s", len(files), source)
+    return sorted(files)
+
+
+def ecg_source_root(source):
+    """
+    Find the directory the files of an ECG source are identified relative to: the directory itself, or the
+    directory of a manifest file.
+
+    Args:
+        source (str): A directory containing HD5 files or the path to a manifest file.
+
+    Returns:
+        str: The root directory.
+    """
+    return source if os.path.isdir(source) else os.path.dirname(os.path.abspath(source))
+
+
+class CSVResultWriter:
+    """
+    Streams scoring results to a CSV file, appending to an existing file when resuming.
+
+    Attributes:
+        path (str): The path of the CSV file.
+    """
+
+    def __init__(self, path):
+        """
+        Initialize the CSVResultWriter and open the output file for appending.
+
+        Args:
+            path (str): The path of the CSV file.
+        """
+        self.path = path
+        write_header = not os.path.exists(path) or os.path.getsize(path) == 0
+        self._file = open(path, "a", newline="")
+        self._writer = csv.DictWriter(self._file, fieldnames=RESULT_COLUMNS)
+        if write_header:
+            self._writer.writeheader()
+
+    @staticmethod
+    def completed_files(path):
+        """
+        Read the files already scored into an existing CSV output.
+
+        Args:
+            path (str): The path of the CSV file.
+
+        Returns:
+            set: The file paths present in the output.
+        """
+        if not os.path.exists(path):
+            return set()
+        with open(path, newline="") as f:
+            return {row["file"] for row in csv.DictReader(f)}
+
+    def write(self, rows):
+        """
+        Append rows to the CSV file and flush them to disk.
+
+        Args:
+            rows (list): A list of result dictionaries keyed by RESULT_COLUMNS.
+        """
+        self._writer.writerows(rows)
+        self._file.flush()
+
+    def close(self):
+        """
+        Close the CSV file.
+        """
+        self._file.close()
+
+
+class ParquetResultWriter:
+    """
+    Streams scoring results to a directory of Parquet part files, one part per written batch.
+
+    Each run appends new parts, so resuming never rewrites the results of an earlier run.
+
+    Attributes:
+        path (str): The output directory.
+    """
+
+    def __init__(self, path):
+        """
+        Initialize the ParquetResultWriter and create the output directory.
+
+        Args:
+            path (str): The output directory.
+
+        Raises:
+            ImportError: If pyarrow is not installed.
+        """
+        try:
+            import pyarrow
+            import pyarrow.parquet
+        except ImportError as e:
+            raise ImportError("Parquet output requires the pyarrow package") from e
+        self._pa = pyarrow
+        self._pq = pyarrow.parquet
+        self.path = path
+        os.makedirs(path, exist_ok=True)
+        self._part = len(glob.glob(os.path.join(path, "part-*.parquet")))
+
+    @staticmethod
+    def completed_files(path):
+        """
+        Read the files already scored into an existing Parquet output directory.
+
+        Args:
+            path (str): The output directory.
+
+        Returns:
+            set: The file paths present in the output.
+        """
+        parts = sorted(glob.glob(os.path.join(path, "part-*.parquet")))
+        if not parts:
+            return set()
+        import pyarrow.parquet as pq
+
+        completed = set()
+        for part in parts:
+            completed.update(pq.read_table(part, columns=["file"]).column("file").to_pylist())
+        return completed
+
+    def write(self, rows):
+        """
+        Write the rows as a new Parquet part file.
+
+        Args:
+            rows (list): A list of result dictionaries keyed by RESULT_COLUMNS.
+        """
+        if not rows:
+            return
+        table = self._pa.Table.from_pylist(rows)
+        self._pq.write_table(table, os.path.join(self.path, f"part-{self._part:05d}.parquet"))
+        self._part += 1
+
+    def close(self):
+        """
+        Nothing to close; every part file is complete once written.
+        """
+
+
+class CohortScorer:
+    """
+    Scores a cohort of ECG files offline, overlapping HD5 reads with model inference.
+
+    A thread pool reads files through the ECGProcessor ahead of the model, while the main thread feeds
+    fixed-size batches to the ECGModel and streams the post-processed outputs to a result writer.
+
+    Attributes:
+        model (ECGModel): The model used for predictions.
+        processor (ECGProcessor): The processor used for reading ECG files.
+        batch_size (int): The number of ECGs per forward pass.
+        num_workers (int): The number of reader threads.
+        prefetch_batches (int): The number of batches read ahead of the model.
+    """
+
+    def __init__(self, ecg_model, ecg_processor, batch_size=32, num_workers=4, prefetch_batches=2):
+        """
+        Initialize the CohortScorer.
+
+        Args:
+            ecg_model (ECGModel): The model used for predictions.
+            ecg_processor (ECGProcessor): The processor used for reading ECG files.
+            batch_size (int): The number of ECGs per forward pass. Defaults to 32.
+            num_workers (int): The number of reader threads. Defaults to 4.
+            prefetch_batches (int): The number of batches read ahead of the model. Defaults to 2.
+        """
+        self.model = ecg_model
+        self.processor = ecg_processor
+        self.batch_size = max(1, int(batch_size))
+        self.num_workers = max(1, int(num_workers))
+        self.prefetch_batches = max(1, int(prefetch_batches))
+        self.postprocessor = OutputPostProcessor(ecg_model.model_output_names, ecg_model.output_tensormaps)
+        self.progress_interval = 10.0
+
+    def score(self, ecg_files, writer, completed=None):
+        """
+        Score the ECG files and write one result row per file.
+
+        Files that fail to load are logged and skipped, so a later resumed run retries them.
+
+        Args:
+            ecg_files (list): The paths of the ECG files to score.
+            writer (CSVResultWriter or ParquetResultWriter): The writer receiving the result rows.
+            completed (set, optional): Files already present in the output, which are skipped.
+
+        Returns:
+            dict: A summary with the number of scored, failed and skipped files, elapsed seconds and files per second.
+        """
+        completed = completed or set()
+        pending = [f for f in ecg_files if f not in completed]
+        skipped = len(ecg_files) - len(pending)
+        logger.info("Scoring %d ECG files (%d already completed)", len(pending), skipped)
+
+        batches = [pending[i:i + self.batch_size] for i in range(0, len(pending), self.batch_size)]
+        # One buffer per batch in flight: the batch in the model plus the prefetched ones
+        buffers = [
+            np.empty((self.batch_size, *self.processor.ecg_shape), dtype=np.float32)
+            for _ in range(min(len(batches), self.prefetch_batches + 1))
+        ]
+
+        scored = failed = 0
+        start = last_report = time.monotonic()
+        with ThreadPoolExecutor(max_workers=self.num_workers, thread_name_prefix="ecg-reader") as pool:
+            in_flight = collections.deque()
+            for index in range(len(buffers)):
+                in_flight.append(self._submit_batch(pool, batches[index], buffers[index]))
+
+            for index in range(len(batches)):
+                batch_files, buffer, futures = in_flight.popleft()
+                ok_rows, ok_files = [], []
+                for row, (ecg_file, future) in enumerate(zip(batch_files, futures)):
+                    try:
+                        future.result()
+                        ok_rows.append(row)
+                        ok_files.append(ecg_file)
+                    except Exception as e:
+                        logger.error("Skipping ECG file %s: %s", ecg_file, e)
+                        failed += 1
+
+                if ok_files:
+                    # Without failures the model reads the buffer itself; holes are compacted with one gather
+                    tensors = buffer[: len(batch_files)] if len(ok_rows) == len(batch_files) else buffer[ok_rows]
+                    predictions = self.model.predict(tensors)
+                    writer.write(self._result_rows(ok_files, predictions))
+                    scored += len(ok_files)
+
+                # The buffer is free again, so start reading the next batch into it
+                next_index = index + len(buffers)
+                if next_index < len(batches):
+                    in_flight.append(self._submit_batch(pool, batches[next_index], buffer))
+
+                now = time.monotonic()
+                if now - last_report >= self.progress_interval:
+                    logger.info(
+                        "Scored %d/%d ECG files (%.1f files/s)",
+                        scored, len(pending), scored / (now - start),
+                    )
+                    last_report = now
+
+        elapsed = time.monotonic() - start
+        summary = {
+            "scored": scored,
+            "failed": failed,
+            "skipped": skipped,
+            "elapsed_seconds": elapsed,
+            "files_per_second": scored / elapsed if elapsed > 0 else 0.0,
+        }
+        logger.info("Cohort scoring finished: %s", summary)
+        return summary
+
+    def _submit_batch(self, pool, batch_files, buffer):
+        """
+        Submit one read per file of a batch, each filling its own row of the batch buffer.
+
+        Args:
+            pool (ThreadPoolExecutor): The pool running the reads.
+            batch_files (list): The file paths of the batch.
+            buffer (np.ndarray): The preallocated batch buffer.
+
+        Returns:
+            tuple: The batch files, the buffer and one future per file.
+        """
+        futures = [
+            pool.submit(self.processor.ecg_as_tensor_many, [ecg_file], buffer[row:row + 1])
+            for row, ecg_file in enumerate(batch_files)
+        ]
+        return batch_files, buffer, futures
+
+    def _result_rows(self, batch_files, predictions):
+        """
+        Convert a batch of model outputs into result rows.
+
+        Args:
+            batch_files (list): The file paths of the batch.
+            predictions (list): The model outputs for the batch.
+
+        Returns:
+            list: One result dictionary per file.
+        """
+        records = self.postprocessor.to_records(self.postprocessor.process(predictions))
+        for ecg_file, record in zip(batch_files, records):
+            record["file"] = ecg_file
+        return records
@@ -0,0 +1,85 @@
+from app.model_handler import ECGModel
+from app.ecg_processor import ECGProcessor
+import logging
+import os
+
+# Initialize logger for the shared config helpers
+logger = logging.getLogger(__name__)
+
+# Relative model paths in the config are resolved against the project root
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+
+
+def get_model_path(model_path):
+    """
+    Resolve the correct path for the model. If the provided path is not absolute,
+    convert it to an absolute path relative to the project root directory.
+
+    Args:
+        model_path (str): The model path from the config.
+
+    Returns:
+        str: The absolute model path.
+    """
+    if not os.path.isabs(model_path):
+        model_path = os.path.join(PROJECT_ROOT, model_path)
+
+    return os.path.abspath(model_path)
+
+
+def model_kwargs(config):
+    """
+    Collect the ECGModel keyword arguments from the `inference` section of the config.
+
+    Args:
+        config (dict): The application config.
+
+    Returns:
+        dict: The inference mode, warmup and export cache settings.
+    """
+    inference_config = config.get("inference", {})
+    return {
+        "inference_mode": inference_config.get("mode", "compiled"),
+        "warmup": inference_config.get("warmup", True),
+        "saved_model_dir": inference_config.get("saved_model_dir"),
+        "use_saved_model": inference_config.get("saved_model_cache", True),
+        "tflite_path": inference_config.get("tflite_path"),
+        "tflite_threads": inference_config.get("tflite_threads"),
+    }
+
+
+def build_ecg_model(config, model_path=None, **overrides):
+    """
+    Load an ECGModel with the inference settings of the config.
+
+    Args:
+        config (dict): The application config.
+        model_path (str, optional): The model to load, absolute or relative to the project root. Defaults to the
+            config's `model_path`.
+        **overrides: ECGModel keyword arguments that take precedence over the config.
+
+    Returns:
+        ECGModel: The loaded model.
+    """
+    model_path = get_model_path(model_path or config["model_path"])
+    logger.debug("Building ECGModel for %s with overrides %s", model_path, overrides)
+    return ECGModel(model_path, **{**model_kwargs(config), **overrides})
+
+
+def build_processor(config):
+    """
+    Create the ECGProcessor described by the ECG settings of the config.
+
+    Args:
+        config (dict): The application config.
+
+    Returns:
+        ECGProcessor: The processor.
+    """
+    return ECGProcessor(
+        ecg_shape=config["ecg_shape"],
+        ecg_leads=config["ecg_leads"],
+        ecg_hd5_path=config["ecg_hd5_path"],
+        sample_rate=config.get("ecg_sample_rate", 500),
+        default_sample_rate=config.get("ecg_default_sample_rate"),
+    )
@@ -1,22 +1,75 @@
+from app.packed_dataset import PackedECGDataset
+from app.hd5_layout import LEAD_MATRIX_DATASET, LEAD_NAMES_ATTRIBUTE
+from app.metrics import timed
 import numpy as np
+import collections
+import contextlib
 import h5py
+import io
 import logging
 
 # Initialize logger for the ECGProcessor
 logger = logging.getLogger(__name__)
 
+# Every HDF5 file starts with this signature, at offset 0 or at a power of two from 512 when it has a user block
+HDF5_SIGNATURE = b"\x89HDF\r\n\x1a\n"
+
+# Attributes holding the sampling frequency in Hz, looked up on the lead dataset and then on its parent groups
+SAMPLE_RATE_ATTRIBUTES = ("sample_rate", "sampling_frequency", "fs")
+
+# HDF5 type classes of lead datasets that can be read as float32
+NUMERIC_TYPE_CLASSES = (h5py.h5t.INTEGER, h5py.h5t.FLOAT)
+
+
+class _LeadMatrix:
+    """
+    The (samples, leads) dataset of the single-dataset layout written by `relayout_ecg_file`.
+
+    Attributes:
+        dataset (h5py.Dataset): The lead matrix.
+        columns (np.ndarray): The matrix column of each tensor column, or None when they are the same.
+    """
+
+    __slots__ = ("dataset", "columns")
+
+    def __init__(self, dataset, columns):
+        self.dataset = dataset
+        self.columns = columns
+
+    def read(self, start, stop):
+        """
+        Read a range of samples of every lead in tensor column order.
+
+        Args:
+            start (int): The first sample.
+            stop (int): The sample after the last one.
+
+        Returns:
+            np.ndarray: A float32 array of shape (stop - start, leads).
+        """
+        rows = self.dataset[start:stop]
+        if self.columns is not None:
+            rows = rows[:, self.columns]
+        return rows.astype(np.float32, copy=False)
+
 
 class ECGProcessor:
     """
     A class used to process ECG files and convert them into a tensor format.
 
+    Files store either one dataset per lead (`<ecg_hd5_path>/<lead>/instance_0`) or, once rewritten with
+    `scripts/relayout_hd5.py`, a single (samples, leads) dataset at `<ecg_hd5_path>/leads`. The single-dataset
+    layout is detected per file and read with one contiguous read when its lead order matches `ecg_leads`.
+
     Attributes:
         ecg_shape (tuple): The shape of the ECG tensor to be created.
         ecg_leads (dict): A dictionary mapping ECG leads to their corresponding indices.
         ecg_hd5_path (str): The path inside the HD5 file where ECG data is stored.
+        sample_rate (float): The sampling frequency in Hz the model expects.
+        default_sample_rate (float): The sampling frequency assumed for files without a sample rate attribute.
     """
 
-    def __init__(self, ecg_shape, ecg_leads, ecg_hd5_path):
+    def __init__(self, ecg_shape, ecg_leads, ecg_hd5_path, sample_rate=500, default_sample_rate=None):
         """
         Initialize the ECGProcessor with the shape, leads, and HD5 file path.
 
@@ -24,20 +77,30 @@ class ECGProcessor:
             ecg_shape (tuple): The shape of the ECG tensor to be created (e.g., (5000, 12)).
             ecg_leads (dict): A dictionary mapping ECG leads (e.g., {"lead_1": 0}) to indices in the tensor.
             ecg_hd5_path (str): The path inside the HD5 file where the ECG data is located.
+            sample_rate (float): The sampling frequency in Hz the model expects. Defaults to 500.
+            default_sample_rate (float, optional): The sampling frequency assumed for files without a sample rate
+                attribute. Defaults to sample_rate.
         """
         self.ecg_shape = ecg_shape
         self.ecg_leads = ecg_leads
         self.ecg_hd5_path = ecg_hd5_path
+        self.sample_rate = sample_rate
+        self.default_sample_rate = default_sample_rate or sample_rate
         logger.info(
-            "ECGProcessor initialized with shape: %s, leads: %s", ecg_shape, ecg_leads
+            "ECGProcessor initialized with shape: %s, leads: %s, sample rate: %s Hz", ecg_shape, ecg_leads, sample_rate
         )
 
+    @timed("ecg_read")
     def ecg_as_tensor(self, ecg_file):
         """
         Convert the ECG data from an HD5 file into a normalized tensor.
 
+        Recordings at another sampling frequency or of another length are resampled and cropped or padded to
+        `ecg_shape`, see `ecg_as_tensor_many`.
+
         Args:
-            ecg_file (str): The path to the ECG file in HD5 format.
+            ecg_file (str, bytes or file-like): The path to the ECG file in HD5 format, the raw bytes of the file,
+                or a binary file-like object holding it. Bytes and buffers are opened in memory, without a temp file.
 
         Returns:
             np.ndarray: A numpy array containing the normalized ECG data, with an extra dimension for batch size.
@@ -45,25 +108,445 @@ class ECGProcessor:
         Raises:
             ValueError: If there is an error reading or processing the ECG file.
         """
-        logger.info("Processing ECG file: %s", ecg_file)
+        source = self._describe(ecg_file)
+        logger.debug("Processing ECG file: %s", source)
         try:
-            # Open the HD5 file and initialize an empty tensor with the specified shape
-            with h5py.File(ecg_file, "r") as hd5:
-                tensor = np.zeros(self.ecg_shape, dtype=np.float32)
-
-                # Iterate over the ECG leads, loading the corresponding data into the tensor
-                for lead in self.ecg_leads:
-                    data = np.array(hd5[f"{self.ecg_hd5_path}/{lead}/instance_0"])
-                    tensor[:, self.ecg_leads[lead]] = data
-                    logger.debug("Loaded data for lead %s", lead)
-
-                # Normalize the tensor by subtracting the mean and dividing by the standard deviation
-                tensor -= np.mean(tensor)
-                tensor /= np.std(tensor) + 1e-6
-                logger.info("ECG file processed successfully: %s", ecg_file)
-
-            # Add an extra dimension to the tensor for batch size (1 in this case)
-            return np.expand_dims(tensor, axis=0)
+            # Read the leads straight into a batch of one and normalize it in place
+            tensor = np.empty((1, *self.ecg_shape), dtype=np.float32)
+            with self._open_hd5(ecg_file) as hd5:
+                datasets, samples, sample_rate = self._read_header(hd5)
+                if samples == self.ecg_shape[0] and sample_rate == self.sample_rate:
+                    self._read_leads(datasets, tensor, 0)
+                else:
+                    signals = self._read_signals(datasets, self.samples_needed(samples, sample_rate))
+                    tensor[0] = self.adapt_signals(signals[None], sample_rate)[0]
+            self.normalize_batch(tensor)
+            logger.debug("ECG file processed successfully: %s", source)
+            return tensor
         except Exception as e:
             logger.error("Failed to process ECG file: %s", e)
             raise ValueError(f"Failed to process ECG file: {e}")
+
+    @timed("ecg_read_batch")
+    def ecg_as_tensor_many(self, ecg_files, out=None):
+        """
+        Convert several ECG files into a batch of normalized tensors, optionally filling a preallocated buffer.
+
+        The files are read one at a time, and each is closed as soon as its header and signals are read, so the
+        number of open files does not grow with the batch. A malformed file (missing leads, leads of unequal
+        length, non-numeric data or an invalid sample rate) rejects the whole batch with a ValueError naming it.
+
+        Recordings already at `sample_rate` with `ecg_shape[0]` samples are read directly into the rows of the
+        buffer. Of the others only the samples that cover `ecg_shape[0]` samples after resampling are read; they
+        are grouped by sampling frequency and length, and each group is resampled and cropped or padded in one
+        vectorized pass with `adapt_signals`. Each ECG is then normalized in place by subtracting its mean and
+        dividing by its standard deviation, exactly as `ecg_as_tensor` does.
+
+        Args:
+            ecg_files (list): The ECG files in HD5 format, as paths, raw bytes or binary file-like objects.
+            out (np.ndarray, optional): A C-contiguous float32 buffer of shape (N, *ecg_shape) with N >= len(ecg_files).
+                A new buffer is allocated when omitted.
+
+        Returns:
+            np.ndarray: A view of the first len(ecg_files) rows of the buffer containing the normalized ECG data.
+
+        Raises:
+            ValueError: If the buffer does not fit the batch or there is an error reading or processing an ECG file.
+        """
+        batch_shape = (len(ecg_files), *self.ecg_shape)
+        if out is None:
+            out = np.empty(batch_shape, dtype=np.float32)
+        elif (
+            out.dtype != np.float32
+            or not out.flags.c_contiguous
+            or out.shape[1:] != batch_shape[1:]
+            or out.shape[0] < batch_shape[0]
+        ):
+            raise ValueError(
+                f"Output buffer must be a C-contiguous float32 array of shape (>= {batch_shape[0]}, "
+                f"{', '.join(map(str, batch_shape[1:]))}), got {out.dtype} {out.shape}"
+            )
+
+        batch = out[: len(ecg_files)]
+        # Recordings needing adaptation, keyed by (samples, sample rate): lists of (row, signals)
+        pending = collections.defaultdict(list)
+        for index, ecg_file in enumerate(ecg_files):
+            with self._file_errors(ecg_file), self._open_hd5(ecg_file) as hd5:
+                datasets, samples, sample_rate = self._read_header(hd5)
+                if samples == self.ecg_shape[0] and sample_rate == self.sample_rate:
+                    self._read_leads(datasets, batch, index)
+                else:
+                    samples = self.samples_needed(samples, sample_rate)
+                    pending[(samples, sample_rate)].append((index, self._read_signals(datasets, samples)))
+
+        for (samples, sample_rate), rows in pending.items():
+            logger.debug("Adapting %d ECGs of %d samples at %s Hz", len(rows), samples, sample_rate)
+            batch[[index for index, _ in rows]] = self.adapt_signals(np.stack([signals for _, signals in rows]), sample_rate)
+
+        self.normalize_batch(batch)
+        logger.debug("Processed batch of %d ECG files", len(ecg_files))
+        return batch
+
+    def read_header(self, ecg_file):
+        """
+        Validate an ECG file from its HD5 metadata alone and report its length, without reading signal data.
+
+        Args:
+            ecg_file (str, bytes or file-like): The ECG file.
+
+        Returns:
+            dict: The "samples" per lead, the "sample_rate" in Hz and the duration in "seconds".
+
+        Raises:
+            ValueError: If the file cannot be opened or its leads are malformed.
+        """
+        with self._file_errors(ecg_file), self._open_hd5(ecg_file) as hd5:
+            _, samples, sample_rate = self._read_header(hd5)
+        return {"samples": samples, "sample_rate": sample_rate, "seconds": samples / sample_rate}
+
+    def iter_windows(self, ecg_file, stride_seconds=5.0, batch_size=32):
+        """
+        Stream a recording of any length as batches of overlapping, model-ready windows.
+
+        Windows span `ecg_shape[0]` samples at the model's sample rate (10 seconds) and start every `stride_seconds`.
+        When the stride does not reach the end of the recording, a last window is aligned to its end; a recording
+        shorter than one window gives a single zero-padded window. Only the lead samples spanned by one batch of
+        windows are read at a time, into a reused buffer, and the yielded batch is a reused buffer as well, so
+        memory use does not depend on the length of the recording. Each window is resampled if needed and
+        normalized exactly as `ecg_as_tensor` normalizes a 10 second ECG.
+
+        Args:
+            ecg_file (str, bytes or file-like): The ECG file.
+            stride_seconds (float): The time between the starts of consecutive windows. Defaults to 5.0.
+            batch_size (int): The maximum number of windows per batch. Defaults to 32.
+
+        Yields:
+            tuple: The start time in seconds of each window as an (N,) array, and an (N, *ecg_shape) float32 batch
+            that is overwritten by the next batch.
+
+        Raises:
+            ValueError: If the file cannot be opened, its leads are malformed or reading fails.
+        """
+        with self._file_errors(ecg_file), self._open_hd5(ecg_file) as hd5:
+            datasets, samples, sample_rate = self._read_header(hd5)
+            window = int(round(self.ecg_shape[0] * sample_rate / self.sample_rate))
+            stride = max(1, int(round(stride_seconds * sample_rate)))
+            starts = np.arange(0, max(samples - window, 0) + 1, stride)
+            if samples > window and starts[-1] + window < samples:
+                starts = np.append(starts, samples - window)
+            logger.info("Streaming %d windows from ECG file %s", len(starts), self._describe(ecg_file))
+
+            span_buffer = np.empty((self.ecg_shape[1], window + (batch_size - 1) * stride), dtype=np.float32)
+            batch_buffer = np.empty((batch_size, *self.ecg_shape), dtype=np.float32)
+            for first in range(0, len(starts), batch_size):
+                group = starts[first:first + batch_size]
+                span_start = int(group[0])
+                span_length = min(int(group[-1]) + window, samples) - span_start
+                if isinstance(datasets, _LeadMatrix):
+                    span_buffer[:, :span_length] = datasets.read(span_start, span_start + span_length).T
+                else:
+                    for column, dataset in datasets.items():
+                        dataset.read_direct(
+                            span_buffer[column],
+                            source_sel=np.s_[span_start:span_start + span_length],
+                            dest_sel=np.s_[:span_length],
+                        )
+                offsets = group - span_start
+                length = min(window, span_length)
+                signals = np.stack([span_buffer[:, offset:offset + length] for offset in offsets])
+
+                batch = batch_buffer[: len(group)]
+                if length == self.ecg_shape[0] and sample_rate == self.sample_rate:
+                    batch[...] = signals.transpose(0, 2, 1)
+                else:
+                    batch[...] = self.adapt_signals(signals, sample_rate)
+                self.normalize_batch(batch)
+                yield group / sample_rate, batch
+
+    def open_packed(self, prefix):
+        """
+        Open a packed ECG dataset for zero-copy batch reads, checking that it was packed with this processor's layout.
+
+        Args:
+            prefix (str): The path prefix of the dataset written by `pack_ecg_files`.
+
+        Returns:
+            PackedECGDataset: The dataset, whose `batch` and `iter_batches` return model-ready tensors.
+
+        Raises:
+            ValueError: If the dataset cannot be opened or its shape or leads differ from this processor's.
+        """
+        dataset = PackedECGDataset(prefix)
+        if list(dataset.data.shape[1:]) != list(self.ecg_shape) or dataset.index["ecg_leads"] != dict(self.ecg_leads):
+            raise ValueError(f"Packed ECG dataset {prefix} does not match the processor's ECG shape and leads")
+        logger.info("Reading ECGs from packed dataset: %s", prefix)
+        return dataset
+
+    @staticmethod
+    def is_hd5(data):
+        """
+        Check whether raw bytes start like an HDF5 file, without parsing them.
+
+        Args:
+            data (bytes): The raw bytes of the file.
+
+        Returns:
+            bool: True if the HDF5 signature is found at offset 0 or at a user block offset of 512, 1024, ... bytes.
+        """
+        data = memoryview(data)
+        offset = 0
+        while offset + len(HDF5_SIGNATURE) <= len(data):
+            if data[offset:offset + len(HDF5_SIGNATURE)] == HDF5_SIGNATURE:
+                return True
+            offset = offset * 2 if offset else 512
+        return False
+
+    @staticmethod
+    def _open_hd5(ecg_file):
+        """
+        Open an ECG file for reading from a path, raw bytes or a binary file-like object.
+
+        Bytes are wrapped in `io.BytesIO`, which shares an immutable bytes buffer instead of copying it, and h5py reads the
+        image through the file-like object, so in-memory uploads are never written to disk.
+
+        Args:
+            ecg_file (str, bytes or file-like): The ECG file.
+
+        Returns:
+            h5py.File: The open file.
+        """
+        if isinstance(ecg_file, (bytes, bytearray, memoryview)):
+            ecg_file = io.BytesIO(ecg_file)
+        return h5py.File(ecg_file, "r")
+
+    @staticmethod
+    def _describe(ecg_file):
+        """
+        Describe an ECG file for log and error messages without dumping in-memory contents.
+
+        Args:
+            ecg_file (str, bytes or file-like): The ECG file.
+
+        Returns:
+            str: The path, the name of the file-like object, or the size of in-memory bytes.
+        """
+        if isinstance(ecg_file, (bytes, bytearray, memoryview)):
+            return f"<{memoryview(ecg_file).nbytes} bytes in memory>"
+        return str(getattr(ecg_file, "name", None) or ecg_file)
+
+    @contextlib.contextmanager
+    def _file_errors(self, ecg_file):
+        """
+        Log errors raised while reading an ECG file and re-raise them as ValueError naming the file.
+
+        Args:
+            ecg_file (str, bytes or file-like): The ECG file being read.
+        """
+        try:
+            yield
+        except Exception as e:
+            source = self._describe(ecg_file)
+            logger.error("Failed to process ECG file %s: %s", source, e)
+            raise ValueError(f"Failed to process ECG file {source}: {e}")
+
+    def _read_header(self, hd5):
+        """
+        Validate the lead datasets of an open HD5 file from their metadata alone, without reading signal data.
+
+        Args:
+            hd5 (h5py.File): The open ECG file.
+
+        Returns:
+            tuple: The lead datasets keyed by tensor column, or the `_LeadMatrix` of the single-dataset layout, the
+            number of samples per lead and the sampling frequency.
+
+        Raises:
+            ValueError: If a lead is missing or not a non-empty 1-D numeric dataset, the leads differ in length,
+                or the sample rate attribute is not a positive number.
+        """
+        lead_matrix = hd5.get(f"{self.ecg_hd5_path}/{LEAD_MATRIX_DATASET}")
+        if isinstance(lead_matrix, h5py.Dataset):
+            return self._read_matrix_header(lead_matrix)
+
+        datasets = {}
+        for lead, column in self.ecg_leads.items():
+            name = f"{self.ecg_hd5_path}/{lead}/instance_0"
+            try:
+                dataset = hd5[name]
+            except KeyError:
+                raise ValueError(f"Missing lead dataset {name}")
+            # The low-level shape and type class avoid building a numpy dtype for every lead
+            shape = dataset.id.shape if isinstance(dataset, h5py.Dataset) else None
+            if shape is None or len(shape) != 1 or shape[0] == 0 or dataset.id.get_type().get_class() not in NUMERIC_TYPE_CLASSES:
+                raise ValueError(f"Lead dataset {name} must be a non-empty 1-D numeric array")
+            datasets[column] = dataset
+
+        lengths = {dataset.id.shape[0] for dataset in datasets.values()}
+        if len(lengths) > 1:
+            raise ValueError(f"Leads have different numbers of samples: {sorted(lengths)}")
+        return datasets, lengths.pop(), self._sample_rate_of(next(iter(datasets.values())))
+
+    def _read_matrix_header(self, dataset):
+        """
+        Validate the lead matrix of the single-dataset layout and map its columns to tensor columns.
+
+        Args:
+            dataset (h5py.Dataset): The (samples, leads) dataset.
+
+        Returns:
+            tuple: The `_LeadMatrix`, the number of samples per lead and the sampling frequency.
+
+        Raises:
+            ValueError: If the dataset is not a non-empty 2-D numeric array, its lead names are missing or do not
+                match its columns, a lead is missing, or the sample rate attribute is not a positive number.
+        """
+        shape = dataset.id.shape
+        if len(shape) != 2 or shape[0] == 0 or dataset.id.get_type().get_class() not in NUMERIC_TYPE_CLASSES:
+            raise ValueError(f"Lead matrix {dataset.name} must be a non-empty 2-D numeric array")
+        names = [name.decode() if isinstance(name, bytes) else str(name) for name in dataset.attrs.get(LEAD_NAMES_ATTRIBUTE, [])]
+        if len(names) != shape[1]:
+            raise ValueError(f"Lead matrix {dataset.name} must name each of its {shape[1]} columns in {LEAD_NAMES_ATTRIBUTE}")
+
+        positions = {name: position for position, name in enumerate(names)}
+        columns = np.empty(self.ecg_shape[1], dtype=np.intp)
+        for lead, column in self.ecg_leads.items():
+            if lead not in positions:
+                raise ValueError(f"Missing lead {lead} in lead matrix {dataset.name}")
+            columns[column] = positions[lead]
+        if shape[1] == self.ecg_shape[1] and np.array_equal(columns, np.arange(shape[1])):
+            columns = None
+        return _LeadMatrix(dataset, columns), shape[0], self._sample_rate_of(dataset)
+
+    def _sample_rate_of(self, dataset):
+        """
+        Find the sampling frequency of a lead in the attributes of its dataset or of the groups above it.
+
+        Args:
+            dataset (h5py.Dataset): A lead dataset.
+
+        Returns:
+            float: The sampling frequency in Hz, or `default_sample_rate` when no attribute is set.
+
+        Raises:
+            ValueError: If the attribute is not a positive number.
+        """
+        node = dataset
+        while True:
+            attrs = node.attrs
+            for attribute in SAMPLE_RATE_ATTRIBUTES:
+                if attribute in attrs:
+                    value = attrs[attribute]
+                    try:
+                        sample_rate = float(np.asarray(value).reshape(-1)[0])
+                    except (TypeError, ValueError, IndexError):
+                        sample_rate = float("nan")
+                    if not np.isfinite(sample_rate) or sample_rate <= 0:
+                        raise ValueError(f"Invalid {attribute} attribute on {node.name}: {value!r}")
+                    return sample_rate
+            if node.name == "/":
+                return self.default_sample_rate
+            node = node.parent
+
+    def samples_needed(self, samples, sample_rate):
+        """
+        Count the leading samples of a recording that `adapt_signals` keeps, so longer recordings are cropped
+        before they are read and resampled.
+
+        Args:
+            samples (int): The number of samples per lead of the recording.
+            sample_rate (float): The sampling frequency of the recording in Hz.
+
+        Returns:
+            int: The number of samples covering `ecg_shape[0]` samples at `sample_rate`, at most `samples`.
+        """
+        return min(samples, int(np.ceil(self.ecg_shape[0] * sample_rate / self.sample_rate)))
+
+    def adapt_signals(self, signals, sample_rate):
+        """
+        Resample a batch of recordings to `sample_rate` and crop or pad them to `ecg_shape[0]` samples.
+
+        Resampling is done in the frequency domain, for all recordings and leads at once: the real FFT of each
+        lead is truncated or zero-extended to the new length and inverted. This is band-limited, so downsampling
+        does not alias. Longer recordings keep their first `ecg_shape[0]` samples, shorter ones are padded with zeros.
+
+        Args:
+            signals (np.ndarray): An array of shape (N, leads, samples) holding recordings of equal length.
+            sample_rate (float): The sampling frequency of the recordings in Hz.
+
+        Returns:
+            np.ndarray: A float32 array of shape (N, *ecg_shape).
+        """
+        samples = signals.shape[-1]
+        if sample_rate != self.sample_rate:
+            resampled = max(1, int(round(samples * self.sample_rate / sample_rate)))
+            spectrum = np.fft.rfft(signals, axis=-1)
+            bins = min(spectrum.shape[-1], resampled // 2 + 1)
+            resized = np.zeros((*spectrum.shape[:-1], resampled // 2 + 1), dtype=spectrum.dtype)
+            resized[..., :bins] = spectrum[..., :bins]
+            signals = np.fft.irfft(resized, resampled, axis=-1) * (resampled / samples)
+            samples = resampled
+
+        length = self.ecg_shape[0]
+        adapted = np.zeros((len(signals), *self.ecg_shape), dtype=np.float32)
+        adapted[:, : min(samples, length)] = signals[..., :length].transpose(0, 2, 1)
+        return adapted
+
+    def _read_signals(self, datasets, samples):
+        """
+        Read the first samples of every lead of a recording into a (leads, samples) array.
+
+        Args:
+            datasets (dict or _LeadMatrix): The lead datasets keyed by tensor column, or the lead matrix, from
+                `_read_header`.
+            samples (int): The number of samples to read per lead, at most the length of the recording.
+
+        Returns:
+            np.ndarray: The float32 signals, one row per tensor column.
+        """
+        if isinstance(datasets, _LeadMatrix):
+            return np.ascontiguousarray(datasets.read(0, samples).T)
+        signals = np.zeros((self.ecg_shape[1], samples), dtype=np.float32)
+        for column, dataset in datasets.items():
+            dataset.read_direct(signals[column], source_sel=np.s_[:samples])
+        return signals
+
+    def _read_leads(self, datasets, batch, index):
+        """
+        Read every lead of a recording with the model's layout into one row of a batch buffer.
+
+        A lead matrix in tensor column order already has the row's layout and is read into it with one direct read.
+        Otherwise each lead is read directly into its column of the row, without intermediate copies.
+
+        Args:
+            datasets (dict or _LeadMatrix): The lead datasets keyed by tensor column, or the lead matrix, from
+                `_read_header`.
+            batch (np.ndarray): The C-contiguous float32 batch buffer.
+            index (int): The row of the buffer to fill.
+        """
+        if isinstance(datasets, _LeadMatrix):
+            if datasets.columns is None:
+                datasets.dataset.read_direct(batch[index])
+            else:
+                batch[index] = datasets.read(0, self.ecg_shape[0])
+            return
+        for column, dataset in datasets.items():
+            dataset.read_direct(batch, dest_sel=np.s_[index, :, column])
+
+    @staticmethod
+    def normalize_batch(batch):
+        """
+        Normalize every ECG of a batch in place to zero mean and unit standard deviation.
+
+        Args:
+            batch (np.ndarray): A float32 array of shape (N, samples, leads).
+
+        Returns:
+            np.ndarray: The same array, normalized.
+        """
+        batch -= batch.mean(axis=(1, 2), keepdims=True)
+
+        # The data is centered, so the variance is the mean of the squares; einsum avoids a full-size temporary
+        std = np.einsum("ijk,ijk->i", batch, batch) / (batch.shape[1] * batch.shape[2])
+        std = np.sqrt(std, out=std) + 1e-6
+        batch /= std.astype(batch.dtype)[:, None, None]
+        return batch
@@ -0,0 +1,343 @@
+from app.packed_dataset import file_id_of
+import numpy as np
+import json
+import logging
+import os
+
+# Initialize logger for the embedding store
+logger = logging.getLogger(__name__)
+
+INDEX_VERSION = 1
+
+# Rows scored per block in a search, bounding the temporary score matrix to this many rows per query
+SEARCH_BLOCK_ROWS = 1 << 16
+
+
+def embedding_paths(prefix):
+    """
+    Build the data, ID and index paths of an embedding store.
+
+    Args:
+        prefix (str): The path prefix of the store, e.g. "data/cohort_embeddings".
+
+    Returns:
+        tuple: The path of the float32 data file, the path of the ID file and the path of the JSON index.
+    """
+    return f"{prefix}.f32", f"{prefix}.ids", f"{prefix}.index.json"
+
+
+def normalize_rows(vectors):
+    """
+    Scale vectors to unit length so cosine similarity becomes a dot product. Zero vectors stay zero.
+
+    Args:
+        vectors (np.ndarray): An array of shape (n, dim).
+
+    Returns:
+        np.ndarray: The float32 unit vectors.
+    """
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.maximum(norms, np.finfo(np.float32).tiny)
+
+
+def iter_file_batches(ecg_files, processor, batch_size=64, root=None):
+    """
+    Read ECG files in batches of normalized tensors, leaving out files that fail to load.
+
+    Args:
+        ecg_files (list): The paths of the ECG files.
+        processor (ECGProcessor): The processor used to read and normalize the ECGs.
+        batch_size (int): The number of files read per batch. Defaults to 64.
+        root (str, optional): The cohort root the file IDs are relative to, see `file_id_of`.
+
+    Yields:
+        tuple: The file IDs of a batch and its tensor of shape (n, samples, leads). The tensor is reused.
+    """
+    buffer = np.empty((batch_size, *processor.ecg_shape), dtype=np.float32)
+    for start in range(0, len(ecg_files), batch_size):
+        batch_files = ecg_files[start:start + batch_size]
+        try:
+            tensor = processor.ecg_as_tensor_many(batch_files, out=buffer)
+        except ValueError:
+            tensor = None
+        if tensor is not None:
+            yield [file_id_of(f, root) for f in batch_files], tensor
+            continue
+
+        # Fall back to one file at a time so a single bad file only drops itself
+        loaded = []
+        for ecg_file in batch_files:
+            try:
+                processor.ecg_as_tensor_many([ecg_file], out=buffer[len(loaded):len(loaded) + 1])
+            except ValueError as e:
+                logger.error("Skipping ECG file %s: %s", ecg_file, e)
+                continue
+            loaded.append(file_id_of(ecg_file, root))
+        if loaded:
+            yield loaded, buffer[:len(loaded)]
+
+
+def build_embeddings(model, store, batches):
+    """
+    Embed batches of ECGs and append them to a store, skipping ECGs it already holds so a build can be resumed.
+
+    An ID repeated within a batch, e.g. a file listed twice in a manifest, is embedded once.
+
+    Args:
+        model (ECGModel): The model computing the embeddings.
+        store (EmbeddingStore): The store receiving the embeddings.
+        batches (iterable): Tuples of IDs and their normalized ECG tensor, e.g. from `iter_file_batches`.
+
+    Returns:
+        dict: The number of embedded and skipped ECGs.
+    """
+    embedded = skipped = 0
+    for ids, tensor in batches:
+        new_rows, seen = [], set()
+        for row, file_id in enumerate(ids):
+            if file_id not in store and file_id not in seen:
+                new_rows.append(row)
+                seen.add(file_id)
+        skipped += len(ids) - len(new_rows)
+        if not new_rows:
+            continue
+        if len(new_rows) < len(ids):
+            ids, tensor = [ids[row] for row in new_rows], tensor[new_rows]
+        store.append(ids, model.embed(tensor))
+        embedded += len(ids)
+        logger.info("Embedded %d ECGs into %s", len(store), store.prefix)
+    return {"embedded": embedded, "skipped": skipped}
+
+
+class EmbeddingStore:
+    """
+    An append-only store of ECG embeddings on disk with a vectorized top-k cosine similarity search.
+
+    Embeddings are stored L2-normalized as one contiguous float32 array, memory-mapped for reading, so a search is
+    a blocked matrix product over the mapping followed by a partial sort, without loading the store into memory.
+    IDs are kept in a text file with one ID per line. Both files are appended to and the JSON index records the
+    committed row count last. Opening a store only reads the committed rows and never modifies its files, so it
+    can be searched while a build appends to it. Rows left behind by an interrupted append are rolled back by the
+    next writer on its first append. A store has one writer at a time.
+
+    Attributes:
+        prefix (str): The path prefix of the store.
+        dim (int): The embedding dimension, or None until the first append to a new store.
+        model_id (str): The identity of the model that computed the embeddings, or None if unknown.
+        ids (list): The IDs in row order.
+    """
+
+    def __init__(self, prefix, model_id=None):
+        """
+        Open an embedding store, creating it on the first append if it does not exist.
+
+        Args:
+            prefix (str): The path prefix of the store.
+            model_id (str, optional): The identity of the model computing new embeddings, checked against the
+                store's so embeddings of different models are never mixed.
+
+        Raises:
+            ValueError: If the index has an unsupported version, the data is shorter than the index records or
+                the store was built with another model.
+        """
+        self.prefix = prefix
+        self._data_path, self._ids_path, self._index_path = embedding_paths(prefix)
+        self.dim = None
+        self.model_id = model_id
+        self.ids = []
+        self.data = np.empty((0, 0), dtype=np.float32)
+        self._rolled_back = False
+
+        if os.path.exists(self._index_path):
+            self._open_existing(model_id)
+        self._rows_by_id = {file_id: row for row, file_id in enumerate(self.ids)}
+        logger.info("Opened embedding store %s with %d embeddings", prefix, len(self.ids))
+
+    def _open_existing(self, model_id):
+        """
+        Read the index and the committed IDs of an existing store, ignoring rows appended after the last index.
+
+        Args:
+            model_id (str): The identity of the model computing new embeddings, or None.
+        """
+        with open(self._index_path) as f:
+            index = json.load(f)
+        if index.get("version") != INDEX_VERSION:
+            raise ValueError(f"Unsupported embedding index version: {index.get('version')}")
+        if model_id is not None and index.get("model_id") not in (None, model_id):
+            raise ValueError(f"Embedding store {self.prefix} was built with model {index['model_id']}, not {model_id}")
+
+        count, self.dim = index["count"], index["dim"]
+        self.model_id = model_id or index.get("model_id")
+        row_bytes = self.dim * np.dtype(np.float32).itemsize
+        if os.path.getsize(self._data_path) < count * row_bytes:
+            raise ValueError(f"Embedding data {self._data_path} is shorter than the {count} rows in its index")
+        with open(self._ids_path, encoding="utf-8") as f:
+            self.ids = [line.rstrip("\n") for _, line in zip(range(count), f)]
+        if len(self.ids) < count:
+            raise ValueError(f"Embedding IDs {self._ids_path} are shorter than the {count} rows in its index")
+        self._map()
+
+    def _roll_back(self):
+        """
+        Truncate the data and ID files to the committed rows, dropping an append interrupted before its index was
+        written, so the next append starts right after the committed rows.
+        """
+        row_bytes = (self.dim or 0) * np.dtype(np.float32).itemsize
+        committed = (
+            (self._data_path, len(self.ids) * row_bytes),
+            (self._ids_path, sum(len(file_id.encode("utf-8")) + 1 for file_id in self.ids)),
+        )
+        for path, size in committed:
+            if os.path.exists(path) and os.path.getsize(path) > size:
+                logger.warning("Rolling back uncommitted rows of %s", path)
+                os.truncate(path, size)
+        self._rolled_back = True
+
+    def _map(self):
+        """
+        Memory-map the committed rows for reading.
+        """
+        if self.ids:
+            self.data = np.memmap(self._data_path, dtype=np.float32, mode="r", shape=(len(self.ids), self.dim))
+        else:
+            self.data = np.empty((0, self.dim or 0), dtype=np.float32)
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __contains__(self, file_id):
+        return file_id in self._rows_by_id
+
+    def append(self, ids, embeddings):
+        """
+        Normalize and append embeddings, committing them to the index.
+
+        The first append through a store object rolls back rows an interrupted writer left behind.
+
+        Args:
+            ids (list): One unique ID per embedding, e.g. the file IDs of the ECGs. IDs may not contain newlines.
+            embeddings (np.ndarray): An array of shape (len(ids), dim).
+
+        Raises:
+            ValueError: If the shapes do not match, the dimension differs from the store's or an ID is already stored.
+        """
+        embeddings = normalize_rows(embeddings)
+        if embeddings.ndim != 2 or len(embeddings) != len(ids):
+            raise ValueError(f"Expected {len(ids)} embeddings, got an array of shape {embeddings.shape}")
+        if self.dim is not None and embeddings.shape[1] != self.dim:
+            raise ValueError(f"Expected embeddings of dimension {self.dim}, got {embeddings.shape[1]}")
+        duplicates = [file_id for file_id in ids if file_id in self._rows_by_id]
+        if duplicates or len(set(ids)) != len(ids):
+            raise ValueError(f"IDs are already stored or repeated: {duplicates[:5]}")
+        if not len(ids):
+            return
+
+        if not self._rolled_back:
+            self._roll_back()
+        self.dim = embeddings.shape[1]
+        with open(self._data_path, "ab") as f:
+            f.write(embeddings.tobytes())
+        with open(self._ids_path, "a", encoding="utf-8") as f:
+            f.writelines(f"{file_id}\n" for file_id in ids)
+        start = len(self.ids)
+        self.ids.extend(ids)
+        self._rows_by_id.update((file_id, start + i) for i, file_id in enumerate(ids))
+
+        tmp_index_path = f"{self._index_path}.tmp"
+        with open(tmp_index_path, "w") as f:
+            json.dump({"version": INDEX_VERSION, "dim": self.dim, "count": len(self.ids), "model_id": self.model_id}, f)
+        os.replace(tmp_index_path, self._index_path)
+        self._map()
+
+    def vector(self, file_id):
+        """
+        Look up the stored, normalized embedding of an ID.
+
+        Args:
+            file_id (str): The ID.
+
+        Returns:
+            np.ndarray: The unit vector of shape (dim,).
+
+        Raises:
+            KeyError: If the ID is not stored.
+        """
+        return np.array(self.data[self._rows_by_id[file_id]])
+
+    def search(self, queries, k=10, exclude=None):
+        """
+        Find the k stored embeddings most similar to each query by cosine similarity.
+
+        The stored rows are scored in blocks of SEARCH_BLOCK_ROWS with one matrix product per block for all queries,
+        so memory use is bounded however large the store is and a search runs at the speed of one pass over the
+        mapped data. The best k rows are kept with a partial sort.
+
+        Args:
+            queries (np.ndarray): One query of shape (dim,) or several of shape (m, dim). They need not be normalized.
+            k (int): The number of neighbours per query. Defaults to 10.
+            exclude (list, optional): One ID per query to leave out of its results, e.g. the query ECG itself.
+
+        Returns:
+            tuple: The IDs, a list of k IDs per query, and the similarities, an array of shape (m, k), both sorted
+            from most to least similar. A single query of shape (dim,) returns one list and one (k,) array.
+
+        Raises:
+            ValueError: If the query dimension differs from the store's.
+        """
+        single = np.ndim(queries) == 1
+        queries = normalize_rows(np.atleast_2d(queries))
+        excluded = None
+        if exclude is not None:
+            excluded = np.array([self._rows_by_id.get(file_id, -1) for file_id in exclude])
+        k = min(k, len(self) - (excluded is not None))
+        if k <= 0:
+            ids, scores = [[] for _ in queries], np.empty((len(queries), 0), dtype=np.float32)
+            return (ids[0], scores[0]) if single else (ids, scores)
+        if queries.shape[1] != self.dim:
+            raise ValueError(f"Expected queries of dimension {self.dim}, got {queries.shape[1]}")
+
+        best_scores = np.full((len(queries), k), -np.inf, dtype=np.float32)
+        best_rows = np.zeros((len(queries), k), dtype=np.int64)
+        for start in range(0, len(self), SEARCH_BLOCK_ROWS):
+            block = self.data[start:start + SEARCH_BLOCK_ROWS]
+            block_scores = queries @ block.T
+            if excluded is not None:
+                hits = (excluded >= start) & (excluded < start + len(block))
+                block_scores[hits, excluded[hits] - start] = -np.inf
+
+            # Only rows beating a query's current k-th best score can enter its top k, which after the first
+            # block leaves a handful of candidates to partially sort instead of the whole block
+            for query in range(len(queries)):
+                candidates = np.flatnonzero(block_scores[query] > best_scores[query].min())
+                if not len(candidates):
+                    continue
+                scores = np.concatenate([best_scores[query], block_scores[query, candidates]])
+                rows = np.concatenate([best_rows[query], candidates + start])
+                top = np.argpartition(-scores, k - 1)[:k]
+                best_scores[query], best_rows[query] = scores[top], rows[top]
+
+        order = np.argsort(-best_scores, axis=1, kind="stable")
+        best_scores = np.take_along_axis(best_scores, order, axis=1)
+        best_rows = np.take_along_axis(best_rows, order, axis=1)
+        ids = [[self.ids[row] for row in query_rows] for query_rows in best_rows]
+        if single:
+            return ids[0], best_scores[0]
+        return ids, best_scores
+
+    def search_id(self, file_id, k=10):
+        """
+        Find the k stored ECGs most similar to a stored ECG, without running the model.
+
+        Args:
+            file_id (str): The ID of the query ECG.
+            k (int): The number of neighbours. Defaults to 10.
+
+        Returns:
+            tuple: The k most similar IDs, not including the query itself, and their similarities.
+
+        Raises:
+            KeyError: If the ID is not stored.
+        """
+        return self.search(self.vector(file_id), k=k, exclude=[file_id])
@@ -0,0 +1,124 @@
+import numpy as np
+import h5py
+import logging
+import os
+
+# Initialize logger for the HD5 re-layout
+logger = logging.getLogger(__name__)
+
+# Name of the (samples, leads) dataset of the single-dataset layout, inside the ECG group
+LEAD_MATRIX_DATASET = "leads"
+
+# Attribute of the lead matrix naming the lead stored in each column
+LEAD_NAMES_ATTRIBUTE = "lead_names"
+
+# Compressions supported by every h5py build; "lzf" decodes faster, "gzip" compresses better
+COMPRESSIONS = ("gzip", "lzf", None)
+
+
+def lead_matrix_chunks(samples, leads, itemsize, chunk_bytes=1 << 20):
+    """
+    Choose the chunk shape of a lead matrix: whole rows of all leads, a whole 10 second ECG in one chunk.
+
+    Long recordings are split into chunks of about `chunk_bytes`, so a windowed read only decompresses the
+    chunks it spans.
+
+    Args:
+        samples (int): The number of samples per lead.
+        leads (int): The number of leads.
+        itemsize (int): The size of one sample in bytes.
+        chunk_bytes (int): The target chunk size in bytes. Defaults to 1 MiB.
+
+    Returns:
+        tuple: The chunk shape (rows, leads).
+    """
+    rows = max(1, chunk_bytes // (leads * itemsize))
+    return min(samples, rows), leads
+
+
+def relayout_ecg_file(source, target, processor, compression="gzip", compression_level=4, chunk_bytes=1 << 20):
+    """
+    Rewrite an ECG file so its leads are one contiguous (samples, leads) dataset in the processor's lead order.
+
+    The lead matrix is written to `<ecg_hd5_path>/leads` with a `lead_names` attribute naming the lead of each
+    column and a `sample_rate` attribute with the sampling frequency the processor reads for the file. The
+    per-lead `instance_0` datasets it replaces are left out; every other group, dataset and attribute is copied.
+    Samples keep their stored type. The matrix is filled one chunk of rows at a time, so memory use is bounded by
+    `chunk_bytes` however long the recording is. The file is written under a temporary name and moved into place.
+
+    Args:
+        source (str): The path of the ECG file with one dataset per lead.
+        target (str): The path of the rewritten file. Its directory is created if needed.
+        processor (ECGProcessor): The processor whose leads, lead order and HD5 path define the layout.
+        compression (str, optional): "gzip", "lzf" or None. Defaults to "gzip", with byte shuffling.
+        compression_level (int): The gzip level. Defaults to 4.
+        chunk_bytes (int): The target chunk size in bytes. Defaults to 1 MiB.
+
+    Returns:
+        dict: The number of samples and the sizes in bytes of the source and target files.
+
+    Raises:
+        ValueError: If the compression is unknown, the source is not a readable ECG or is already re-laid out.
+    """
+    if compression not in COMPRESSIONS:
+        raise ValueError(f"Unknown compression: {compression}. Expected one of {COMPRESSIONS}")
+    header = processor.read_header(source)
+    leads = sorted(processor.ecg_leads, key=processor.ecg_leads.get)
+    lead_paths = {lead: f"/{processor.ecg_hd5_path.strip('/')}/{lead}/instance_0" for lead in leads}
+
+    os.makedirs(os.path.dirname(os.path.abspath(target)), exist_ok=True)
+    tmp_target = f"{target}.tmp-{os.getpid()}"
+    try:
+        with h5py.File(source, "r") as src, h5py.File(tmp_target, "w") as dst:
+            if f"{processor.ecg_hd5_path}/{LEAD_MATRIX_DATASET}" in src:
+                raise ValueError(f"{source} already stores its leads in one dataset")
+            _copy_except(src, dst, set(lead_paths.values()))
+            datasets = [src[lead_paths[lead]] for lead in leads]
+            dtype = np.result_type(*(d.dtype for d in datasets))
+            samples = header["samples"]
+            chunks = lead_matrix_chunks(samples, len(leads), dtype.itemsize, chunk_bytes)
+
+            options = {}
+            if compression is not None:
+                options = {"compression": compression, "shuffle": True}
+                if compression == "gzip":
+                    options["compression_opts"] = compression_level
+            group = dst.require_group(processor.ecg_hd5_path)
+            lead_matrix = group.create_dataset(
+                LEAD_MATRIX_DATASET, shape=(samples, len(leads)), dtype=dtype, chunks=chunks, **options
+            )
+            # Each slice is one chunk of the target, so every chunk is compressed and written exactly once
+            rows = np.empty(chunks, dtype=dtype)
+            for start in range(0, samples, chunks[0]):
+                stop = min(start + chunks[0], samples)
+                for column, dataset in enumerate(datasets):
+                    dataset.read_direct(rows, source_sel=np.s_[start:stop], dest_sel=np.s_[: stop - start, column])
+                lead_matrix.write_direct(rows, source_sel=np.s_[: stop - start], dest_sel=np.s_[start:stop])
+            lead_matrix.attrs[LEAD_NAMES_ATTRIBUTE] = leads
+            lead_matrix.attrs["sample_rate"] = header["sample_rate"]
+        os.replace(tmp_target, target)
+    except BaseException:
+        if os.path.exists(tmp_target):
+            os.remove(tmp_target)
+        raise
+
+    return {"samples": header["samples"], "source_bytes": os.path.getsize(source), "target_bytes": os.path.getsize(target)}
+
+
+def _copy_except(src_group, dst_group, skipped):
+    """
+    Copy the attributes and members of a group, recursively, leaving out the skipped datasets.
+
+    Args:
+        src_group (h5py.Group): The group to copy from.
+        dst_group (h5py.Group): The group to copy into.
+        skipped (set): The absolute names of the datasets to leave out.
+    """
+    dst_group.attrs.update(src_group.attrs)
+    for name, member in src_group.items():
+        if member.name in skipped:
+            continue
+        if isinstance(member, h5py.Group) and any(path.startswith(member.name + "/") for path in skipped):
+            _copy_except(member, dst_group.require_group(name), skipped)
+        else:
+            src_group.copy(member, dst_group, name)
@@ -1,10 +1,13 @@
 import gradio as gr
-import numpy as np
 from app.model_handler import ECGModel
 from app.ecg_processor import ECGProcessor
 from app.visualizer import Visualizer
+from app.postprocessing import OutputPostProcessor
+from app.metrics import timed
+from app.logging_setup import request_log
+from app.model_registry import lease_model
+from app.admission import ServerBusy, admit, check_deadline
 import logging
-import os
 
 # Initialize logger for the ECGGradioApp
 logger = logging.getLogger(__name__)
@@ -18,9 +21,12 @@ class ECGGradioApp:
         model (ECGModel): The model used for making ECG predictions.
         processor (ECGProcessor): The processor used for preprocessing the ECG data.
         visualizer (Visualizer): The visualizer used for displaying prediction results.
+        postprocessor (OutputPostProcessor): The post-processor turning raw model outputs into results.
+        cache (PredictionCache): The cache of raw model outputs keyed by upload content, or None when disabled.
+        admission (AdmissionController): The admission control in front of parsing and inference, or None.
     """
 
-    def __init__(self, ecg_model, ecg_processor, visualizer):
+    def __init__(self, ecg_model, ecg_processor, visualizer, cache=None, admission=None):
         """
         Initialize the ECGGradioApp with model, processor, and visualizer.
 
@@ -28,45 +34,95 @@ class ECGGradioApp:
             ecg_model (ECGModel): The ECG model for making predictions.
             ecg_processor (ECGProcessor): The processor for converting ECG data into tensors.
             visualizer (Visualizer): The visualizer for generating charts from predictions.
+            cache (PredictionCache, optional): The cache of raw model outputs. Predictions are not cached when omitted.
+            admission (AdmissionController, optional): Bounds the requests parsing and running through the model,
+                shedding the rest. Requests are not limited when omitted.
         """
         logger.info("Initializing ECGGradioApp")
         self.model = ecg_model
         self.processor = ecg_processor
         self.visualizer = visualizer
+        self.cache = cache
+        self.admission = admission
+        self.postprocessor = OutputPostProcessor(ecg_model.model_output_names, ecg_model.output_tensormaps)
         logger.info("ECGGradioApp initialized successfully")
 
+    @timed("request")
     def predict_ecg(self, file):
         """
         Process the uploaded ECG file, make predictions, and return the results.
 
+        Gradio saves every upload to its temporary directory (`GRADIO_TEMP_DIR`) and, with a binary file input,
+        passes the file's bytes here. Those bytes are hashed for the prediction cache and opened as an in-memory
+        HDF5 image, so the processor does not open the file a second time. Only the JSON API keeps uploads
+        entirely off disk. One structured line with the outcome and stage timings is logged per request.
+
         Args:
-            file (UploadedFile): The ECG file uploaded by the user.
+            file (bytes or UploadedFile): The raw bytes of the ECG file uploaded by the user, or an uploaded file
+                with a `name` path.
 
         Returns:
             tuple: A tuple containing the predictions, including survival curve, sex classification, age prediction, and atrial fibrillation classification.
 
         Raises:
-            gr.Error: If the file format is not HD5 or an error occurs during the prediction process.
+            gr.Error: If the file is not in HD5 format, the server is too busy to take the request or an error occurs
+                during the prediction process.
+        """
+        if isinstance(file, (bytes, bytearray)):
+            ecg_bytes = file
+        else:
+            with open(getattr(file, "name", file), "rb") as f:
+                ecg_bytes = f.read()
+        logger.debug("Received ECG file for prediction: %d bytes", len(ecg_bytes))
+
+        with request_log("gradio", bytes=len(ecg_bytes)) as entry:
+            if not self.processor.is_hd5(ecg_bytes):
+                logger.error("Invalid file format: no HDF5 signature")
+                raise gr.Error("Invalid file format. Please upload a file in HD5 format.")
+
+            try:
+                with lease_model(self.model) as model:
+                    if self.cache is None:
+                        predictions = self._predict_file(model, ecg_bytes)
+                    else:
+                        key = self.cache.make_key(ecg_bytes, model.model_id)
+                        entry["cache"] = "hit"
+                        predictions = self.cache.get_or_compute(key, lambda: self._predict_file(model, ecg_bytes, entry))
+                        logger.debug("Prediction cache stats: %s", self.cache.stats())
+                return self._generate_outputs(predictions)
+            except ServerBusy as e:
+                entry["status"] = "shed"
+                raise gr.Error(f"{e} (retry in {e.retry_after:g} s)")
+            except Exception as e:
+                logger.error("Error during prediction: %s", e)
+                raise gr.Error("An error occurred while processing the ECG file. Check your file type and make sure it is in hd5 format")
+
+    def _predict_file(self, model, ecg_bytes, entry=None):
         """
-        logger.info("Received ECG file for prediction: %s", file)
+        Convert the ECG file into a tensor and run it through the model, once admitted. Cache hits skip this.
 
-        valid_extensions = ['.hd5']
-        file_extension = os.path.splitext(file.name)[-1].lower()
+        Args:
+            model (ECGModel): The model leased for the request.
+            ecg_bytes (bytes): The raw bytes of the ECG file.
+            entry (dict, optional): The request log line, marked as a cache miss when given.
 
-        if file_extension not in valid_extensions:
-            logger.error("Invalid file format: %s", file_extension)
-            raise gr.Error("Invalid file format. Please upload a file in HD5 format.")
+        Returns:
+            list: The list of raw predictions made by the model.
 
-        try:
-            ecg_tensor = self.processor.ecg_as_tensor(file)
+        Raises:
+            ServerBusy: If the request is shed by the admission control.
+        """
+        if entry is not None:
+            entry["cache"] = "miss"
+        with admit(self.admission):
+            ecg_tensor = self.processor.ecg_as_tensor(ecg_bytes)
             logger.debug("ECG tensor shape: %s", ecg_tensor.shape)
-            predictions = self.model.predict(ecg_tensor)
-            logger.info("Predictions made successfully")
-            return self._generate_outputs(predictions)
-        except Exception as e:
-            logger.error("Error during prediction: %s", e)
-            raise gr.Error("An error occurred while processing the ECG file. Check your file type and make sure it is in hd5 format")
+            check_deadline()
+            predictions = model.predict(ecg_tensor)
+        logger.debug("Predictions made successfully")
+        return predictions
 
+    @timed("postprocess")
     def _generate_outputs(self, predictions):
         """
         Generate outputs based on the model predictions.
@@ -77,43 +133,43 @@ class ECGGradioApp:
         Returns:
             tuple: A tuple containing the generated outputs for survival curve, predicted sex, predicted age, and atrial fibrillation classification.
         """
-        logger.info("Generating outputs from predictions")
-        outputs = []
-        for name, pred in zip(self.model.model_output_names, predictions):
-            logger.debug("Processing output for: %s", name)
-            otm = self.model.output_tensormaps[name]
-            if otm.is_survival_curve():
-                intervals = otm.shape[-1] // 2
-                days_per_bin = 1 + otm.days_window // intervals
-                predicted_survivals = np.cumprod(pred[:, :intervals], axis=1)
-                outputs.append(1 - predicted_survivals[0, -1])
-                logger.debug("Survival curve output generated for: %s", name)
-            else:
-                outputs.append(pred)
-
-        output_1 = round(outputs[0], 3)
-        output_2 = self.visualizer.plot_probability_bar_chart(
-            [outputs[1][0][0], outputs[1][0][1]], labels=["Male", "Female"]
+        logger.debug("Generating outputs from predictions")
+        results = self.postprocessor.process(predictions)
+
+        output_1 = round(float(results["af_risk"][0]), 3)
+        output_2 = self.visualizer.render_bar_chart(
+            [results["sex_probs"][0][0], results["sex_probs"][0][1]], labels=["Male", "Female"]
         )
-        output_3 = round(outputs[2][0][0], 3)
-        output_4 = self.visualizer.plot_probability_bar_chart(
-            [outputs[3][0][0], outputs[3][0][1]], labels=["Yes", "No"]
+        output_3 = round(float(results["age"][0]), 3)
+        output_4 = self.visualizer.render_bar_chart(
+            [results["af_probs"][0][0], results["af_probs"][0][1]], labels=["Yes", "No"]
         )
 
-        logger.info("Outputs generated successfully")
+        logger.debug("Outputs generated successfully")
         return output_1, output_2, output_3, output_4
 
-    def launch(self):
+    def launch(self, concurrency_limit=None, api=None, port=7860, max_queue_size=None):
         """
         Launch the Gradio app interface for ECG file upload and prediction.
 
         The interface allows users to upload an ECG file and receive predictions, which are displayed as sliders and plots.
 
+        Args:
+            concurrency_limit (int, optional): The number of requests Gradio processes at the same time. Gradio
+                handles one request at a time when omitted, which leaves batching and model replicas idle.
+            api (InferenceAPI, optional): The headless JSON API. When given, the Gradio app is mounted on a FastAPI
+                app that also serves the API routes under /api.
+            port (int): The port to serve on. Defaults to 7860.
+            max_queue_size (int, optional): The number of requests waiting in Gradio's queue, beyond which new ones
+                are rejected. Gradio's queue is unbounded when omitted.
+
+        Gradio runs at most `max_threads` (40) handlers at once whatever the concurrency limit, so the thread pool
+        is raised to the concurrency limit when that is higher.
         """
         logger.info("Launching Gradio interface")
         iface = gr.Interface(
             fn=self.predict_ecg,
-            inputs=gr.File(label="Upload ECG File"),
+            inputs=gr.File(label="Upload ECG File", type="binary"),
             outputs=[
                 gr.Slider(
                     label="Survival Curve Prediction for incident atrial fibrillation",
@@ -122,17 +178,30 @@ class ECGGradioApp:
                     step=0.01,
                     info="This gives the probability score of survival curve for incident atrial fibrillation. Range(0 to 1)",
                 ),
-                gr.Plot(label="Individual Predicted Sex"),
+                self.visualizer.chart_component(label="Individual Predicted Sex"),
                 gr.Slider(
                     label="Predicted Age", minimum=0, maximum=100, step=0.1,
                     info="This gives the age prediction. Negative predicted values will be displayed as zero. Range(0 to 100)"
                 ),
-                gr.Plot(label="Classification of atrial fibrillation"),
+                self.visualizer.chart_component(label="Classification of atrial fibrillation"),
             ],
             title="ECG2AF Model Predictions",
             description="Upload an ECG file in HD5 format to receive multi-task predictions.",
             theme=gr.themes.Base(),
         )
 
-        iface.launch(server_name="0.0.0.0")
+        # Set before queue() and launch(), which size Gradio's worker pool from it
+        iface.max_threads = max(iface.max_threads, concurrency_limit or 0)
+        if concurrency_limit or max_queue_size:
+            iface.queue(default_concurrency_limit=concurrency_limit or 1, max_size=max_queue_size)
+        if api is None:
+            iface.launch(server_name="0.0.0.0", server_port=port, max_threads=iface.max_threads)
+        else:
+            from fastapi import FastAPI
+            import uvicorn
+
+            server = FastAPI()
+            server.include_router(api.router())
+            server = gr.mount_gradio_app(server, iface, path="/")
+            uvicorn.run(server, host="0.0.0.0", port=port)
         logger.info("Gradio interface launched successfully")
@@ -0,0 +1,165 @@
+from logging.handlers import QueueHandler, QueueListener
+from app.metrics import request_timings
+import atexit
+import collections
+import contextlib
+import json
+import logging
+import logging.config
+import os
+import queue
+import time
+
+# Initialize logger for the logging setup
+logger = logging.getLogger(__name__)
+
+# Logger of the one structured line written per request
+request_logger = logging.getLogger("app.requests")
+
+
+class SamplingFilter(logging.Filter):
+    """
+    Keeps one in every `every` records of each message from the sampled loggers, up to a level.
+
+    Records are grouped by logger and unformatted message, so a rare message is not drowned out by a frequent one.
+    Records above the level, and records from other loggers, always pass.
+
+    Attributes:
+        every (int): Keep the first and then every n-th record of a message.
+        level (int): The highest level that is sampled.
+        loggers (tuple): The names of the sampled loggers; their child loggers are sampled too.
+    """
+
+    def __init__(self, every=100, level=logging.INFO, loggers=()):
+        """
+        Initialize the SamplingFilter.
+
+        Args:
+            every (int): Keep the first and then every n-th record of a message. Defaults to 100.
+            level (int or str): The highest level that is sampled. Defaults to INFO.
+            loggers (iterable): The names of the sampled loggers. All loggers are sampled when empty.
+        """
+        super().__init__()
+        self.every = max(1, int(every))
+        self.level = logging.getLevelName(level) if isinstance(level, str) else level
+        self.loggers = tuple(loggers)
+        self._counts = collections.Counter()
+
+    def filter(self, record):
+        if record.levelno > self.level:
+            return True
+        if self.loggers and not any(record.name == name or record.name.startswith(name + ".") for name in self.loggers):
+            return True
+        key = (record.name, record.msg)
+        count = self._counts[key]
+        self._counts[key] = count + 1
+        return count % self.every == 0
+
+
+class DroppingQueueHandler(QueueHandler):
+    """
+    A QueueHandler that drops records instead of blocking when the queue is full.
+
+    Attributes:
+        dropped (int): The number of records dropped so far.
+    """
+
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+def configure_logging(logging_config, use_queue=True, queue_size=10000, sample_every=1, sample_level="INFO", sampled_loggers=()):
+    """
+    Apply a `logging.config.dictConfig` configuration, then move its root handlers behind a queue.
+
+    With the queue, request threads only format a record and put it on a bounded queue; a background
+    `QueueListener` thread runs the configured console and file handlers, so slow disks never block a request.
+    When the queue is full, records are dropped rather than blocking. Directories of file handlers are created.
+
+    Args:
+        logging_config (dict): The dictConfig configuration, e.g. the `logging` section of config.yaml.
+        use_queue (bool): Whether to move the root handlers behind a queue. Defaults to True.
+        queue_size (int): The maximum number of queued records. Defaults to 10000.
+        sample_every (int): Keep one in this many records of each message from the sampled loggers. Defaults to 1,
+            which disables sampling.
+        sample_level (str): The highest level that is sampled. Defaults to "INFO".
+        sampled_loggers (iterable): The names of the sampled loggers. All loggers are sampled when empty.
+
+    Returns:
+        logging.handlers.QueueListener: The running listener, stopped at exit, or None without a queue.
+    """
+    for handler in logging_config.get("handlers", {}).values():
+        if handler.get("filename"):
+            os.makedirs(os.path.dirname(os.path.abspath(handler["filename"])), exist_ok=True)
+    logging.config.dictConfig(logging_config)
+
+    root = logging.getLogger()
+    handlers = list(root.handlers)
+    sampling = SamplingFilter(sample_every, sample_level, sampled_loggers) if sample_every > 1 else None
+    if not use_queue:
+        if sampling is not None:
+            for handler in handlers:
+                handler.addFilter(sampling)
+        return None
+
+    queue_handler = DroppingQueueHandler(queue.Queue(maxsize=queue_size))
+    if sampling is not None:
+        queue_handler.addFilter(sampling)
+    for handler in handlers:
+        root.removeHandler(handler)
+    root.addHandler(queue_handler)
+
+    listener = QueueListener(queue_handler.queue, *handlers, respect_handler_level=True)
+    listener.start()
+    atexit.register(_stop_listener, listener)
+    logger.info("Logging through a background queue of %d records to %d handlers", queue_size, len(handlers))
+    return listener
+
+
+def _stop_listener(listener):
+    """
+    Flush and stop a queue listener at exit, unless it was already stopped.
+    """
+    # QueueListener.stop fails on a listener that is already stopped
+    with contextlib.suppress(AttributeError):
+        listener.stop()
+
+
+@contextlib.contextmanager
+def request_log(kind, **fields):
+    """
+    Write one structured JSON line per request with its outcome and the duration of each timed stage.
+
+    Stage durations come from the `timed` stages that run on the request's thread, in milliseconds with an
+    `_ms` suffix. Add fields such as the cache outcome to the yielded dict while handling the request; a "status"
+    set before an exception, such as "shed", is kept instead of "error".
+
+    Args:
+        kind (str): The kind of request, e.g. "gradio" or "api".
+        **fields: Initial fields of the line.
+
+    Yields:
+        dict: The fields of the line.
+    """
+    entry = {"request": kind, **fields}
+    start = time.perf_counter()
+    with request_timings() as timings:
+        try:
+            yield entry
+            entry.setdefault("status", "ok")
+        except BaseException as e:
+            entry.setdefault("status", "error")
+            entry["error"] = type(e).__name__
+            raise
+        finally:
+            entry["total_ms"] = round((time.perf_counter() - start) * 1000, 3)
+            for stage, seconds in timings.items():
+                entry[f"{stage}_ms"] = round(seconds * 1000, 3)
+            request_logger.info("%s", json.dumps(entry, default=str))
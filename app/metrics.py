@@ -0,0 +1,314 @@
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import bisect
+import contextlib
+import contextvars
+import functools
+import logging
+import os
+import resource
+import threading
+import time
+
+# Initialize logger for the metrics registry
+logger = logging.getLogger(__name__)
+
+# Latency histogram bucket upper bounds in seconds
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+METRIC_PREFIX = "ecg2af"
+
+_NULL_CONTEXT = contextlib.nullcontext()
+
+# Stage durations of the request running in the current context, collected by `request_timings`
+_REQUEST_TIMINGS = contextvars.ContextVar("request_timings", default=None)
+
+
+class Histogram:
+    """
+    A cumulative latency histogram in the Prometheus bucket layout.
+
+    Attributes:
+        buckets (tuple): The bucket upper bounds in seconds.
+    """
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        """
+        Initialize an empty Histogram.
+
+        Args:
+            buckets (tuple): The bucket upper bounds in seconds. Defaults to DEFAULT_BUCKETS.
+        """
+        self.buckets = tuple(buckets)
+        self._counts = [0] * (len(self.buckets) + 1)
+        self._sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        """
+        Record one observation.
+
+        Args:
+            value (float): The observed duration in seconds.
+        """
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self._counts[index] += 1
+            self._sum += value
+
+    def snapshot(self):
+        """
+        Read the histogram consistently.
+
+        Returns:
+            tuple: The cumulative count per bucket (including +Inf), the sum and the total count.
+        """
+        with self._lock:
+            counts = list(self._counts)
+            total = self._sum
+        cumulative, running = [], 0
+        for count in counts:
+            running += count
+            cumulative.append(running)
+        return cumulative, total, running
+
+
+class _StageTimer:
+    """
+    Times one execution of a stage and records it in the registry, counting exceptions as stage errors.
+
+    The duration is also added to the stage timings of the current request, if one is being collected.
+    """
+
+    __slots__ = ("registry", "stage", "start")
+
+    def __init__(self, registry, stage):
+        self.registry = registry
+        self.stage = stage
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        seconds = time.perf_counter() - self.start
+        self.registry.observe(self.stage, seconds, error=exc_type is not None)
+        timings = _REQUEST_TIMINGS.get()
+        if timings is not None:
+            timings[self.stage] = timings.get(self.stage, 0.0) + seconds
+        return False
+
+
+class MetricsRegistry:
+    """
+    Collects per-stage latency histograms, error counts and gauges, and renders them in the Prometheus text format.
+
+    When the registry is disabled, `time` returns a shared no-op context manager and `observe` returns
+    immediately, so instrumented code pays only an attribute check.
+
+    Attributes:
+        enabled (bool): Whether observations are recorded.
+    """
+
+    def __init__(self, enabled=False, buckets=DEFAULT_BUCKETS):
+        """
+        Initialize the MetricsRegistry.
+
+        Args:
+            enabled (bool): Whether observations are recorded. Defaults to False.
+            buckets (tuple): The latency histogram bucket upper bounds in seconds.
+        """
+        self.enabled = enabled
+        self.buckets = tuple(buckets)
+        self._histograms = {}
+        self._errors = {}
+        self._gauges = {}
+        self._lock = threading.Lock()
+
+    def time(self, stage):
+        """
+        Create a context manager timing one execution of a stage.
+
+        Args:
+            stage (str): The stage name, e.g. "inference".
+
+        Returns:
+            contextlib.AbstractContextManager: The timer, or a shared no-op context manager when disabled.
+        """
+        if not self.enabled:
+            return _NULL_CONTEXT
+        return _StageTimer(self, stage)
+
+    def observe(self, stage, seconds, error=False):
+        """
+        Record the duration of one execution of a stage.
+
+        Args:
+            stage (str): The stage name.
+            seconds (float): The duration in seconds.
+            error (bool): Whether the execution raised an exception. Defaults to False.
+        """
+        if not self.enabled:
+            return
+        histogram = self._histograms.get(stage)
+        if histogram is None:
+            with self._lock:
+                histogram = self._histograms.setdefault(stage, Histogram(self.buckets))
+                self._errors.setdefault(stage, 0)
+        histogram.observe(seconds)
+        if error:
+            with self._lock:
+                self._errors[stage] += 1
+
+    def register_gauge(self, name, help_text, callback):
+        """
+        Register a gauge whose value is read from a callback at scrape time.
+
+        Args:
+            name (str): The metric name without the "ecg2af_" prefix.
+            help_text (str): The help line of the metric.
+            callback (callable): A function without arguments returning a number, or a dict of
+                label value to number rendered with a "key" label.
+        """
+        with self._lock:
+            self._gauges[name] = (help_text, callback)
+
+    def render(self):
+        """
+        Render all metrics in the Prometheus text exposition format.
+
+        Returns:
+            str: The exposition text.
+        """
+        with self._lock:
+            histograms = dict(self._histograms)
+            errors = dict(self._errors)
+            gauges = dict(self._gauges)
+
+        lines = [
+            f"# HELP {METRIC_PREFIX}_stage_duration_seconds Latency of each processing stage.",
+            f"# TYPE {METRIC_PREFIX}_stage_duration_seconds histogram",
+        ]
+        for stage, histogram in sorted(histograms.items()):
+            cumulative, total, count = histogram.snapshot()
+            for bound, value in zip(list(histogram.buckets) + ["+Inf"], cumulative):
+                lines.append(f'{METRIC_PREFIX}_stage_duration_seconds_bucket{{stage="{stage}",le="{bound}"}} {value}')
+            lines.append(f'{METRIC_PREFIX}_stage_duration_seconds_sum{{stage="{stage}"}} {total}')
+            lines.append(f'{METRIC_PREFIX}_stage_duration_seconds_count{{stage="{stage}"}} {count}')
+
+        lines.append(f"# HELP {METRIC_PREFIX}_stage_errors_total Executions of each stage that raised an exception.")
+        lines.append(f"# TYPE {METRIC_PREFIX}_stage_errors_total counter")
+        for stage, count in sorted(errors.items()):
+            lines.append(f'{METRIC_PREFIX}_stage_errors_total{{stage="{stage}"}} {count}')
+
+        for name, (help_text, callback) in sorted(gauges.items()):
+            try:
+                value = callback()
+            except Exception as e:
+                logger.warning("Failed to read gauge %s: %s", name, e)
+                continue
+            lines.append(f"# HELP {METRIC_PREFIX}_{name} {help_text}")
+            lines.append(f"# TYPE {METRIC_PREFIX}_{name} gauge")
+            if isinstance(value, dict):
+                for key, item in sorted(value.items()):
+                    lines.append(f'{METRIC_PREFIX}_{name}{{key="{key}"}} {item}')
+            else:
+                lines.append(f"{METRIC_PREFIX}_{name} {value}")
+        return "\n".join(lines) + "\n"
+
+
+# Registry shared by the instrumented stages; disabled until the application enables it
+METRICS = MetricsRegistry()
+
+
+def timed(stage):
+    """
+    Decorate a function so each call is recorded as one execution of a stage in the shared registry and in the
+    timings of the current request.
+
+    Args:
+        stage (str): The stage name.
+
+    Returns:
+        callable: The decorator.
+    """
+
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if not METRICS.enabled and _REQUEST_TIMINGS.get() is None:
+                return fn(*args, **kwargs)
+            with _StageTimer(METRICS, stage):
+                return fn(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+@contextlib.contextmanager
+def request_timings():
+    """
+    Collect the duration of every timed stage that runs in the current context, e.g. one request.
+
+    Stages running on other threads, such as a batched forward pass, are not included.
+
+    Yields:
+        dict: The stage name mapped to its total duration in seconds, filled as stages complete.
+    """
+    timings = {}
+    token = _REQUEST_TIMINGS.set(timings)
+    try:
+        yield timings
+    finally:
+        _REQUEST_TIMINGS.reset(token)
+
+
+def process_rss_bytes():
+    """
+    Read the resident set size of the current process.
+
+    Returns:
+        int: The resident memory in bytes, or the peak resident memory where the current value is unavailable.
+    """
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        # ru_maxrss is in kilobytes on Linux and in bytes on macOS
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if os.uname().sysname == "Darwin" else peak * 1024
+
+
+def start_metrics_server(registry=METRICS, host="0.0.0.0", port=9100):
+    """
+    Serve the registry on `/metrics` from a background HTTP server thread.
+
+    Args:
+        registry (MetricsRegistry): The registry to expose. Defaults to the shared registry.
+        host (str): The interface to bind. Defaults to "0.0.0.0".
+        port (int): The port to bind. Defaults to 9100.
+
+    Returns:
+        ThreadingHTTPServer: The running server; call `shutdown` to stop it.
+    """
+
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split("?")[0] != "/metrics":
+                self.send_error(404)
+                return
+            body = registry.render().encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            logger.debug("Metrics request: " + format, *args)
+
+    server = ThreadingHTTPServer((host, port), MetricsHandler)
+    thread = threading.Thread(target=server.serve_forever, name="metrics-server", daemon=True)
+    thread.start()
+    logger.info("Metrics endpoint listening on http://%s:%s/metrics", host, port)
+    return server
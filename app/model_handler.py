@@ -1,35 +1,236 @@
-from tensorflow.keras.models import load_model
-from ml4h.tensormap.ukb.survival import mgb_afib_wrt_instance2
-from ml4h.tensormap.ukb.demographics import age_2_wide, af_dummy, sex_dummy3
-from ml4h.models.model_factory import get_custom_objects
+from concurrent.futures import Future
+from app.metrics import timed
+import numpy as np
+import collections
+import contextlib
+import hashlib
+import json
+import os
+import shutil
+import threading
 import logging
+import time
+
+# TensorFlow and ml4h are imported where they are used, so importing this module stays cheap
 
 # Initialize logger for the ECGModel
 logger = logging.getLogger(__name__)
 
+# "compiled" runs a traced tf.function with a fixed input signature, "keras" calls Keras model.predict,
+# "tflite_fp16" and "tflite_int8" run a converted TensorFlow Lite model with fp16 or int8 weights
+INFERENCE_MODES = ("compiled", "keras", "tflite_fp16", "tflite_int8")
+
+# Weight precision of the TensorFlow Lite inference modes
+TFLITE_PRECISIONS = {"tflite_fp16": "fp16", "tflite_int8": "int8"}
+
+# Metadata file stored inside the exported SavedModel directory
+SAVED_MODEL_METADATA = "ecg2af_export.json"
+
+# Sidecar file next to the model caching its SHA-256 digest, keyed on the file's size and modification time
+DIGEST_SUFFIX = ".sha256.json"
+
+
+def output_tensormap_list():
+    """
+    Import the ml4h tensormaps describing the four ECG2AF outputs.
+
+    Returns:
+        list: The survival curve, age, atrial fibrillation and sex tensormaps.
+    """
+    from ml4h.tensormap.ukb.survival import mgb_afib_wrt_instance2
+    from ml4h.tensormap.ukb.demographics import age_2_wide, af_dummy, sex_dummy3
+
+    return [mgb_afib_wrt_instance2, age_2_wide, af_dummy, sex_dummy3]
+
+
+class OutputTensorMap:
+    """
+    The part of an ml4h output tensormap that post-processing reads, restored from export metadata without ml4h.
+
+    Attributes:
+        name (str): The output layer name.
+        shape (tuple): The shape of one output.
+        days_window (int): The horizon in days of a survival curve, otherwise None.
+    """
+
+    def __init__(self, name, shape, days_window=None, survival_curve=False):
+        self.name = name
+        self.shape = tuple(shape)
+        self.days_window = days_window
+        self._survival_curve = survival_curve
+
+    def output_name(self):
+        """str: The output layer name."""
+        return self.name
+
+    def is_survival_curve(self):
+        """bool: Whether the output is a survival curve."""
+        return self._survival_curve
+
+
+def describe_tensormaps(tensormaps):
+    """
+    Describe output tensormaps as JSON-serializable metadata, so exports can restore them without ml4h.
+
+    Args:
+        tensormaps (iterable): The ml4h output tensormaps.
+
+    Returns:
+        dict: The shape, days window and survival curve flag of each tensormap, keyed by output name.
+    """
+    return {
+        tm.output_name(): {
+            "shape": list(tm.shape),
+            "days_window": tm.days_window if tm.is_survival_curve() else None,
+            "survival_curve": tm.is_survival_curve(),
+        }
+        for tm in tensormaps
+    }
+
+
+def restore_tensormaps(descriptions):
+    """
+    Rebuild the output tensormaps described by `describe_tensormaps`.
+
+    Args:
+        descriptions (dict): The tensormap descriptions keyed by output name.
+
+    Returns:
+        dict: OutputTensorMap objects keyed by output name.
+    """
+    return {name: OutputTensorMap(name, **description) for name, description in descriptions.items()}
+
 
 class ECGModel:
     """
     A class to handle the loading and prediction of ECG data using a pre-trained model.
 
+    In compiled mode the model is exported once to a SavedModel next to the `.h5` file. Later boots load
+    that export directly when its recorded source digest still matches the `.h5`, skipping the rebuild of
+    the ml4h custom objects and the Keras deserialization.
+
+    The TensorFlow Lite modes convert the model once to a `.tflite` file with fp16 or dynamic-range int8
+    weights, cached and checked against the source digest the same way, and run it with the TFLite CPU
+    interpreter. Compare them against the float32 model with `scripts/parity_report.py` before enabling them.
+
+    Both caches record the output tensormaps, so booting from them needs neither ml4h nor the `.h5` beyond
+    checking its digest. The digest itself is cached next to the `.h5` and recomputed only when the file's size or
+    modification time changes.
+
+    `embed` returns the representation the output heads share, read from the float32 Keras model in every mode.
+    The SavedModel export carries the embedding function as well.
+
     Attributes:
-        model (tensorflow.keras.Model): The loaded ECG model.
-        output_tensormaps (dict): A dictionary mapping output tensor names to their corresponding tensormap objects.
+        model (tensorflow.keras.Model): The loaded Keras model. When loaded from the SavedModel export it is the
+            restored `tf.Module` instead, exposing the `infer` and `embed` functions but not the Keras API, and it is
+            None in a TensorFlow Lite mode when the converted file was loaded from the cache. Code that needs Keras
+            should construct the model with `inference_mode="keras"` or `use_saved_model=False`.
+        output_tensormaps (dict): A dictionary mapping output tensor names to their corresponding tensormap objects,
+            OutputTensorMap objects when restored from an export.
         model_output_names (list): A list of the model's output layer names.
+        model_id (str): The SHA-256 digest of the model file, identifying the weights that produced a prediction.
+        inference_mode (str): One of INFERENCE_MODES.
+        tflite_path (str): The converted TensorFlow Lite model in a TensorFlow Lite mode, otherwise None.
+        embedding_layer (str): The layer whose output `embed` returns, or None to detect it on first use.
+        startup_timings (dict): The seconds spent in each startup phase, e.g. {"hash": 0.2, "load_h5": 4.1}.
     """
 
-    def __init__(self, model_path):
+    def __init__(
+        self,
+        model_path,
+        inference_mode="compiled",
+        warmup=True,
+        saved_model_dir=None,
+        use_saved_model=True,
+        tflite_path=None,
+        tflite_threads=None,
+        embedding_layer=None,
+    ):
         """
         Initialize the ECGModel by loading the model from the given path and setting up output tensormaps.
 
         Args:
             model_path (str): The file path to the pre-trained ECG model.
+            inference_mode (str): "compiled" to run a tf.function traced once for a (None, 5000, 12) input,
+                "keras" to call Keras model.predict on every request, or "tflite_fp16" / "tflite_int8" to run a
+                reduced-precision TensorFlow Lite conversion. Defaults to "compiled".
+            warmup (bool): Whether to run one dummy prediction at startup so the first request does not pay
+                for tracing. Defaults to True.
+            saved_model_dir (str, optional): Where the fast-loading export is kept. Defaults to `<model_path>.savedmodel`.
+            use_saved_model (bool): Whether to load from and write to the export in compiled mode. Defaults to True.
+            tflite_path (str, optional): Where the converted TensorFlow Lite model is cached in a TensorFlow Lite mode.
+                Defaults to `<model_path>.<fp16|int8>.tflite`.
+            tflite_threads (int, optional): The number of threads of the TensorFlow Lite interpreter. Defaults to
+                TensorFlow Lite's own choice.
+            embedding_layer (str, optional): The name of the layer whose output `embed` returns. Defaults to the
+                last layer that all output heads depend on.
+
+        Raises:
+            ValueError: If the inference mode is unknown.
         """
+        if inference_mode not in INFERENCE_MODES:
+            raise ValueError(f"Unknown inference mode: {inference_mode}. Expected one of {INFERENCE_MODES}")
         logger.info("Initializing ECGModel with model path: %s", model_path)
-        self.model = self.load_model_from_path(model_path)  # Load the model
-        self.output_tensormaps = self._init_output_tensormaps()  # Initialize output tensormaps
-        self.model_output_names = self.tf_model_output_names()  # Get model output names
-        logger.info("ECGModel initialized successfully")
+        self.inference_mode = inference_mode
+        self.startup_timings = {}
+        self.saved_model_dir = saved_model_dir or f"{model_path}.savedmodel"
+        self.tflite_path = None
+        self.embedding_layer = embedding_layer
+        self._model_path = model_path
+        self._embedding_fn = None
+        self._exported_embedding_layer = None
+        self._embedding_lock = threading.Lock()
+        use_saved_model = use_saved_model and inference_mode == "compiled"
+
+        with self._timed("hash"):
+            self.model_id = self.cached_file_digest(model_path)  # Identify the weights for caching and the export
+
+        metadata = self._read_saved_model_metadata() if use_saved_model else None
+        if inference_mode in TFLITE_PRECISIONS:
+            precision = TFLITE_PRECISIONS[inference_mode]
+            self.tflite_path = tflite_path or f"{model_path}.{precision}.tflite"
+            metadata = self._init_tflite(model_path, precision, tflite_threads)
+        elif metadata is not None:
+            with self._timed("load_saved_model"):
+                self.model = self.load_saved_model(self.saved_model_dir)
+            self.model_output_names = metadata["output_names"]
+            self._input_shape = tuple(metadata["input_shape"])
+            self._inference_fn = self.model.infer
+            self._exported_embedding_layer = metadata.get("embedding_layer")
+        else:
+            with self._timed("load_h5"):
+                self.model = self.load_model_from_path(model_path)  # Load the model
+            self.model_output_names = self.tf_model_output_names()  # Get model output names
+            self._input_shape = tuple(self.model.input_shape[1:])
+            self._inference_fn = self._build_inference_fn() if inference_mode == "compiled" else None
+            if use_saved_model:
+                with self._timed("export_saved_model"):
+                    self.export_saved_model(self.saved_model_dir)
+
+        with self._timed("tensormaps"):
+            self.output_tensormaps = self._init_output_tensormaps(metadata)  # Initialize output tensormaps
+        if warmup:
+            with self._timed("warmup"):
+                self.warmup()
+        logger.info(
+            "ECGModel initialized successfully with inference mode: %s, startup timings: %s",
+            inference_mode,
+            {phase: round(seconds, 3) for phase, seconds in self.startup_timings.items()},
+        )
+
+    @contextlib.contextmanager
+    def _timed(self, phase):
+        """
+        Record the duration of a startup phase in `startup_timings`.
+
+        Args:
+            phase (str): The name of the phase.
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.startup_timings[phase] = time.perf_counter() - start
 
     def load_model_from_path(self, model_path):
         """
@@ -44,18 +245,293 @@ class ECGModel:
         Raises:
             RuntimeError: If the model fails to load from the given path.
         """
+        from tensorflow.keras.models import load_model
+        from ml4h.models.model_factory import get_custom_objects
+
         logger.info("Loading model from path: %s", model_path)
-        custom_dict = get_custom_objects(
-            [mgb_afib_wrt_instance2, age_2_wide, af_dummy, sex_dummy3]
-        )  # Get custom objects required by the model
+        custom_dict = get_custom_objects(output_tensormap_list())  # Get custom objects required by the model
         try:
-            self.tf_model = load_model(model_path, custom_objects=custom_dict)  # Load model with custom objects
+            # The optimizer is never used for inference, so skip restoring the training configuration
+            self.tf_model = load_model(model_path, custom_objects=custom_dict, compile=False)  # Load model with custom objects
             logger.info("Model loaded successfully from: %s", model_path)
         except Exception as e:
             logger.error("Failed to load model from path %s: %s", model_path, e)
             raise RuntimeError(f"Failed to load model: {e}")
         return self.tf_model
 
+    @staticmethod
+    def load_saved_model(saved_model_dir):
+        """
+        Load the exported SavedModel written by `export_saved_model`.
+
+        Args:
+            saved_model_dir (str): The directory of the export.
+
+        Returns:
+            The restored module, whose `infer` function takes a float32 (None, 5000, 12) tensor.
+
+        Raises:
+            RuntimeError: If the export fails to load.
+        """
+        import tensorflow as tf
+
+        logger.info("Loading exported SavedModel from: %s", saved_model_dir)
+        try:
+            return tf.saved_model.load(saved_model_dir)
+        except Exception as e:
+            logger.error("Failed to load SavedModel from %s: %s", saved_model_dir, e)
+            raise RuntimeError(f"Failed to load SavedModel: {e}")
+
+    def export_saved_model(self, saved_model_dir):
+        """
+        Export the compiled inference function as a SavedModel tagged with the digest of the source model.
+
+        The export is written to a temporary directory and moved into place, so a concurrent or interrupted
+        boot never sees a partial export. Failures are logged and otherwise ignored, since the `.h5` model is
+        already loaded.
+
+        Args:
+            saved_model_dir (str): The directory of the export.
+        """
+        import tensorflow as tf
+
+        tmp_dir = f"{saved_model_dir}.tmp-{os.getpid()}"
+        try:
+            module = tf.Module()
+            module.model = self.model
+            module.infer = self._inference_fn
+            try:
+                module.embed = self._get_embedding_fn()
+            except ValueError as e:
+                logger.warning("Exporting SavedModel without an embedding function: %s", e)
+            tf.saved_model.save(module, tmp_dir)
+            with open(os.path.join(tmp_dir, SAVED_MODEL_METADATA), "w") as f:
+                json.dump(
+                    {
+                        "source_sha256": self.model_id,
+                        "output_names": list(self.model_output_names),
+                        "input_shape": list(self._input_shape),
+                        "output_tensormaps": describe_tensormaps(output_tensormap_list()),
+                        "embedding_layer": self.embedding_layer if hasattr(module, "embed") else None,
+                    },
+                    f,
+                )
+            shutil.rmtree(saved_model_dir, ignore_errors=True)
+            os.replace(tmp_dir, saved_model_dir)
+            logger.info("Exported SavedModel to: %s", saved_model_dir)
+        except Exception as e:
+            logger.warning("Failed to export SavedModel to %s: %s", saved_model_dir, e)
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+
+    def _init_tflite(self, model_path, precision, num_threads):
+        """
+        Load the cached TensorFlow Lite conversion of the model, converting and caching it first if needed.
+
+        Args:
+            model_path (str): The path to the source model file.
+            precision (str): "fp16" or "int8".
+            num_threads (int): The number of interpreter threads, or None for the TensorFlow Lite default.
+
+        Returns:
+            dict: The metadata of the cached conversion when it was loaded, otherwise None.
+        """
+        metadata_path = f"{self.tflite_path}.json"
+        metadata = self._read_saved_model_metadata(metadata_path)
+        if metadata is not None and metadata.get("precision") == precision:
+            with self._timed("load_tflite"):
+                with open(self.tflite_path, "rb") as f:
+                    content = f.read()
+            self.model = None
+            self.model_output_names = metadata["output_names"]
+            self._input_shape = tuple(metadata["input_shape"])
+        else:
+            with self._timed("load_h5"):
+                self.model = self.load_model_from_path(model_path)
+            self.model_output_names = self.tf_model_output_names()
+            self._input_shape = tuple(self.model.input_shape[1:])
+            with self._timed("convert_tflite"):
+                content = self.convert_to_tflite(precision)
+            self._write_tflite(content, metadata_path, precision)
+            metadata = None
+        self._inference_fn = self._build_tflite_inference_fn(content, num_threads)
+        return metadata
+
+    def convert_to_tflite(self, precision):
+        """
+        Convert the loaded Keras model to TensorFlow Lite with reduced-precision weights.
+
+        "fp16" stores the weights as float16. "int8" applies dynamic-range quantization: weights are stored as
+        int8 and activations are quantized on the fly, which uses the integer CPU kernels without needing a
+        calibration dataset. Inputs and outputs stay float32 in both cases, and the batch dimension stays dynamic.
+
+        Args:
+            precision (str): "fp16" or "int8".
+
+        Returns:
+            bytes: The serialized TensorFlow Lite model, with one output per model output named after it.
+        """
+        import tensorflow as tf
+
+        model = self.model
+        output_names = list(self.model_output_names)
+        input_spec = tf.TensorSpec(shape=(None, *self.input_shape), dtype=tf.float32, name="ecg")
+
+        @tf.function(input_signature=[input_spec])
+        def serve(ecg):
+            outputs = model(ecg, training=False)
+            outputs = list(outputs) if isinstance(outputs, (list, tuple)) else [outputs]
+            return dict(zip(output_names, outputs))
+
+        converter = tf.lite.TFLiteConverter.from_concrete_functions([serve.get_concrete_function()], model)
+        converter.optimizations = [tf.lite.Optimize.DEFAULT]
+        if precision == "fp16":
+            converter.target_spec.supported_types = [tf.float16]
+        # ml4h layers without a builtin TFLite kernel fall back to TensorFlow ops
+        converter.target_spec.supported_ops = [tf.lite.OpsSet.TFLITE_BUILTINS, tf.lite.OpsSet.SELECT_TF_OPS]
+        logger.info("Converting model to TensorFlow Lite with %s weights", precision)
+        return converter.convert()
+
+    def _write_tflite(self, content, metadata_path, precision):
+        """
+        Cache a converted TensorFlow Lite model with metadata tying it to the source model digest.
+
+        The file is written under a temporary name and moved into place before its metadata, so a partial write
+        is never picked up. Failures are logged and otherwise ignored, since the converted model is already in memory.
+
+        Args:
+            content (bytes): The serialized TensorFlow Lite model.
+            metadata_path (str): The path of the metadata JSON.
+            precision (str): "fp16" or "int8".
+        """
+        tmp_path = f"{self.tflite_path}.tmp-{os.getpid()}"
+        try:
+            with open(tmp_path, "wb") as f:
+                f.write(content)
+            os.replace(tmp_path, self.tflite_path)
+            with open(tmp_path, "w") as f:
+                json.dump(
+                    {
+                        "source_sha256": self.model_id,
+                        "precision": precision,
+                        "output_names": list(self.model_output_names),
+                        "input_shape": list(self._input_shape),
+                        "output_tensormaps": describe_tensormaps(output_tensormap_list()),
+                    },
+                    f,
+                )
+            os.replace(tmp_path, metadata_path)
+            logger.info("Cached TensorFlow Lite model at: %s", self.tflite_path)
+        except OSError as e:
+            logger.warning("Failed to cache TensorFlow Lite model at %s: %s", self.tflite_path, e)
+            with contextlib.suppress(OSError):
+                os.remove(tmp_path)
+
+    def _build_tflite_inference_fn(self, content, num_threads):
+        """
+        Create a TensorFlow Lite interpreter for the converted model and wrap it in an inference function.
+
+        The interpreter is not thread-safe, so calls are serialized with a lock. Its input is resized to each
+        batch size by the signature runner.
+
+        Args:
+            content (bytes): The serialized TensorFlow Lite model.
+            num_threads (int): The number of interpreter threads, or None for the TensorFlow Lite default.
+
+        Returns:
+            callable: A function taking a float32 (N, 5000, 12) array and returning the outputs in model output order.
+        """
+        import tensorflow as tf
+
+        interpreter = tf.lite.Interpreter(model_content=content, num_threads=num_threads)
+        runner = interpreter.get_signature_runner()
+        output_names = list(self.model_output_names)
+        lock = threading.Lock()
+
+        def infer(ecg):
+            with lock:
+                outputs = runner(ecg=ecg)
+            return [outputs[name] for name in output_names]
+
+        logger.debug("Built TensorFlow Lite interpreter with %s threads", num_threads)
+        return infer
+
+    def _read_saved_model_metadata(self, metadata_path=None):
+        """
+        Read the metadata of an existing export if it was produced from the current model file.
+
+        Args:
+            metadata_path (str, optional): The metadata file. Defaults to the one of the SavedModel export.
+
+        Returns:
+            dict: The export metadata, or None when there is no export or it is stale.
+        """
+        metadata_path = metadata_path or os.path.join(self.saved_model_dir, SAVED_MODEL_METADATA)
+        try:
+            with open(metadata_path) as f:
+                metadata = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if metadata.get("source_sha256") != self.model_id:
+            logger.info("Export at %s is stale, reloading the source model", metadata_path)
+            return None
+        return metadata
+
+    @staticmethod
+    def file_digest(path, chunk_size=1 << 20):
+        """
+        Compute the SHA-256 digest of a file, reading it in chunks.
+
+        Args:
+            path (str): The path to the file.
+            chunk_size (int): The number of bytes read at a time. Defaults to 1 MiB.
+
+        Returns:
+            str: The hex digest of the file contents.
+        """
+        digest = hashlib.sha256()
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(chunk_size), b""):
+                digest.update(chunk)
+        return digest.hexdigest()
+
+    @classmethod
+    def cached_file_digest(cls, path):
+        """
+        Return the SHA-256 digest of a file, reusing the digest cached in `<path>.sha256.json` while the file's size
+        and modification time are unchanged.
+
+        The cache is written under a temporary name and moved into place. Failing to write it, e.g. in a read-only
+        model directory, is logged and only means the file is hashed again on the next call.
+
+        Args:
+            path (str): The path to the file.
+
+        Returns:
+            str: The hex digest of the file contents.
+        """
+        stat = os.stat(path)
+        key = {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+        cache_path = f"{path}{DIGEST_SUFFIX}"
+        try:
+            with open(cache_path) as f:
+                cached = json.load(f)
+            if cached["size"] == key["size"] and cached["mtime_ns"] == key["mtime_ns"]:
+                return cached["sha256"]
+        except (OSError, ValueError, KeyError, TypeError):
+            pass
+
+        digest = cls.file_digest(path)
+        tmp_path = f"{cache_path}.tmp-{os.getpid()}"
+        try:
+            with open(tmp_path, "w") as f:
+                json.dump({**key, "sha256": digest}, f)
+            os.replace(tmp_path, cache_path)
+        except OSError as e:
+            logger.warning("Failed to cache the digest of %s: %s", path, e)
+            with contextlib.suppress(OSError):
+                os.remove(tmp_path)
+        return digest
+
     def tf_model_output_names(self):
         """
         Retrieve the output names of the loaded TensorFlow model.
@@ -67,22 +543,64 @@ class ECGModel:
         logger.debug("Model output names: %s", output_names)
         return output_names
 
-    def _init_output_tensormaps(self):
+    def _init_output_tensormaps(self, metadata=None):
         """
         Initialize the output tensormaps used by the model.
 
         The tensormaps provide metadata about each of the model's outputs, such as their shape and interpretation.
+        They are restored from the metadata of a loaded export when it records them, and imported from ml4h otherwise.
+
+        Args:
+            metadata (dict, optional): The metadata of the SavedModel export or TensorFlow Lite conversion the model
+                was loaded from.
 
         Returns:
             dict: A dictionary mapping output names to their corresponding tensormap objects.
         """
-        output_tensormaps = {
-            tm.output_name(): tm
-            for tm in [mgb_afib_wrt_instance2, age_2_wide, af_dummy, sex_dummy3]
-        }
+        if metadata is not None and "output_tensormaps" in metadata:
+            output_tensormaps = restore_tensormaps(metadata["output_tensormaps"])
+        else:
+            output_tensormaps = {tm.output_name(): tm for tm in output_tensormap_list()}
         logger.debug("Initialized output tensormaps: %s", output_tensormaps.keys())
         return output_tensormaps
 
+    @property
+    def input_shape(self):
+        """tuple: The shape of one model input without the batch dimension, e.g. (5000, 12)."""
+        return self._input_shape
+
+    def _build_inference_fn(self):
+        """
+        Wrap the model in a tf.function with a fixed (None, *input_shape) float32 input signature.
+
+        The function is traced once and reused for every batch size, avoiding the data adapter and callback
+        setup that Keras model.predict repeats on each call.
+
+        Returns:
+            tf.types.experimental.GenericFunction: The compiled inference function returning a list of output tensors.
+        """
+        import tensorflow as tf
+
+        model = self.model
+        input_spec = tf.TensorSpec(shape=(None, *self.input_shape), dtype=tf.float32, name="ecg")
+
+        @tf.function(input_signature=[input_spec])
+        def infer(ecg):
+            outputs = model(ecg, training=False)
+            return list(outputs) if isinstance(outputs, (list, tuple)) else [outputs]
+
+        logger.debug("Built compiled inference function with input signature: %s", input_spec)
+        return infer
+
+    def warmup(self):
+        """
+        Run one dummy prediction so tracing and kernel initialization happen before the first request.
+        """
+        start = time.perf_counter()
+        self.predict(np.zeros((1, *self.input_shape), dtype=np.float32))
+        logger.info("Model warmed up in %.3f s (inference mode: %s)", time.perf_counter() - start, self.inference_mode)
+
+    @timed("inference")
     def predict(self, ecg_tensor):
         """
         Make predictions on the provided ECG tensor using the loaded model.
@@ -93,7 +611,281 @@ class ECGModel:
         Returns:
             list: A list of predictions corresponding to the model's outputs.
         """
-        logger.info("Making predictions with ECG tensor of shape: %s", ecg_tensor.shape)
-        predictions = self.model.predict(ecg_tensor)  # Make predictions with the model
-        logger.info("Predictions made successfully")
+        logger.debug("Making predictions with ECG tensor of shape: %s", ecg_tensor.shape)
+        if self._inference_fn is not None:
+            outputs = self._inference_fn(np.asarray(ecg_tensor, dtype=np.float32))
+            predictions = [np.asarray(output) for output in outputs]
+        else:
+            predictions = self.model.predict(ecg_tensor)  # Make predictions with the model
+        logger.debug("Predictions made successfully")
         return predictions
+
+    @timed("embed")
+    def embed(self, ecg_tensor):
+        """
+        Compute the embedding of each ECG, i.e. the output of the layer all output heads are computed from.
+
+        The embedding function is built on the first call. The SavedModel export carries it; otherwise it needs the
+        Keras model, so when the model was loaded from a cached TensorFlow Lite conversion, or from an export for
+        another embedding layer, the `.h5` file is loaded once more.
+
+        Args:
+            ecg_tensor (np.ndarray): A tensor of shape (n, 5000, 12) containing preprocessed ECG data.
+
+        Returns:
+            np.ndarray: A float32 array of shape (n, embedding_dim).
+        """
+        embeddings = np.asarray(self._get_embedding_fn()(np.asarray(ecg_tensor, dtype=np.float32)))
+        return embeddings.reshape(len(embeddings), -1)
+
+    def _get_embedding_fn(self):
+        """
+        Return the embedding function, taking it from the loaded export or building it on first use.
+
+        Returns:
+            callable: The function mapping a float32 (n, 5000, 12) tensor to the embedding tensor.
+        """
+        with self._embedding_lock:
+            if self._embedding_fn is None:
+                exported = self._exported_embedding_layer
+                if exported is not None and self.embedding_layer in (None, exported):
+                    self.embedding_layer = exported
+                    self._embedding_fn = self.model.embed
+                else:
+                    self._embedding_fn = self._build_embedding_fn()
+            return self._embedding_fn
+
+    @staticmethod
+    def find_embedding_layer(keras_model):
+        """
+        Find the last layer that every output head depends on, which holds the representation the heads share.
+
+        Args:
+            keras_model (tensorflow.keras.Model): A functional Keras model.
+
+        Returns:
+            str: The name of the layer.
+
+        Raises:
+            ValueError: If the output heads only share the input layer.
+        """
+        import tensorflow as tf
+
+        layers = {layer.name: layer for layer in keras_model.layers}
+
+        def ancestors(name):
+            found, stack = set(), [name]
+            while stack:
+                for node in layers[stack.pop()].inbound_nodes:
+                    for parent in tf.nest.flatten(node.inbound_layers):
+                        if parent.name in layers and parent.name not in found:
+                            found.add(parent.name)
+                            stack.append(parent.name)
+            return found
+
+        shared = set.intersection(*(ancestors(layer.name) for layer in keras_model._output_layers))
+        shared -= {layer.name for layer in keras_model._input_layers}
+        if not shared:
+            raise ValueError("The output heads of the model share no layer besides the input")
+        # Functional models list their layers in topological order
+        return next(layer.name for layer in reversed(keras_model.layers) if layer.name in shared)
+
+    def _build_embedding_fn(self):
+        """
+        Wrap the sub-model from the input to the embedding layer in a tf.function with a fixed input signature.
+
+        Returns:
+            tf.types.experimental.GenericFunction: The compiled function returning the embedding tensor.
+        """
+        import tensorflow as tf
+
+        keras_model = self.model if isinstance(self.model, tf.keras.Model) else self.load_model_from_path(self._model_path)
+        layer_name = self.embedding_layer or self.find_embedding_layer(keras_model)
+        embedding_model = tf.keras.Model(keras_model.inputs, keras_model.get_layer(layer_name).output)
+        input_spec = tf.TensorSpec(shape=(None, *self.input_shape), dtype=tf.float32, name="ecg")
+
+        @tf.function(input_signature=[input_spec])
+        def embed(ecg):
+            return embedding_model(ecg, training=False)
+
+        self.embedding_layer = layer_name
+        logger.info("Built embedding function from layer %s with output shape %s", layer_name, embedding_model.output_shape)
+        return embed
+
+
+class BatchingPredictor:
+    """
+    A micro-batching front end for ECGModel that merges tensors from concurrent callers into one forward pass.
+
+    Callers block in `predict` while a background thread collects pending tensors until either
+    `max_batch_size` samples are queued or the oldest request has waited `max_wait_ms`. The merged
+    batch is run through the wrapped model once and each caller receives its own slice of every output.
+
+    Attributes:
+        ecg_model (ECGModel): The model used for the batched forward passes.
+        max_batch_size (int): The maximum number of samples merged into one forward pass.
+        max_wait (float): The maximum time in seconds the oldest request waits for a batch to fill.
+    """
+
+    def __init__(self, ecg_model, max_batch_size=16, max_wait_ms=10):
+        """
+        Initialize the BatchingPredictor and start its batching thread.
+
+        Args:
+            ecg_model (ECGModel): The loaded ECG model to wrap.
+            max_batch_size (int): The maximum number of samples per forward pass. Defaults to 16.
+            max_wait_ms (float): The maximum time in milliseconds to wait for a batch to fill. Defaults to 10.
+        """
+        self.ecg_model = ecg_model
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.max_wait = max(0.0, float(max_wait_ms)) / 1000.0
+        self._pending = collections.deque()
+        self._condition = threading.Condition()
+        self._closed = False
+        self._worker = threading.Thread(
+            target=self._run, name="ecg-batching-predictor", daemon=True
+        )
+        self._worker.start()
+        logger.info(
+            "BatchingPredictor started with max_batch_size: %s, max_wait_ms: %s",
+            self.max_batch_size,
+            max_wait_ms,
+        )
+
+    @property
+    def model_output_names(self):
+        """list: The output layer names of the wrapped model."""
+        return self.ecg_model.model_output_names
+
+    @property
+    def output_tensormaps(self):
+        """dict: The output tensormaps of the wrapped model."""
+        return self.ecg_model.output_tensormaps
+
+    @property
+    def model_id(self):
+        """str: The identity of the wrapped model."""
+        return self.ecg_model.model_id
+
+    @property
+    def queue_depth(self):
+        """int: The number of requests currently waiting for a forward pass."""
+        return len(self._pending)
+
+    @timed("model")
+    def predict(self, ecg_tensor, timeout=None):
+        """
+        Queue the ECG tensor for the next batched forward pass and wait for its predictions.
+
+        Args:
+            ecg_tensor (np.ndarray): A tensor of shape (n, 5000, 12) containing preprocessed ECG data.
+            timeout (float, optional): The maximum time in seconds to wait for the result.
+
+        Returns:
+            list: A list of predictions corresponding to the model's outputs, each with n rows.
+
+        Raises:
+            RuntimeError: If the predictor has been closed.
+            TimeoutError: If the result is not ready within the timeout. A request still queued is then dropped.
+        """
+        future = Future()
+        entry = (ecg_tensor, future, time.monotonic())
+        with self._condition:
+            if self._closed:
+                raise RuntimeError("BatchingPredictor is closed")
+            self._pending.append(entry)
+            self._condition.notify()
+        try:
+            return future.result(timeout)
+        except TimeoutError:
+            # Abandon the request unless a batch has already taken it, so no forward pass is spent on it
+            with self._condition:
+                if future.cancel():
+                    self._pending.remove(entry)
+                    logger.debug("Dropped a batching request that timed out after %s s", timeout)
+            raise
+
+    def close(self):
+        """
+        Stop the batching thread after the already queued requests have been served.
+        """
+        with self._condition:
+            self._closed = True
+            self._condition.notify()
+        self._worker.join()
+        logger.info("BatchingPredictor closed")
+
+    def _next_batch(self):
+        """
+        Block until a batch is ready and remove it from the pending queue.
+
+        The futures of the batch are marked running, so a caller that times out afterwards can no longer cancel
+        its request; requests cancelled before are removed from the queue by their caller.
+
+        Returns:
+            list: The (tensor, future, enqueued_at) entries of the batch, or None once closed and drained.
+        """
+        with self._condition:
+            while True:
+                while not self._pending:
+                    if self._closed:
+                        return None
+                    self._condition.wait()
+
+                # Wait for the batch to fill up until the oldest request runs out of waiting time
+                deadline = self._pending[0][2] + self.max_wait
+                while self._pending and not self._closed and self._pending_samples() < self.max_batch_size:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._condition.wait(remaining)
+                # Every queued request may have timed out while the batch was filling
+                if self._pending:
+                    break
+
+            batch = [self._pending.popleft()]
+            size = len(batch[0][0])
+            while self._pending and size + len(self._pending[0][0]) <= self.max_batch_size:
+                size += len(self._pending[0][0])
+                batch.append(self._pending.popleft())
+            for _, future, _ in batch:
+                future.set_running_or_notify_cancel()
+            return batch
+
+    def _pending_samples(self):
+        """
+        Count the samples across all pending requests.
+
+        Returns:
+            int: The number of queued samples.
+        """
+        return sum(len(tensor) for tensor, _, _ in self._pending)
+
+    def _run(self):
+        """
+        Serve batches until the predictor is closed.
+        """
+        while True:
+            batch = self._next_batch()
+            if batch is None:
+                return
+            futures = [future for _, future, _ in batch]
+            try:
+                tensors = [tensor for tensor, _, _ in batch]
+                merged = tensors[0] if len(tensors) == 1 else np.concatenate(tensors, axis=0)
+                logger.debug("Running batched forward pass for %d requests (%d samples)", len(batch), len(merged))
+                predictions = self.ecg_model.predict(merged)
+                if not isinstance(predictions, (list, tuple)):
+                    predictions = [predictions]
+
+                # Hand every caller its own rows of each output
+                start = 0
+                for tensor, future, _ in batch:
+                    stop = start + len(tensor)
+                    future.set_result([output[start:stop] for output in predictions])
+                    start = stop
+            except Exception as e:
+                logger.error("Batched prediction failed: %s", e)
+                for future in futures:
+                    if not future.done():
+                        future.set_exception(e)
@@ -0,0 +1,363 @@
+from app.metrics import process_rss_bytes
+import contextlib
+import logging
+import threading
+import time
+
+# Initialize logger for the ModelRegistry
+logger = logging.getLogger(__name__)
+
+
+class _LoadedModel:
+    """
+    One loaded instance of a model version and the leases held on it.
+
+    A version that is unloaded and loaded again while requests still hold the old instance has two of these; the
+    old one is closed when its own last lease is released.
+    """
+
+    __slots__ = ("model", "leases", "retired")
+
+    def __init__(self, model):
+        self.model = model
+        self.leases = 0
+        self.retired = False
+
+
+class _ModelEntry:
+    """
+    The state of one named model version in the registry.
+    """
+
+    def __init__(self, name, spec):
+        self.name = name
+        self.spec = spec
+        self.current = None
+        self.load_lock = threading.Lock()
+        self.load_seconds = None
+        self.memory_bytes = 0
+        self.last_used = 0.0
+        self.loads = 0
+
+
+class ModelRegistry:
+    """
+    Serves several named model versions, loading each on first use and unloading the least recently used ones
+    when the loaded models exceed a memory budget.
+
+    The registry has the predictor interface of `ECGModel` (`predict`, `model_id`, `model_output_names`,
+    `output_tensormaps`) for its default model, so it can be handed to `ECGGradioApp` in place of a model.
+    Every prediction holds a lease on the model it started on: `set_default` switches new requests to another
+    version atomically, while requests already running finish on the old one, and a model is only closed once
+    its last lease is released. Inference therefore goes through `predict` or `lease`; the metadata properties
+    return copies read under a lease, and `get` is only for loading a model or inspecting it.
+
+    Memory per model is measured as the growth of the process resident memory while it loads, which is
+    approximate when models load concurrently and does not count memory held by worker processes.
+
+    Attributes:
+        default (str): The name of the model serving requests that do not ask for a version.
+        memory_budget_bytes (int): The budget for loaded models, or None for no limit.
+    """
+
+    def __init__(self, specs, loader, default=None, memory_budget_bytes=None):
+        """
+        Initialize the ModelRegistry without loading any model.
+
+        Args:
+            specs (dict): The model name mapped to its spec, e.g. {"v2021": {"path": "models/ecg2af.h5"}}.
+            loader (callable): A function taking a name and its spec and returning a loaded model.
+            default (str, optional): The default model name. Defaults to the first name in specs.
+            memory_budget_bytes (int, optional): The budget for loaded models. Models are never unloaded when omitted.
+
+        Raises:
+            ValueError: If there are no specs or the default is not one of them.
+        """
+        if not specs:
+            raise ValueError("ModelRegistry needs at least one model")
+        self._entries = {name: _ModelEntry(name, spec) for name, spec in specs.items()}
+        self.default = default or next(iter(specs))
+        if self.default not in self._entries:
+            raise ValueError(f"Unknown default model: {self.default}. Expected one of {list(self._entries)}")
+        self.memory_budget_bytes = memory_budget_bytes
+        self._loader = loader
+        self._lock = threading.Lock()
+        logger.info(
+            "ModelRegistry initialized with models: %s, default: %s, memory_budget_bytes: %s",
+            list(self._entries), self.default, memory_budget_bytes,
+        )
+
+    @property
+    def names(self):
+        """list: The names of the registered models."""
+        return list(self._entries)
+
+    @property
+    def model_output_names(self):
+        """list: A copy of the output layer names of the default model."""
+        with self.lease() as model:
+            return list(model.model_output_names)
+
+    @property
+    def output_tensormaps(self):
+        """dict: A copy of the output name to tensormap mapping of the default model."""
+        with self.lease() as model:
+            return dict(model.output_tensormaps)
+
+    @property
+    def model_id(self):
+        """str: The identity of the default model."""
+        with self.lease() as model:
+            return model.model_id
+
+    def get(self, name=None):
+        """
+        Return a model, loading it first if needed, without holding a lease on it.
+
+        The model can be evicted, unloaded or replaced and closed as soon as this returns, so the result must
+        not be used for inference; run predictions through `predict` or `lease` instead.
+
+        Args:
+            name (str, optional): The model name. Defaults to the default model.
+
+        Returns:
+            The loaded model.
+        """
+        with self.lease(name) as model:
+            return model
+
+    @contextlib.contextmanager
+    def lease(self, name=None):
+        """
+        Hold a model for the duration of a request, loading it first if needed.
+
+        The model is not closed while a lease is held, even if it is evicted or replaced as the default.
+
+        Args:
+            name (str, optional): The model name. Defaults to the default model at the time of the call.
+
+        Yields:
+            The loaded model.
+
+        Raises:
+            KeyError: If the name is unknown.
+        """
+        loaded = self._acquire(name)
+        try:
+            yield loaded.model
+        finally:
+            self._release(loaded)
+
+    def predict(self, ecg_tensor):
+        """
+        Run the ECG tensor through the default model.
+
+        Args:
+            ecg_tensor (np.ndarray): A tensor of shape (n, 5000, 12) containing preprocessed ECG data.
+
+        Returns:
+            list: A list of predictions corresponding to the model's outputs.
+        """
+        with self.lease() as model:
+            return model.predict(ecg_tensor)
+
+    def set_default(self, name):
+        """
+        Make another model the default, loading it before the switch so no request waits for the load.
+
+        Args:
+            name (str): The name of the new default model.
+
+        Raises:
+            KeyError: If the name is unknown.
+            ValueError: If the model's outputs differ from the current default's, which the post-processing relies on.
+        """
+        with self.lease(name) as model:
+            expected = self.model_output_names
+            if list(model.model_output_names) != expected:
+                raise ValueError(f"Model {name} has outputs {model.model_output_names}, expected {expected}")
+            with self._lock:
+                previous, self.default = self.default, name
+        logger.info("Default model switched from %s to %s", previous, name)
+
+    def unload(self, name):
+        """
+        Unload a model; it is closed once its last lease is released and reloaded on its next use.
+
+        Args:
+            name (str): The model name.
+
+        Raises:
+            KeyError: If the name is unknown.
+            ValueError: If the model is the default.
+        """
+        with self._lock:
+            if name == self.default:
+                raise ValueError("The default model cannot be unloaded")
+            entry = self._entries[name]
+            closing = self._retire(entry)
+        self._close(closing)
+
+    def stats(self):
+        """
+        Report the state of every model.
+
+        Returns:
+            dict: The model name mapped to whether it is loaded and the default, its load time in seconds, its
+            estimated memory in bytes, the open leases on its loaded instance and how often it has been loaded.
+        """
+        with self._lock:
+            return {
+                name: {
+                    "loaded": entry.current is not None,
+                    "default": name == self.default,
+                    "load_seconds": entry.load_seconds,
+                    "memory_bytes": entry.memory_bytes,
+                    "leases": entry.current.leases if entry.current is not None else 0,
+                    "loads": entry.loads,
+                }
+                for name, entry in self._entries.items()
+            }
+
+    def close(self):
+        """
+        Close every loaded model.
+        """
+        with self._lock:
+            closing = [model for entry in self._entries.values() for model in self._retire(entry)]
+        self._close(closing)
+
+    def _acquire(self, name):
+        """
+        Take a lease on a model, loading it while holding only that model's load lock.
+
+        Args:
+            name (str): The model name, or None for the default model.
+
+        Returns:
+            _LoadedModel: The leased instance.
+        """
+        while True:
+            with self._lock:
+                entry = self._entries[name or self.default]
+                if entry.current is not None:
+                    entry.current.leases += 1
+                    entry.last_used = time.monotonic()
+                    return entry.current
+
+            with entry.load_lock:
+                with self._lock:
+                    loaded = entry.current is not None
+                if not loaded:
+                    self._load(entry)
+
+    def _load(self, entry):
+        """
+        Load a model, record its load time and memory and evict least recently used models over the budget.
+
+        Args:
+            entry (_ModelEntry): The entry to load, whose load lock is held.
+        """
+        rss_before = process_rss_bytes()
+        start = time.perf_counter()
+        model = self._loader(entry.name, entry.spec)
+        load_seconds = time.perf_counter() - start
+        memory_bytes = max(0, process_rss_bytes() - rss_before)
+        logger.info("Loaded model %s in %.2f s (~%.0f MB)", entry.name, load_seconds, memory_bytes / 2**20)
+
+        with self._lock:
+            closing = self._retire(entry)
+            entry.current = _LoadedModel(model)
+            entry.load_seconds = load_seconds
+            entry.memory_bytes = memory_bytes
+            entry.last_used = time.monotonic()
+            entry.loads += 1
+            closing += self._evict(keep=entry)
+        self._close(closing)
+
+    def _evict(self, keep):
+        """
+        Retire least recently used models until the loaded models fit the memory budget.
+
+        The default model and the model just loaded are never evicted. Must be called with the registry lock held.
+
+        Args:
+            keep (_ModelEntry): The entry that was just loaded.
+
+        Returns:
+            list: The models that can be closed right away.
+        """
+        if self.memory_budget_bytes is None:
+            return []
+        loaded = [entry for entry in self._entries.values() if entry.current is not None]
+        used = sum(entry.memory_bytes for entry in loaded)
+        closing = []
+        for entry in sorted(loaded, key=lambda entry: entry.last_used):
+            if used <= self.memory_budget_bytes:
+                break
+            if entry is keep or entry.name == self.default:
+                continue
+            logger.info("Evicting model %s to stay within the memory budget", entry.name)
+            used -= entry.memory_bytes
+            closing += self._retire(entry)
+        return closing
+
+    def _retire(self, entry):
+        """
+        Detach the loaded instance of a model, so its next use loads a new one. Must be called with the registry
+        lock held.
+
+        Args:
+            entry (_ModelEntry): The entry to retire.
+
+        Returns:
+            list: The model if it can be closed right away, or an empty list while leases on it are open.
+        """
+        loaded, entry.current = entry.current, None
+        if loaded is None:
+            return []
+        loaded.retired = True
+        return [] if loaded.leases else [loaded.model]
+
+    def _release(self, loaded):
+        """
+        Release a lease and close the instance if it was retired and this was its last lease.
+
+        Args:
+            loaded (_LoadedModel): The leased instance.
+        """
+        with self._lock:
+            loaded.leases -= 1
+            closing = [loaded.model] if loaded.retired and not loaded.leases else []
+        self._close(closing)
+
+    @staticmethod
+    def _close(models):
+        """
+        Close models that have a `close` method, such as batching front ends and replica pools.
+
+        Args:
+            models (list): The models to close.
+        """
+        for model in models:
+            close = getattr(model, "close", None)
+            if close is not None:
+                close()
+
+
+def lease_model(model):
+    """
+    Hold a model for the duration of a request.
+
+    With a `ModelRegistry` this pins its default model, so everything a request derives from the model, such as
+    the prediction cache key and the predictions, comes from the same version even if the default is swapped
+    while the request runs. Any other model is used as is.
+
+    Args:
+        model: A `ModelRegistry`, or any predictor with the `ECGModel` interface.
+
+    Returns:
+        A context manager yielding the model serving the request.
+    """
+    lease = getattr(model, "lease", None)
+    return lease() if lease is not None else contextlib.nullcontext(model)
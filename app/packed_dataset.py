@@ -0,0 +1,274 @@
+import numpy as np
+import collections
+import json
+import logging
+import os
+
+# Initialize logger for the packed ECG dataset
+logger = logging.getLogger(__name__)
+
+INDEX_VERSION = 1
+
+
+def packed_paths(prefix):
+    """
+    Build the data and index paths of a packed ECG dataset.
+
+    Args:
+        prefix (str): The path prefix of the dataset, e.g. "data/cohort".
+
+    Returns:
+        tuple: The path of the float32 data file and the path of the JSON index.
+    """
+    return f"{prefix}.f32", f"{prefix}.index.json"
+
+
+def file_id_of(ecg_file, root=None):
+    """
+    Build the ID of an ECG file: its path relative to the cohort root without the extension, so files with the
+    same name in different directories keep distinct IDs. For files directly under the root this is the file name
+    without extension.
+
+    Args:
+        ecg_file (str): The path of the ECG file.
+        root (str, optional): The cohort root, e.g. the scanned directory. Defaults to the file's own directory.
+
+    Returns:
+        str: The file ID, with "/" separating directories.
+    """
+    if root is None:
+        relative = os.path.basename(ecg_file)
+    else:
+        relative = os.path.relpath(os.path.abspath(ecg_file), os.path.abspath(root))
+    return os.path.splitext(relative)[0].replace(os.sep, "/")
+
+
+def pack_ecg_files(ecg_files, prefix, processor, batch_size=64, root=None):
+    """
+    Pack ECG HD5 files into one contiguous float32 array on disk plus a JSON index.
+
+    Every ECG is read and normalized through the processor straight into its row of the memory-mapped output,
+    so the packed rows are exactly the tensors `ecg_as_tensor` would return. Files that fail to load are logged
+    and left out of the dataset.
+
+    Args:
+        ecg_files (list): The paths of the ECG files to pack.
+        prefix (str): The path prefix of the dataset; `<prefix>.f32` and `<prefix>.index.json` are written.
+        processor (ECGProcessor): The processor used to read and normalize the ECGs.
+        batch_size (int): The number of files read per batch. Defaults to 64.
+        root (str, optional): The cohort root the file IDs are relative to, see `file_id_of`.
+
+    Returns:
+        PackedECGDataset: The packed dataset, opened for reading.
+
+    Raises:
+        ValueError: If two files have the same file ID.
+    """
+    data_path, index_path = packed_paths(prefix)
+    _check_unique([file_id_of(ecg_file, root) for ecg_file in ecg_files])
+    row_shape = tuple(processor.ecg_shape)
+    logger.info("Packing %d ECG files into %s", len(ecg_files), data_path)
+
+    records = []
+    if ecg_files:
+        data = np.memmap(data_path, dtype=np.float32, mode="w+", shape=(len(ecg_files), *row_shape))
+        for start in range(0, len(ecg_files), batch_size):
+            batch_files = ecg_files[start:start + batch_size]
+            row = len(records)
+            try:
+                processor.ecg_as_tensor_many(batch_files, out=data[row:row + len(batch_files)])
+                packed_files = batch_files
+            except ValueError:
+                # Fall back to one file at a time so a single bad file only drops itself
+                packed_files = []
+                for ecg_file in batch_files:
+                    try:
+                        processor.ecg_as_tensor_many([ecg_file], out=data[row:row + 1])
+                    except ValueError as e:
+                        logger.error("Skipping ECG file %s: %s", ecg_file, e)
+                        continue
+                    packed_files.append(ecg_file)
+                    row += 1
+            first_row = len(records)
+            records.extend(_record(ecg_file, first_row + i, root) for i, ecg_file in enumerate(packed_files))
+        data.flush()
+        del data
+        # Drop the rows reserved for files that failed to load
+        os.truncate(data_path, len(records) * int(np.prod(row_shape)) * np.dtype(np.float32).itemsize)
+    else:
+        open(data_path, "wb").close()
+
+    index = {
+        "version": INDEX_VERSION,
+        "dtype": "float32",
+        "shape": [len(records), *row_shape],
+        "normalized": True,
+        "ecg_hd5_path": processor.ecg_hd5_path,
+        "ecg_leads": dict(processor.ecg_leads),
+        "records": records,
+    }
+    tmp_index_path = f"{index_path}.tmp"
+    with open(tmp_index_path, "w") as f:
+        json.dump(index, f)
+    os.replace(tmp_index_path, index_path)
+    logger.info("Packed %d of %d ECG files into %s", len(records), len(ecg_files), data_path)
+    return PackedECGDataset(prefix)
+
+
+def _check_unique(file_ids):
+    """
+    Reject file IDs that repeat, which would make one file's rows shadow another's.
+
+    Args:
+        file_ids (list): The file IDs.
+
+    Raises:
+        ValueError: If a file ID repeats.
+    """
+    repeated = sorted(file_id for file_id, count in collections.Counter(file_ids).items() if count > 1)
+    if repeated:
+        raise ValueError(f"File IDs are repeated: {repeated[:5]}. Pack the files relative to a common root directory")
+
+
+def _record(ecg_file, row, root=None):
+    """
+    Build the index record of a packed ECG file.
+
+    The sample ID is the leading token of UK Biobank style file names (`<sample_id>_<field>_<instance>_<array>.hd5`).
+
+    Args:
+        ecg_file (str): The path of the source file.
+        row (int): The row of the ECG in the packed array.
+        root (str, optional): The cohort root the file ID is relative to.
+
+    Returns:
+        dict: The file ID, row, sample ID and source file metadata.
+    """
+    file_id = file_id_of(ecg_file, root)
+    stat = os.stat(ecg_file)
+    return {
+        "file_id": file_id,
+        "row": row,
+        "sample_id": os.path.basename(file_id).split("_")[0],
+        "source": os.path.abspath(ecg_file),
+        "source_size": stat.st_size,
+        "source_mtime": stat.st_mtime,
+    }
+
+
+class PackedECGDataset:
+    """
+    A read-only view of a packed ECG dataset backed by a memory-mapped float32 array.
+
+    Contiguous row ranges are returned as zero-copy views of the mapping, so scanning the dataset in batches
+    runs at memory bandwidth instead of opening one HD5 file per ECG.
+
+    Attributes:
+        prefix (str): The path prefix of the dataset.
+        index (dict): The parsed JSON index.
+        data (np.memmap): The read-only array of shape (N, samples, leads).
+    """
+
+    def __init__(self, prefix):
+        """
+        Open a packed ECG dataset.
+
+        Args:
+            prefix (str): The path prefix of the dataset.
+
+        Raises:
+            ValueError: If the index is missing, has an unsupported version, repeats a file ID or does not match the
+                data file.
+        """
+        self.prefix = prefix
+        data_path, index_path = packed_paths(prefix)
+        try:
+            with open(index_path) as f:
+                self.index = json.load(f)
+        except Exception as e:
+            raise ValueError(f"Failed to read packed ECG index {index_path}: {e}")
+        if self.index.get("version") != INDEX_VERSION:
+            raise ValueError(f"Unsupported packed ECG index version: {self.index.get('version')}")
+
+        shape = tuple(self.index["shape"])
+        expected_size = int(np.prod(shape)) * np.dtype(np.float32).itemsize
+        if os.path.getsize(data_path) != expected_size:
+            raise ValueError(f"Packed ECG data {data_path} does not match the shape {shape} in its index")
+        if shape[0]:
+            self.data = np.memmap(data_path, dtype=np.float32, mode="r", shape=shape)
+        else:
+            self.data = np.empty(shape, dtype=np.float32)
+
+        self.records = self.index["records"]
+        _check_unique([record["file_id"] for record in self.records])
+        self._rows_by_file_id = {record["file_id"]: record["row"] for record in self.records}
+        logger.info("Opened packed ECG dataset %s with %d ECGs", prefix, shape[0])
+
+    def __len__(self):
+        return self.data.shape[0]
+
+    @property
+    def file_ids(self):
+        """list: The file IDs in row order."""
+        return [record["file_id"] for record in self.records]
+
+    @property
+    def sample_ids(self):
+        """list: The sample IDs in row order."""
+        return [record["sample_id"] for record in self.records]
+
+    def row_of(self, file_id):
+        """
+        Look up the row of a file ID.
+
+        Args:
+            file_id (str): The file ID, i.e. the source file path relative to the cohort root without extension.
+
+        Returns:
+            int: The row of the ECG in the packed array.
+
+        Raises:
+            KeyError: If the file ID is not in the dataset.
+        """
+        return self._rows_by_file_id[file_id]
+
+    def batch(self, start, stop):
+        """
+        Return a zero-copy view of a contiguous range of ECGs.
+
+        Args:
+            start (int): The first row.
+            stop (int): The row after the last one.
+
+        Returns:
+            np.ndarray: A read-only view of shape (stop - start, samples, leads).
+        """
+        return self.data[start:stop]
+
+    def iter_batches(self, batch_size):
+        """
+        Iterate over the dataset in contiguous zero-copy batches.
+
+        Args:
+            batch_size (int): The number of ECGs per batch.
+
+        Yields:
+            tuple: The file IDs of the batch and the read-only view of its ECGs.
+        """
+        for start in range(0, len(self), batch_size):
+            stop = min(start + batch_size, len(self))
+            yield [record["file_id"] for record in self.records[start:stop]], self.data[start:stop]
+
+    def take(self, file_ids):
+        """
+        Gather the ECGs of arbitrary file IDs into a new array.
+
+        Unlike `batch`, this copies, since the rows are generally not contiguous.
+
+        Args:
+            file_ids (list): The file IDs to gather.
+
+        Returns:
+            np.ndarray: An array of shape (len(file_ids), samples, leads).
+        """
+        return self.data[[self.row_of(file_id) for file_id in file_ids]]
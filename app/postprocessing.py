@@ -0,0 +1,95 @@
+import numpy as np
+import logging
+
+# Initialize logger for the OutputPostProcessor
+logger = logging.getLogger(__name__)
+
+# Result fields of the four ECG2AF outputs, in the model's output order
+OUTPUT_FIELDS = ("af_risk", "sex_probs", "age", "af_probs")
+
+
+class OutputPostProcessor:
+    """
+    Converts batched raw model outputs into per-sample results in one vectorized NumPy pass.
+
+    The survival curve output is turned into the cumulative AF-free survival at every bin together with the
+    day offset of each bin, and the AF risk is one minus the survival at the end of the window.
+
+    Attributes:
+        model_output_names (list): The model's output layer names, in output order.
+        output_tensormaps (dict): A dictionary mapping output names to their tensormap objects.
+    """
+
+    def __init__(self, model_output_names, output_tensormaps):
+        """
+        Initialize the OutputPostProcessor.
+
+        Args:
+            model_output_names (list): The model's output layer names, in output order.
+            output_tensormaps (dict): A dictionary mapping output names to their tensormap objects.
+        """
+        self.model_output_names = list(model_output_names)
+        self.output_tensormaps = output_tensormaps
+
+    def process(self, predictions):
+        """
+        Post-process a batch of model outputs.
+
+        Args:
+            predictions (list): The raw outputs of the model, one array of shape (N, ...) per output.
+
+        Returns:
+            dict: Arrays keyed by result field:
+                "af_risk" (N,) probability of incident AF within the survival window,
+                "survival_curve" (N, intervals) predicted AF-free survival at the end of each bin,
+                "survival_days" (intervals,) day offset of the end of each bin,
+                "sex_probs" (N, 2) male and female probabilities,
+                "age" (N,) predicted age,
+                "af_probs" (N, 2) probabilities of AF being present and absent.
+        """
+        results = {}
+        for field, name, pred in zip(OUTPUT_FIELDS, self.model_output_names, predictions):
+            pred = np.asarray(pred)
+            otm = self.output_tensormaps[name]
+            if otm.is_survival_curve():
+                intervals = otm.shape[-1] // 2
+                days_per_bin = 1 + otm.days_window // intervals
+                survival = np.cumprod(pred[:, :intervals], axis=1)
+                results["survival_curve"] = survival
+                results["survival_days"] = days_per_bin * np.arange(1, intervals + 1)
+                results[field] = 1 - survival[:, -1]
+            elif pred.shape[-1] == 1:
+                results[field] = pred[:, 0]
+            else:
+                results[field] = pred
+        logger.debug("Post-processed outputs for %d samples", len(results[OUTPUT_FIELDS[0]]))
+        return results
+
+    @staticmethod
+    def to_records(results, include_curve=False):
+        """
+        Split post-processed batch results into one plain-Python dictionary per sample.
+
+        Args:
+            results (dict): The output of `process`.
+            include_curve (bool): Whether to include the full survival curve and its day offsets. Defaults to False.
+
+        Returns:
+            list: One dictionary per sample with the AF risk, sex and AF probabilities and age.
+        """
+        columns = {
+            "af_risk": results["af_risk"].tolist(),
+            "sex_male_prob": results["sex_probs"][:, 0].tolist(),
+            "sex_female_prob": results["sex_probs"][:, 1].tolist(),
+            "age": results["age"].tolist(),
+            "af_yes_prob": results["af_probs"][:, 0].tolist(),
+            "af_no_prob": results["af_probs"][:, 1].tolist(),
+        }
+        if include_curve:
+            columns["survival_curve"] = results["survival_curve"].tolist()
+        records = [dict(zip(columns, values)) for values in zip(*columns.values())]
+        if include_curve:
+            survival_days = results["survival_days"].tolist()
+            for record in records:
+                record["survival_days"] = survival_days
+        return records
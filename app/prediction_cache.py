@@ -0,0 +1,223 @@
+from concurrent.futures import Future
+import numpy as np
+import collections
+import hashlib
+import logging
+import os
+import tempfile
+import threading
+
+# Initialize logger for the PredictionCache
+logger = logging.getLogger(__name__)
+
+
+class PredictionCache:
+    """
+    A content-addressed cache of raw model outputs with a bounded in-memory LRU tier and an optional on-disk tier.
+
+    Entries are keyed by the hash of the uploaded ECG bytes together with the model identity, so a re-uploaded ECG
+    skips both the HD5 parse and the forward pass. Concurrent lookups of the same key share one computation.
+
+    Attributes:
+        max_entries (int): The maximum number of entries kept in memory.
+        disk_dir (str): The directory of the on-disk tier, or None when disabled.
+    """
+
+    def __init__(self, max_entries=1024, disk_dir=None):
+        """
+        Initialize the PredictionCache.
+
+        Args:
+            max_entries (int): The maximum number of entries kept in memory. Defaults to 1024.
+            disk_dir (str, optional): The directory of the on-disk tier. The tier is disabled when omitted.
+        """
+        self.max_entries = max(1, int(max_entries))
+        self.disk_dir = disk_dir
+        self._entries = collections.OrderedDict()
+        self._in_flight = {}
+        self._lock = threading.Lock()
+        self._stats = collections.Counter(hits=0, disk_hits=0, shared=0, misses=0, evictions=0)
+        if disk_dir:
+            os.makedirs(disk_dir, exist_ok=True)
+        logger.info("PredictionCache initialized with max_entries: %s, disk_dir: %s", self.max_entries, disk_dir)
+
+    @staticmethod
+    def make_key(ecg_bytes, model_id):
+        """
+        Build the cache key of an uploaded ECG for a given model.
+
+        Args:
+            ecg_bytes (bytes): The raw bytes of the uploaded ECG file.
+            model_id (str): The identity of the model producing the outputs.
+
+        Returns:
+            str: The hex digest identifying the entry.
+        """
+        digest = hashlib.sha256()
+        digest.update(str(model_id).encode())
+        digest.update(b"\0")
+        digest.update(ecg_bytes)
+        return digest.hexdigest()
+
+    def get_or_compute(self, key, compute):
+        """
+        Return the cached outputs for the key, computing and storing them on a miss.
+
+        Lookups go to the memory tier, then to an identical computation already in flight, then to the disk tier.
+        Only when all three miss is `compute` called.
+
+        Args:
+            key (str): The cache key built with `make_key`.
+            compute (callable): A function without arguments returning the list of model outputs.
+
+        Returns:
+            list: The model outputs as read-only numpy arrays.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self._stats["hits"] += 1
+                return entry
+            future = self._in_flight.get(key)
+            if future is not None:
+                self._stats["shared"] += 1
+                owner = False
+            else:
+                future = self._in_flight[key] = Future()
+                owner = True
+
+        if not owner:
+            logger.debug("Waiting for in-flight computation of cache key %s", key)
+            return future.result()
+
+        try:
+            entry = self._load_from_disk(key)
+            if entry is None:
+                with self._lock:
+                    self._stats["misses"] += 1
+                entry = self._freeze(compute())
+                self._save_to_disk(key, entry)
+            else:
+                with self._lock:
+                    self._stats["disk_hits"] += 1
+            self._store(key, entry)
+            future.set_result(entry)
+            return entry
+        except Exception as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                self._in_flight.pop(key, None)
+
+    def stats(self):
+        """
+        Report the cache counters.
+
+        Returns:
+            dict: The hit, disk hit, shared in-flight, miss and eviction counts and the current number of entries.
+        """
+        with self._lock:
+            stats = dict(self._stats)
+            stats["entries"] = len(self._entries)
+        return stats
+
+    def clear(self):
+        """
+        Drop every in-memory entry. The on-disk tier is left untouched.
+        """
+        with self._lock:
+            self._entries.clear()
+
+    @staticmethod
+    def _freeze(outputs):
+        """
+        Convert model outputs into read-only arrays so cached entries cannot be modified by callers.
+
+        Args:
+            outputs (list or np.ndarray): The model outputs.
+
+        Returns:
+            list: The outputs as read-only numpy arrays.
+        """
+        if not isinstance(outputs, (list, tuple)):
+            outputs = [outputs]
+        frozen = []
+        for output in outputs:
+            array = np.array(output)
+            array.setflags(write=False)
+            frozen.append(array)
+        return frozen
+
+    def _store(self, key, entry):
+        """
+        Insert an entry into the memory tier, evicting the least recently used entries beyond the limit.
+
+        Args:
+            key (str): The cache key.
+            entry (list): The frozen model outputs.
+        """
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self._stats["evictions"] += 1
+
+    def _disk_path(self, key):
+        """
+        Build the path of an entry in the disk tier, sharded by the first two characters of the key.
+
+        Args:
+            key (str): The cache key.
+
+        Returns:
+            str: The path of the entry file.
+        """
+        return os.path.join(self.disk_dir, key[:2], f"{key}.npz")
+
+    def _load_from_disk(self, key):
+        """
+        Read an entry from the disk tier.
+
+        Args:
+            key (str): The cache key.
+
+        Returns:
+            list: The frozen model outputs, or None when the entry is missing or the disk tier is disabled.
+        """
+        if not self.disk_dir:
+            return None
+        path = self._disk_path(key)
+        if not os.path.exists(path):
+            return None
+        try:
+            with np.load(path) as stored:
+                return self._freeze([stored[f"output_{i}"] for i in range(len(stored.files))])
+        except Exception as e:
+            logger.warning("Ignoring unreadable cache entry %s: %s", path, e)
+            return None
+
+    def _save_to_disk(self, key, entry):
+        """
+        Write an entry to the disk tier atomically, so readers never see a partial file.
+
+        Args:
+            key (str): The cache key.
+            entry (list): The frozen model outputs.
+        """
+        if not self.disk_dir:
+            return
+        path = self._disk_path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = None
+        try:
+            fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+            with os.fdopen(fd, "wb") as f:
+                np.savez(f, **{f"output_{i}": output for i, output in enumerate(entry)})
+            os.replace(tmp_path, path)
+        except Exception as e:
+            logger.warning("Failed to write cache entry %s: %s", path, e)
+            if tmp_path and os.path.exists(tmp_path):
+                os.remove(tmp_path)
@@ -0,0 +1,498 @@
+from multiprocessing import shared_memory
+from app.metrics import timed
+from app.model_handler import restore_tensormaps
+import numpy as np
+import collections
+import multiprocessing
+import logging
+import os
+import threading
+import time
+
+# Initialize logger for the ReplicaPool
+logger = logging.getLogger(__name__)
+
+
+def _worker_main(model_path, model_kwargs, threads, input_name, input_shape, connection):
+    """
+    Run one model replica: load the model, then serve requests arriving on the pipe until told to stop.
+
+    Input tensors are read from the input shared memory block and outputs are written to the output block
+    named by the front end, so only small control messages travel over the pipe.
+
+    Args:
+        model_path (str): The path of the model to load.
+        model_kwargs (dict): Keyword arguments for ECGModel.
+        threads (int): The number of TensorFlow and BLAS threads of this worker.
+        input_name (str): The name of the input shared memory block.
+        input_shape (tuple): The shape of the input block, (max_batch_size, samples, leads).
+        connection (multiprocessing.connection.Connection): The pipe to the front end.
+    """
+    # Pin the thread pools before TensorFlow is imported so the replicas do not oversubscribe the cores
+    for variable in ("OMP_NUM_THREADS", "MKL_NUM_THREADS", "OPENBLAS_NUM_THREADS"):
+        os.environ[variable] = str(threads)
+    import tensorflow as tf
+
+    tf.config.threading.set_intra_op_parallelism_threads(threads)
+    tf.config.threading.set_inter_op_parallelism_threads(1)
+
+    from app.model_handler import ECGModel, describe_tensormaps
+
+    input_block = shared_memory.SharedMemory(name=input_name)
+    output_block = None
+    try:
+        model = ECGModel(model_path, **model_kwargs)
+        inputs = np.ndarray(input_shape, dtype=np.float32, buffer=input_block.buf)
+        widths = [int(np.prod(output.shape[1:])) for output in model.predict(inputs[:1])]
+        tensormaps = describe_tensormaps(model.output_tensormaps.values())
+        connection.send(("ready", list(model.model_output_names), widths, tensormaps))
+
+        outputs = None
+        while True:
+            message = connection.recv()
+            command = message[0]
+            if command == "stop":
+                break
+            if command == "ping":
+                connection.send(("pong",))
+            elif command == "attach":
+                output_block = shared_memory.SharedMemory(name=message[1])
+                outputs = np.ndarray((input_shape[0], sum(widths)), dtype=np.float32, buffer=output_block.buf)
+                connection.send(("attached",))
+            elif command == "predict":
+                size = message[1]
+                try:
+                    offset = 0
+                    for output, width in zip(model.predict(inputs[:size]), widths):
+                        outputs[:size, offset:offset + width] = output.reshape(size, width)
+                        offset += width
+                    connection.send(("ok",))
+                except Exception as e:
+                    connection.send(("error", f"{type(e).__name__}: {e}"))
+    except (EOFError, KeyboardInterrupt):
+        pass
+    finally:
+        inputs = outputs = None
+        input_block.close()
+        if output_block is not None:
+            output_block.close()
+
+
+class _Replica:
+    """
+    The front end's handle on one worker process and its shared memory blocks.
+    """
+
+    def __init__(self, index, input_block, output_block):
+        self.index = index
+        self.input_block = input_block
+        self.output_block = output_block
+        self.process = None
+        self.connection = None
+        self.restarts = 0
+
+
+class ReplicaPool:
+    """
+    Serves predictions from N worker processes, each holding its own loaded model with a pinned thread count.
+
+    Every worker owns an input and an output shared memory block sized for `max_batch_size` ECGs. A request
+    takes an idle worker, copies its tensor into the worker's input block and sends only the batch size over
+    the worker's pipe; the outputs are read back from the output block in the front-end process.
+
+    A worker that fails a request, or stops answering within `request_timeout`, fails only that request and is
+    handed to the monitor thread, which restarts it in the background. Every `health_check_interval` the monitor
+    also pings the idle workers, one at a time so the others stay available to requests, and restarts those that
+    exited or do not answer within `request_timeout`. While every worker is being restarted, requests fail at once
+    instead of waiting for a worker to load the model.
+
+    Attributes:
+        model_path (str): The path of the model the workers load.
+        num_workers (int): The number of worker processes.
+        max_batch_size (int): The largest batch one worker handles in a single call.
+        model_output_names (list): The model's output layer names, reported by the first worker.
+        output_tensormaps (dict): A dictionary mapping output names to their tensormap objects, reported by the first
+            worker.
+        model_id (str): The SHA-256 digest of the model file.
+    """
+
+    def __init__(
+        self,
+        model_path,
+        num_workers=2,
+        threads_per_worker=1,
+        max_batch_size=16,
+        input_shape=(5000, 12),
+        model_kwargs=None,
+        health_check_interval=5.0,
+        request_timeout=60.0,
+        startup_timeout=300.0,
+    ):
+        """
+        Initialize the ReplicaPool and start its workers, waiting until every worker has loaded the model.
+
+        Args:
+            model_path (str): The path of the model the workers load.
+            num_workers (int): The number of worker processes. Defaults to 2.
+            threads_per_worker (int): The TensorFlow intra-op thread count of each worker. Defaults to 1.
+            max_batch_size (int): The largest batch one worker handles in a single call. Defaults to 16.
+            input_shape (tuple): The shape of one ECG input. Defaults to (5000, 12).
+            model_kwargs (dict, optional): Keyword arguments for ECGModel in the workers.
+            health_check_interval (float): Seconds between health checks. Defaults to 5.
+            request_timeout (float): Seconds a worker may take for one request or ping. Defaults to 60.
+            startup_timeout (float): Seconds a worker may take to load the model. Defaults to 300.
+
+        Raises:
+            RuntimeError: If a worker fails to start.
+        """
+        from app.model_handler import ECGModel
+
+        self.model_path = model_path
+        self.num_workers = max(1, int(num_workers))
+        self.threads_per_worker = max(1, int(threads_per_worker))
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.input_shape = tuple(input_shape)
+        self.model_kwargs = dict(model_kwargs or {})
+        self.health_check_interval = health_check_interval
+        self.request_timeout = request_timeout
+        self.startup_timeout = startup_timeout
+        self.model_id = ECGModel.cached_file_digest(model_path)
+        self.output_tensormaps = None
+        self.model_output_names = None
+        self._output_widths = None
+        self._context = multiprocessing.get_context("spawn")
+        self._condition = threading.Condition()
+        self._idle = collections.deque()
+        self._restarting = set()
+        self._closed = threading.Event()
+        self._wake = threading.Event()
+        self._monitor = None
+
+        input_bytes = self.max_batch_size * int(np.prod(self.input_shape)) * np.dtype(np.float32).itemsize
+        self._replicas = [
+            _Replica(index, shared_memory.SharedMemory(create=True, size=input_bytes), None)
+            for index in range(self.num_workers)
+        ]
+        try:
+            for replica in self._replicas:
+                self._start(replica)
+                self._idle.append(replica)
+        except Exception:
+            self.close()
+            raise
+
+        self._monitor = threading.Thread(target=self._monitor_loop, name="replica-pool-monitor", daemon=True)
+        self._monitor.start()
+        logger.info(
+            "ReplicaPool started %d workers with %d threads each", self.num_workers, self.threads_per_worker
+        )
+
+    @property
+    def queue_depth(self):
+        """int: The number of workers serving a request or being restarted."""
+        return self.num_workers - len(self._idle)
+
+    def stats(self):
+        """
+        Report the state of the workers.
+
+        Returns:
+            dict: The number of busy and restarting workers and the number of restarts per worker.
+        """
+        return {
+            "busy_workers": self.queue_depth - len(self._restarting),
+            "restarting_workers": len(self._restarting),
+            **{f"worker_{replica.index}_restarts": replica.restarts for replica in self._replicas},
+        }
+
+    @timed("model")
+    def predict(self, ecg_tensor, timeout=None):
+        """
+        Run the ECG tensor through an idle worker, splitting it into chunks of at most max_batch_size.
+
+        Args:
+            ecg_tensor (np.ndarray): A tensor of shape (n, 5000, 12) containing preprocessed ECG data.
+            timeout (float, optional): The maximum time in seconds to wait for an idle worker.
+
+        Returns:
+            list: A list of predictions corresponding to the model's outputs, each with n rows.
+
+        Raises:
+            RuntimeError: If the pool is closed, no worker becomes idle in time, every worker is being restarted or
+                the worker fails.
+        """
+        if self._closed.is_set():
+            raise RuntimeError("ReplicaPool is closed")
+        chunks = [
+            self._predict_chunk(ecg_tensor[start:start + self.max_batch_size], timeout)
+            for start in range(0, len(ecg_tensor), self.max_batch_size)
+        ]
+        if len(chunks) == 1:
+            return chunks[0]
+        return [np.concatenate(outputs, axis=0) for outputs in zip(*chunks)]
+
+    def close(self):
+        """
+        Stop the monitor and the workers and release the shared memory blocks.
+        """
+        self._closed.set()
+        self._wake.set()
+        with self._condition:
+            self._condition.notify_all()
+        if self._monitor is not None:
+            self._monitor.join()
+        for replica in self._replicas:
+            self._stop(replica)
+            for block in (replica.input_block, replica.output_block):
+                if block is not None:
+                    block.close()
+                    block.unlink()
+            replica.output_block = None
+        logger.info("ReplicaPool closed")
+
+    def _predict_chunk(self, ecg_tensor, timeout):
+        """
+        Run at most max_batch_size ECGs through one idle worker.
+
+        Args:
+            ecg_tensor (np.ndarray): A tensor of shape (n, 5000, 12) with n <= max_batch_size.
+            timeout (float, optional): The maximum time in seconds to wait for an idle worker.
+
+        Returns:
+            list: The outputs for the chunk, copied out of shared memory.
+        """
+        replica = self._acquire(timeout)
+        healthy = False
+        try:
+            if replica.process is None or not replica.process.is_alive():
+                raise RuntimeError(f"Replica {replica.index} is not running")
+            size = len(ecg_tensor)
+            inputs = np.ndarray((self.max_batch_size, *self.input_shape), dtype=np.float32, buffer=replica.input_block.buf)
+            inputs[:size] = ecg_tensor
+            replica.connection.send(("predict", size))
+            reply = self._receive(replica, self.request_timeout)
+            healthy = True
+            if reply[0] != "ok":
+                raise RuntimeError(f"Replica {replica.index} failed to predict: {reply[1]}")
+
+            outputs = np.ndarray(
+                (self.max_batch_size, sum(self._output_widths)), dtype=np.float32, buffer=replica.output_block.buf
+            )
+            predictions, offset = [], 0
+            for width in self._output_widths:
+                predictions.append(np.array(outputs[:size, offset:offset + width]))
+                offset += width
+            return predictions
+        finally:
+            inputs = outputs = None
+            if healthy:
+                self._release(replica)
+            else:
+                self._schedule_restart(replica)
+
+    def _acquire(self, timeout):
+        """
+        Take an idle worker, waiting for one to finish its request.
+
+        Args:
+            timeout (float, optional): The maximum time in seconds to wait.
+
+        Returns:
+            _Replica: The worker, removed from the idle workers until released.
+
+        Raises:
+            RuntimeError: If the pool is closed, every worker is being restarted or none became idle in time.
+        """
+        with self._condition:
+            self._condition.wait_for(
+                lambda: self._idle or self._closed.is_set() or len(self._restarting) == self.num_workers, timeout
+            )
+            if self._closed.is_set():
+                raise RuntimeError("ReplicaPool is closed")
+            if self._idle:
+                return self._idle.popleft()
+            if len(self._restarting) == self.num_workers:
+                raise RuntimeError("Every model replica is restarting")
+            raise RuntimeError("No idle model replica became available in time")
+
+    def _release(self, replica):
+        """
+        Return a healthy worker to the idle workers.
+
+        Args:
+            replica (_Replica): The worker.
+        """
+        with self._condition:
+            self._idle.append(replica)
+            self._condition.notify()
+
+    def _schedule_restart(self, replica):
+        """
+        Hand a failed worker to the monitor thread, which restarts it in the background.
+
+        Args:
+            replica (_Replica): The worker.
+        """
+        with self._condition:
+            self._restarting.add(replica)
+            # Waiters fail at once when no worker is left to serve them
+            self._condition.notify_all()
+        self._wake.set()
+
+    def _receive(self, replica, timeout):
+        """
+        Wait for the next message of a worker, giving up when it dies or the timeout passes.
+
+        Args:
+            replica (_Replica): The worker to read from.
+            timeout (float): The maximum time to wait in seconds.
+
+        Returns:
+            tuple: The message.
+
+        Raises:
+            RuntimeError: If the worker died or did not answer in time.
+        """
+        deadline = time.monotonic() + timeout
+        while not replica.connection.poll(0.1):
+            if self._closed.is_set():
+                raise RuntimeError("ReplicaPool is closed")
+            if not replica.process.is_alive():
+                raise RuntimeError(f"Replica {replica.index} exited with code {replica.process.exitcode}")
+            if time.monotonic() > deadline:
+                raise RuntimeError(f"Replica {replica.index} did not answer within {timeout} s")
+        try:
+            return replica.connection.recv()
+        except EOFError:
+            raise RuntimeError(f"Replica {replica.index} closed its connection")
+
+    def _start(self, replica):
+        """
+        Start the worker process of a replica and wait until it has loaded the model.
+
+        Args:
+            replica (_Replica): The replica to start.
+
+        Raises:
+            RuntimeError: If the worker fails to start.
+        """
+        parent_connection, child_connection = self._context.Pipe()
+        replica.connection = parent_connection
+        replica.process = self._context.Process(
+            target=_worker_main,
+            args=(
+                self.model_path,
+                self.model_kwargs,
+                self.threads_per_worker,
+                replica.input_block.name,
+                (self.max_batch_size, *self.input_shape),
+                child_connection,
+            ),
+            name=f"ecg-replica-{replica.index}",
+            daemon=True,
+        )
+        replica.process.start()
+        child_connection.close()
+
+        reply = self._receive(replica, self.startup_timeout)
+        if reply[0] != "ready":
+            raise RuntimeError(f"Replica {replica.index} sent {reply[0]} instead of ready")
+        if self._output_widths is None:
+            self.model_output_names, self._output_widths = reply[1], reply[2]
+            self.output_tensormaps = restore_tensormaps(reply[3])
+        if replica.output_block is None:
+            output_bytes = self.max_batch_size * sum(self._output_widths) * np.dtype(np.float32).itemsize
+            replica.output_block = shared_memory.SharedMemory(create=True, size=output_bytes)
+        replica.connection.send(("attach", replica.output_block.name))
+        self._receive(replica, self.request_timeout)
+        logger.info("Replica %d started with pid %s", replica.index, replica.process.pid)
+
+    def _stop(self, replica):
+        """
+        Stop the worker process of a replica, killing it when it does not exit on request.
+
+        Args:
+            replica (_Replica): The replica to stop.
+        """
+        if replica.process is None:
+            return
+        try:
+            if replica.process.is_alive():
+                replica.connection.send(("stop",))
+                replica.process.join(5)
+        except (OSError, ValueError):
+            pass
+        if replica.process.is_alive():
+            replica.process.kill()
+            replica.process.join()
+        replica.connection.close()
+        replica.process = None
+
+    def _restart(self, replica):
+        """
+        Replace the worker process of a replica, keeping its shared memory blocks.
+
+        Args:
+            replica (_Replica): The replica to restart.
+
+        Returns:
+            bool: Whether the new worker started.
+        """
+        logger.warning("Restarting replica %d", replica.index)
+        self._stop(replica)
+        replica.restarts += 1
+        try:
+            self._start(replica)
+            return True
+        except Exception as e:
+            logger.error("Failed to restart replica %d: %s", replica.index, e)
+            self._stop(replica)
+            return False
+
+    def _monitor_loop(self):
+        """
+        Restart the workers that failed a request or a health check, retrying failed restarts, then ping the idle workers.
+
+        The loop runs every `health_check_interval` seconds, and at once when a request hands over a failed worker.
+        """
+        while not self._closed.is_set():
+            self._wake.wait(self.health_check_interval)
+            self._wake.clear()
+            with self._condition:
+                pending = sorted(self._restarting, key=lambda r: r.index)
+            for replica in pending:
+                if self._closed.is_set():
+                    break
+                if self._restart(replica):
+                    with self._condition:
+                        self._restarting.discard(replica)
+                        self._idle.append(replica)
+                        self._condition.notify()
+            self._ping_idle()
+
+    def _ping_idle(self):
+        """
+        Ping each idle worker and hand those that exited or miss `request_timeout` to the restart.
+
+        A worker is only taken off the idle workers while its own ping is in flight, and one that a request took in
+        the meantime is skipped, so a healthy pool keeps serving requests during the check.
+        """
+        with self._condition:
+            candidates = list(self._idle)
+        for replica in candidates:
+            with self._condition:
+                if self._closed.is_set():
+                    return
+                if replica not in self._idle:
+                    continue
+                self._idle.remove(replica)
+            try:
+                replica.connection.send(("ping",))
+                healthy = self._receive(replica, self.request_timeout)[0] == "pong"
+            except Exception as e:
+                logger.warning("Health check of replica %d failed: %s", replica.index, e)
+                healthy = False
+            if healthy:
+                self._release(replica)
+            else:
+                self._schedule_restart(replica)
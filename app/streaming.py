@@ -0,0 +1,115 @@
+from app.postprocessing import OutputPostProcessor
+import numpy as np
+import logging
+import time
+
+# Initialize logger for the StreamingScorer
+logger = logging.getLogger(__name__)
+
+
+class StreamingScorer:
+    """
+    Scores long recordings, such as multi-minute or 24 hour Holter ECGs, with a sliding window.
+
+    The recording is streamed through `ECGProcessor.iter_windows` as batches of overlapping 10 second windows, each
+    batch goes through the model in one forward pass, and only the per-window AF risk and AF probability are kept,
+    so memory use stays flat regardless of the recording length.
+
+    Attributes:
+        model (ECGModel): The model, or any predictor with the same `predict` interface.
+        processor (ECGProcessor): The processor streaming the windows.
+        stride_seconds (float): The time between the starts of consecutive windows.
+        batch_size (int): The number of windows per forward pass.
+        af_threshold (float): The AF probability at or above which a window counts as AF.
+    """
+
+    def __init__(self, model, processor, stride_seconds=5.0, batch_size=32, af_threshold=0.5):
+        """
+        Initialize the StreamingScorer.
+
+        Args:
+            model (ECGModel): The model used for the predictions.
+            processor (ECGProcessor): The processor streaming the windows.
+            stride_seconds (float): The time between the starts of consecutive windows. Defaults to 5.0.
+            batch_size (int): The number of windows per forward pass. Defaults to 32.
+            af_threshold (float): The AF probability at or above which a window counts as AF. Defaults to 0.5.
+        """
+        self.model = model
+        self.processor = processor
+        self.stride_seconds = stride_seconds
+        self.batch_size = max(1, int(batch_size))
+        self.af_threshold = af_threshold
+        self.postprocessor = OutputPostProcessor(model.model_output_names, model.output_tensormaps)
+        logger.info(
+            "StreamingScorer initialized with stride_seconds: %s, batch_size: %s, af_threshold: %s",
+            stride_seconds, self.batch_size, af_threshold,
+        )
+
+    def score(self, ecg_file, include_timeline=True):
+        """
+        Score every window of a recording and summarize the results.
+
+        Args:
+            ecg_file (str, bytes or file-like): The ECG file.
+            include_timeline (bool): Whether to return the per-window results. Defaults to True.
+
+        Returns:
+            dict: The recording "seconds", the "window_seconds", a "summary" and, when requested, a "timeline" with
+            the "start_seconds", "af_risk" and "af_probability" of each window as lists.
+
+        Raises:
+            ValueError: If the file cannot be read.
+        """
+        header = self.processor.read_header(ecg_file)
+        window_seconds = self.processor.ecg_shape[0] / self.processor.sample_rate
+        started = time.perf_counter()
+
+        starts, af_risk, af_probability = [], [], []
+        for window_starts, batch in self.processor.iter_windows(ecg_file, self.stride_seconds, self.batch_size):
+            results = self.postprocessor.process(self.model.predict(batch))
+            starts.append(window_starts)
+            af_risk.append(results["af_risk"])
+            af_probability.append(results["af_probs"][:, 0])
+
+        timeline = {
+            "start_seconds": np.concatenate(starts),
+            "af_risk": np.concatenate(af_risk),
+            "af_probability": np.concatenate(af_probability),
+        }
+        logger.info(
+            "Scored %d windows of %.0f s recording in %.2f s",
+            len(timeline["start_seconds"]), header["seconds"], time.perf_counter() - started,
+        )
+
+        report = {
+            "seconds": header["seconds"],
+            "window_seconds": window_seconds,
+            "summary": self.summarize(timeline),
+        }
+        if include_timeline:
+            report["timeline"] = {name: values.tolist() for name, values in timeline.items()}
+        return report
+
+    def summarize(self, timeline):
+        """
+        Aggregate per-window results into a per-recording summary.
+
+        Args:
+            timeline (dict): Arrays of the "start_seconds", "af_risk" and "af_probability" of each window.
+
+        Returns:
+            dict: The number of windows, the mean and max AF risk and when the max occurs, the number and fraction
+            (AF burden) of windows classified as AF, and the start of the first AF window or None.
+        """
+        af_risk = timeline["af_risk"]
+        af_windows = timeline["af_probability"] >= self.af_threshold
+        peak = int(np.argmax(af_risk))
+        return {
+            "windows": int(len(af_risk)),
+            "mean_af_risk": float(af_risk.mean()),
+            "max_af_risk": float(af_risk[peak]),
+            "max_af_risk_start_seconds": float(timeline["start_seconds"][peak]),
+            "af_windows": int(af_windows.sum()),
+            "af_burden": float(af_windows.mean()),
+            "first_af_start_seconds": float(timeline["start_seconds"][af_windows.argmax()]) if af_windows.any() else None,
+        }
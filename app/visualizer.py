@@ -1,33 +1,125 @@
-import matplotlib.pyplot as plt
+from matplotlib.figure import Figure
+from app.metrics import timed
+import functools
+import html
+
+BAR_COLORS = ["#1f77b4", "#ff7f0e"]
+
+# Geometry of the SVG bar chart, in pixels
+SVG_WIDTH = 420
+SVG_LABEL_WIDTH = 70
+SVG_BAR_AREA = 280
+SVG_BAR_HEIGHT = 28
+SVG_ROW_HEIGHT = 44
 
 
 class Visualizer:
     """
     A class used to visualize model predictions by generating bar charts.
 
+    Two rendering backends are available. "svg" fills a cached SVG template per label set and returns an HTML
+    string, which costs microseconds and allocates no figure at all. "matplotlib" builds a figure with the
+    object-oriented `matplotlib.figure.Figure` API instead of `pyplot`, so the figure is not registered with
+    pyplot's global figure manager and is freed as soon as the caller drops it.
+
+    Attributes:
+        backend (str): The rendering backend, either "svg" or "matplotlib".
+
     Methods:
-        plot_probability_bar_chart(probs, labels=["Category 1", "Category 2"]):
+        render_bar_chart(probs, labels=["Category 1", "Category 2"]):
+            Creates a horizontal bar chart of prediction probabilities with the instance's backend.
+        plot_probability_bar_chart(probs, labels=["Category 1", "Category 2"], backend="matplotlib"):
             Creates a horizontal bar chart to display prediction probabilities for given categories.
     """
 
+    BACKENDS = ("svg", "matplotlib")
+
+    def __init__(self, backend="svg"):
+        """
+        Initialize the Visualizer.
+
+        Args:
+            backend (str): The rendering backend, either "svg" or "matplotlib". Defaults to "svg".
+
+        Raises:
+            ValueError: If the backend is unknown.
+        """
+        if backend not in self.BACKENDS:
+            raise ValueError(f"Unknown visualization backend: {backend}. Expected one of {self.BACKENDS}")
+        self.backend = backend
+
+    def chart_component(self, label):
+        """
+        Create the Gradio output component that displays charts of this backend.
+
+        Args:
+            label (str): The label of the component.
+
+        Returns:
+            gradio.components.Component: A gr.HTML component for the SVG backend, otherwise a gr.Plot component.
+        """
+        import gradio as gr
+
+        if self.backend == "svg":
+            return gr.HTML(label=label)
+        return gr.Plot(label=label)
+
+    def render_bar_chart(self, probs, labels=["Category 1", "Category 2"]):
+        """
+        Plot a horizontal bar chart of the predicted probabilities with the backend of this Visualizer.
+
+        Args:
+            probs (list): A list of probabilities corresponding to the categories.
+            labels (list): A list of category labels to display on the chart. Defaults to ["Category 1", "Category 2"].
+
+        Returns:
+            str or matplotlib.figure.Figure: The SVG chart as an HTML string, or the generated figure for the matplotlib backend.
+        """
+        return self.plot_probability_bar_chart(probs, labels, backend=self.backend)
+
     @staticmethod
-    def plot_probability_bar_chart(probs, labels=["Category 1", "Category 2"]):
+    @timed("render")
+    def plot_probability_bar_chart(probs, labels=["Category 1", "Category 2"], backend="matplotlib"):
         """
         Plot a horizontal bar chart to visualize the predicted probabilities.
 
         Args:
             probs (list): A list of probabilities corresponding to the categories.
             labels (list): A list of category labels to display on the chart. Defaults to ["Category 1", "Category 2"].
+            backend (str): The rendering backend, either "svg" or "matplotlib". Defaults to "matplotlib", which returns
+                a figure as this method always has.
+
+        Returns:
+            str or matplotlib.figure.Figure: The SVG chart as an HTML string, or the generated figure for the matplotlib backend.
+
+        Raises:
+            ValueError: If the backend is unknown.
+        """
+        if backend == "svg":
+            return Visualizer._svg_bar_chart(probs, labels)
+        if backend == "matplotlib":
+            return Visualizer._matplotlib_bar_chart(probs, labels)
+        raise ValueError(f"Unknown visualization backend: {backend}. Expected one of {Visualizer.BACKENDS}")
+
+    @staticmethod
+    def _matplotlib_bar_chart(probs, labels):
+        """
+        Build the bar chart as a matplotlib figure that is not tracked by pyplot.
+
+        Args:
+            probs (list): A list of probabilities corresponding to the categories.
+            labels (list): A list of category labels.
 
         Returns:
             matplotlib.figure.Figure: The generated figure containing the bar chart.
         """
-        fig, ax = plt.subplots()
+        fig = Figure()
+        ax = fig.subplots()
         classes = labels
         values = probs
 
         # Plot the horizontal bar chart with specified colors for each class
-        ax.barh(classes, values, color=["#1f77b4", "#ff7f0e"])
+        ax.barh(classes, values, color=BAR_COLORS)
 
         # Set the x-axis limits and label
         ax.set_xlim(0, 1)
@@ -38,3 +130,59 @@ class Visualizer:
             ax.text(values[i] + 0.02, i, f"{values[i]*100:.1f}%", va="center")
 
         return fig
+
+    @staticmethod
+    def _svg_bar_chart(probs, labels):
+        """
+        Fill the cached SVG template of the label set with the bar widths and percentages.
+
+        Args:
+            probs (list): A list of probabilities corresponding to the categories.
+            labels (list): A list of category labels.
+
+        Returns:
+            str: The chart as an inline SVG element.
+        """
+        values = {}
+        for i, prob in enumerate(probs):
+            prob = min(max(float(prob), 0.0), 1.0)
+            values[f"w{i}"] = f"{prob * SVG_BAR_AREA:.1f}"
+            values[f"x{i}"] = f"{SVG_LABEL_WIDTH + prob * SVG_BAR_AREA + 6:.1f}"
+            values[f"p{i}"] = f"{prob * 100:.1f}"
+        return _svg_template(tuple(labels)).format(**values)
+
+
+@functools.lru_cache(maxsize=32)
+def _svg_template(labels):
+    """
+    Build the SVG template of a horizontal bar chart for a label set.
+
+    The first label is drawn at the bottom, matching the matplotlib chart.
+
+    Args:
+        labels (tuple): The category labels.
+
+    Returns:
+        str: A `str.format` template with `w<i>`, `x<i>` and `p<i>` fields for each bar's width, text position and percentage.
+    """
+    height = SVG_ROW_HEIGHT * len(labels) + 30
+    rows = []
+    for i, label in enumerate(labels):
+        y = SVG_ROW_HEIGHT * (len(labels) - 1 - i) + 10
+        text_y = y + SVG_BAR_HEIGHT / 2 + 5
+        color = BAR_COLORS[i % len(BAR_COLORS)]
+        label = html.escape(str(label)).replace("{", "{{").replace("}", "}}")
+        rows.append(
+            f'<text x="{SVG_LABEL_WIDTH - 8}" y="{text_y}" text-anchor="end">{label}</text>'
+            f'<rect x="{SVG_LABEL_WIDTH}" y="{y}" width="{{w{i}}}" height="{SVG_BAR_HEIGHT}" fill="{color}"/>'
+            f'<text x="{{x{i}}}" y="{text_y}">{{p{i}}}%</text>'
+        )
+    axis_y = height - 20
+    return (
+        f'<svg xmlns="http://www.w3.org/2000/svg" width="{SVG_WIDTH}" height="{height}" '
+        f'font-family="sans-serif" font-size="13">'
+        + "".join(rows)
+        + f'<line x1="{SVG_LABEL_WIDTH}" y1="{axis_y}" x2="{SVG_LABEL_WIDTH + SVG_BAR_AREA}" y2="{axis_y}" stroke="#444"/>'
+        + f'<text x="{SVG_LABEL_WIDTH + SVG_BAR_AREA / 2}" y="{height - 4}" text-anchor="middle">Predicted Probability</text>'
+        + "</svg>"
+    )
@@ -0,0 +1,221 @@
+import argparse
+import json
+import logging
+import os
+import platform
+import sys
+import tempfile
+import time
+
+import numpy as np
+import yaml
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from app.config import build_processor
+from data.synthetic import write_synthetic_dataset
+
+logger = logging.getLogger(__name__)
+
+
+def summarize(latencies, items_per_call=1):
+    """
+    Summarize per-call latencies.
+
+    Args:
+        latencies (list): The latency of every call in seconds.
+        items_per_call (int): The number of ECGs handled per call. Defaults to 1.
+
+    Returns:
+        dict: The call count, p50/p99/mean latency in milliseconds and ECGs per second.
+    """
+    latencies = np.asarray(latencies)
+    return {
+        "calls": int(len(latencies)),
+        "p50_ms": float(np.percentile(latencies, 50) * 1000),
+        "p99_ms": float(np.percentile(latencies, 99) * 1000),
+        "mean_ms": float(latencies.mean() * 1000),
+        "ecgs_per_second": float(items_per_call * len(latencies) / latencies.sum()),
+    }
+
+
+def timed_calls(fn, args_list):
+    """
+    Call a function once per argument tuple and record each call's latency.
+
+    Args:
+        fn (callable): The function to benchmark.
+        args_list (list): The argument tuples of the calls.
+
+    Returns:
+        list: The latency of every call in seconds.
+    """
+    latencies = []
+    for args in args_list:
+        start = time.perf_counter()
+        fn(*args)
+        latencies.append(time.perf_counter() - start)
+    return latencies
+
+
+def bench_processor(processor, ecg_files, batch_size):
+    """
+    Benchmark per-file and batched ECG loading.
+
+    Args:
+        processor (ECGProcessor): The processor to benchmark.
+        ecg_files (list): The synthetic ECG files.
+        batch_size (int): The batch size of the batched path.
+
+    Returns:
+        dict: Results for "processor_per_file" and "processor_batched".
+    """
+    per_file = timed_calls(processor.ecg_as_tensor, [(f,) for f in ecg_files])
+    buffer = np.empty((batch_size, *processor.ecg_shape), dtype=np.float32)
+    batches = [(ecg_files[i:i + batch_size], buffer) for i in range(0, len(ecg_files) - batch_size + 1, batch_size)]
+    batched = timed_calls(processor.ecg_as_tensor_many, batches)
+    return {
+        "processor_per_file": summarize(per_file),
+        "processor_batched": summarize(batched, batch_size),
+    }
+
+
+def bench_model(model_path, processor, ecg_files, batch_size, repeats):
+    """
+    Benchmark ECGModel inference in every inference mode at batch size 1 and at the given batch size.
+
+    Args:
+        model_path (str): The path of the model to load.
+        processor (ECGProcessor): The processor used to build the input tensors.
+        ecg_files (list): The synthetic ECG files.
+        batch_size (int): The larger batch size.
+        repeats (int): The number of calls per configuration.
+
+    Returns:
+        dict: Results keyed "model_<mode>_batch<size>".
+    """
+    from app.model_handler import ECGModel, INFERENCE_MODES
+
+    batch = processor.ecg_as_tensor_many(ecg_files[:batch_size])
+    results = {}
+    for mode in INFERENCE_MODES:
+        model = ECGModel(model_path, inference_mode=mode, use_saved_model=False)
+        for size in sorted({1, batch_size}):
+            latencies = timed_calls(model.predict, [(batch[:size],)] * repeats)
+            results[f"model_{mode}_batch{size}"] = summarize(latencies, size)
+    return results
+
+
+def bench_end_to_end(model_path, processor, ecg_files, repeats):
+    """
+    Benchmark ECGGradioApp.predict_ecg from uploaded file to rendered outputs, without the prediction cache.
+
+    Args:
+        model_path (str): The path of the model to load.
+        processor (ECGProcessor): The processor used by the app.
+        ecg_files (list): The synthetic ECG files.
+        repeats (int): The number of requests.
+
+    Returns:
+        dict: Results for "predict_ecg_end_to_end".
+    """
+    from app.model_handler import ECGModel
+    from app.interface import ECGGradioApp
+    from app.visualizer import Visualizer
+
+    # Gradio passes uploads as raw bytes
+    payloads = []
+    for ecg_file in ecg_files:
+        with open(ecg_file, "rb") as f:
+            payloads.append(f.read())
+
+    app = ECGGradioApp(ECGModel(model_path, use_saved_model=False), processor, Visualizer(backend="svg"))
+    uploads = [(payloads[i % len(payloads)],) for i in range(repeats)]
+    return {"predict_ecg_end_to_end": summarize(timed_calls(app.predict_ecg, uploads))}
+
+
+def compare(results, baseline, tolerance):
+    """
+    Compare results against a baseline run and report regressions.
+
+    A benchmark regresses when its p50 latency grew by more than the tolerance.
+
+    Args:
+        results (dict): The current benchmark results.
+        baseline (dict): The "results" of a previous run.
+        tolerance (float): The allowed relative p50 increase, e.g. 0.2 for 20%.
+
+    Returns:
+        list: The names of the regressed benchmarks.
+    """
+    regressions = []
+    for name, current in sorted(results.items()):
+        previous = baseline.get(name)
+        if previous is None:
+            continue
+        ratio = current["p50_ms"] / previous["p50_ms"] if previous["p50_ms"] else float("inf")
+        flag = "REGRESSION" if ratio > 1 + tolerance else ""
+        print(f"{name:40s} p50 {previous['p50_ms']:9.3f} -> {current['p50_ms']:9.3f} ms ({ratio:5.2f}x) {flag}")
+        if flag:
+            regressions.append(name)
+    return regressions
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Benchmark ECG loading, inference and end-to-end prediction.")
+    parser.add_argument("--config", default="config/config.yaml", help="Path to the application config")
+    parser.add_argument("--output", default="benchmark_results.json", help="Where to write the JSON results")
+    parser.add_argument("--files", type=int, default=64, help="Number of synthetic ECG files")
+    parser.add_argument("--batch-size", type=int, default=16, help="Batch size of the batched benchmarks")
+    parser.add_argument("--repeats", type=int, default=50, help="Calls per model and end-to-end benchmark")
+    parser.add_argument("--model", help="Model to benchmark instead of the generated stand-in model")
+    parser.add_argument("--skip-model", action="store_true", help="Only benchmark ECG loading")
+    parser.add_argument("--baseline", help="Previous results JSON to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Allowed relative p50 regression")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    logging.basicConfig(level=logging.WARNING)
+    with open(args.config) as f:
+        config = yaml.safe_load(f)
+    processor = build_processor(config)
+
+    results = {}
+    with tempfile.TemporaryDirectory() as work_dir:
+        ecg_files = write_synthetic_dataset(os.path.join(work_dir, "ecgs"), args.files, config)
+        results.update(bench_processor(processor, ecg_files, args.batch_size))
+
+        if not args.skip_model:
+            model_path = args.model
+            if model_path is None:
+                from benchmarks.standin import build_standin_model
+
+                model_path = build_standin_model(os.path.join(work_dir, "standin.h5"), config["ecg_shape"])
+            results.update(bench_model(model_path, processor, ecg_files, args.batch_size, args.repeats))
+            results.update(bench_end_to_end(model_path, processor, ecg_files, args.repeats))
+
+    report = {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "platform": platform.platform(),
+        "python": platform.python_version(),
+        "cpu_count": os.cpu_count(),
+        "settings": {"files": args.files, "batch_size": args.batch_size, "repeats": args.repeats},
+        "results": results,
+    }
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    for name, result in results.items():
+        print(f"{name:40s} p50 {result['p50_ms']:9.3f} ms  p99 {result['p99_ms']:9.3f} ms  {result['ecgs_per_second']:10.1f} ECG/s")
+    print(f"Results written to {args.output}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f)["results"], args.tolerance)
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,41 @@
+from app.model_handler import output_tensormap_list
+
+
+def build_standin_model(path, ecg_shape=(5000, 12)):
+    """
+    Build and save a small Keras model with the same input and the same four named outputs as ECG2AF.
+
+    The output layers are named after the ml4h tensormaps and sized from their shapes, so the model loads
+    through `ECGModel` and its outputs post-process like the real model's. The weights are random.
+
+    Args:
+        path (str): The `.h5` path to save the model to.
+        ecg_shape (tuple): The shape of one ECG input. Defaults to (5000, 12).
+
+    Returns:
+        str: The path of the saved model.
+    """
+    import tensorflow as tf
+
+    ecg = tf.keras.Input(shape=tuple(ecg_shape), name="input_ecg_rest_continuous")
+    x = tf.keras.layers.Conv1D(16, 15, strides=4, activation="relu")(ecg)
+    x = tf.keras.layers.Conv1D(32, 9, strides=4, activation="relu")(x)
+    x = tf.keras.layers.GlobalAveragePooling1D()(x)
+    x = tf.keras.layers.Dense(64, activation="relu", name="embed")(x)
+
+    outputs = []
+    for tm in output_tensormap_list():
+        units = tm.shape[-1]
+        if tm.is_survival_curve():
+            activation = "sigmoid"
+        elif units > 1:
+            activation = "softmax"
+        else:
+            activation = "linear"
+        outputs.append(tf.keras.layers.Dense(units, activation=activation, name=tm.output_name())(x))
+
+    # Keep the real model's output order: survival curve, sex, age, atrial fibrillation
+    survival, age, af, sex = outputs
+    model = tf.keras.Model(ecg, [survival, sex, age, af], name="ecg2af_standin")
+    model.save(path)
+    return path
@@ -0,0 +1,139 @@
+import argparse
+import os
+
+import h5py
+import numpy as np
+import yaml
+
+# Relative amplitude of the P, Q, R, S and T waves per lead, roughly following a normal 12-lead ECG
+LEAD_AMPLITUDES = {
+    "strip_I": (0.10, -0.05, 0.80, -0.15, 0.25),
+    "strip_II": (0.15, -0.08, 1.20, -0.20, 0.35),
+    "strip_III": (0.05, -0.04, 0.50, -0.10, 0.12),
+    "strip_V1": (0.08, 0.00, 0.30, -1.00, -0.10),
+    "strip_V2": (0.10, 0.00, 0.60, -1.40, 0.40),
+    "strip_V3": (0.10, -0.05, 1.00, -0.90, 0.45),
+    "strip_V4": (0.10, -0.10, 1.40, -0.50, 0.45),
+    "strip_V5": (0.10, -0.10, 1.30, -0.30, 0.35),
+    "strip_V6": (0.10, -0.08, 1.00, -0.20, 0.30),
+    "strip_aVF": (0.10, -0.06, 0.85, -0.15, 0.25),
+    "strip_aVL": (0.05, -0.03, 0.30, -0.05, 0.08),
+    "strip_aVR": (-0.12, 0.06, -0.95, 0.18, -0.30),
+}
+
+# Offset from the R peak in seconds and width in seconds of the P, Q, R, S and T waves
+WAVE_OFFSETS = np.array([-0.20, -0.03, 0.0, 0.03, 0.25])
+WAVE_WIDTHS = np.array([0.025, 0.010, 0.012, 0.010, 0.045])
+
+
+def synthetic_leads(ecg_leads, n_samples=5000, sample_rate=500, heart_rate=None, rng=None):
+    """
+    Synthesize a 12-lead ECG as a sum of Gaussian P, Q, R, S and T waves with baseline wander and noise.
+
+    Args:
+        ecg_leads (iterable): The lead names, e.g. the keys of `ecg_leads` in config.yaml.
+        n_samples (int): The number of samples per lead. Defaults to 5000.
+        sample_rate (int): The sampling frequency in Hz. Defaults to 500.
+        heart_rate (float, optional): The heart rate in beats per minute. Drawn between 50 and 100 when omitted.
+        rng (np.random.Generator, optional): The random generator. A fresh one is used when omitted.
+
+    Returns:
+        dict: The lead name mapped to a float32 array of n_samples values in microvolts.
+    """
+    rng = rng or np.random.default_rng()
+    heart_rate = heart_rate or rng.uniform(50, 100)
+    t = np.arange(n_samples) / sample_rate
+
+    # Beat times with a little heart rate variability
+    rr = 60.0 / heart_rate
+    beats = np.cumsum(rng.normal(rr, rr * 0.03, size=int(t[-1] / rr) + 3)) - rr * rng.uniform(0.2, 1.0)
+
+    # Gaussian shape of every wave of every beat at every sample: (waves, samples)
+    centers = beats[None, :] + WAVE_OFFSETS[:, None]
+    waves = np.exp(-0.5 * ((t[None, None, :] - centers[:, :, None]) / WAVE_WIDTHS[:, None, None]) ** 2).sum(axis=1)
+
+    leads = {}
+    for lead in ecg_leads:
+        amplitudes = np.array(LEAD_AMPLITUDES.get(lead, LEAD_AMPLITUDES["strip_II"]))
+        amplitudes = amplitudes * rng.uniform(0.8, 1.2)
+        signal = amplitudes @ waves
+        signal += 0.1 * np.sin(2 * np.pi * rng.uniform(0.1, 0.4) * t + rng.uniform(0, 2 * np.pi))
+        signal += rng.normal(0, 0.02, size=n_samples)
+        leads[lead] = (signal * 1000).astype(np.float32)
+    return leads
+
+
+def write_synthetic_ecg(path, ecg_leads, ecg_hd5_path="ukb_ecg_rest", n_samples=5000, sample_rate=500, seed=None):
+    """
+    Write one synthetic ECG HD5 file in the `<ecg_hd5_path>/<lead>/instance_0` layout.
+
+    Each lead dataset carries its sampling frequency in a `sample_rate` attribute.
+
+    Args:
+        path (str): The path of the HD5 file to write.
+        ecg_leads (iterable): The lead names.
+        ecg_hd5_path (str): The group holding the leads. Defaults to "ukb_ecg_rest".
+        n_samples (int): The number of samples per lead. Defaults to 5000.
+        sample_rate (int): The sampling frequency in Hz. Defaults to 500.
+        seed (int, optional): The random seed, for reproducible files.
+
+    Returns:
+        str: The path of the written file.
+    """
+    leads = synthetic_leads(ecg_leads, n_samples, sample_rate, rng=np.random.default_rng(seed))
+    with h5py.File(path, "w") as hd5:
+        for lead, signal in leads.items():
+            dataset = hd5.create_dataset(f"{ecg_hd5_path}/{lead}/instance_0", data=signal)
+            dataset.attrs["sample_rate"] = sample_rate
+    return path
+
+
+def write_synthetic_dataset(output_dir, count, config, seed=0, **kwargs):
+    """
+    Write a directory of synthetic ECG HD5 files using the leads and HD5 path from the application config.
+
+    Files are named `<sample_id>_20205_2_0.hd5` like UK Biobank resting ECGs.
+
+    Args:
+        output_dir (str): The directory to write into.
+        count (int): The number of files.
+        config (dict): The parsed config.yaml.
+        seed (int): The seed of the first file; file i uses seed + i. Defaults to 0.
+        **kwargs: Passed on to `write_synthetic_ecg`, e.g. n_samples or sample_rate.
+
+    Returns:
+        list: The paths of the written files.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    return [
+        write_synthetic_ecg(
+            os.path.join(output_dir, f"{1000000 + i}_20205_2_0.hd5"),
+            config["ecg_leads"],
+            config["ecg_hd5_path"],
+            seed=seed + i,
+            **kwargs,
+        )
+        for i in range(count)
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Write synthetic 12-lead ECG HD5 files.")
+    parser.add_argument("output_dir", help="Directory to write the files into")
+    parser.add_argument("--count", type=int, default=100, help="Number of files")
+    parser.add_argument("--config", default="config/config.yaml", help="Path to the application config")
+    parser.add_argument("--samples", type=int, default=5000, help="Samples per lead")
+    parser.add_argument("--sample-rate", type=int, default=500, help="Sampling frequency in Hz")
+    parser.add_argument("--seed", type=int, default=0, help="Seed of the first file")
+    args = parser.parse_args()
+
+    with open(args.config) as f:
+        config = yaml.safe_load(f)
+    files = write_synthetic_dataset(
+        args.output_dir, args.count, config, seed=args.seed, n_samples=args.samples, sample_rate=args.sample_rate
+    )
+    print(f"Wrote {len(files)} synthetic ECG files to {args.output_dir}")
+
+
+if __name__ == "__main__":
+    main()
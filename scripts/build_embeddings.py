@@ -0,0 +1,74 @@
+import argparse
+import logging.config
+import os
+import sys
+
+import yaml
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from app.config import build_ecg_model, build_processor
+from app.batch_scoring import ecg_source_root, list_ecg_files
+from app.packed_dataset import PackedECGDataset
+from app.embedding_store import EmbeddingStore, build_embeddings, file_id_of, iter_file_batches
+
+
+def iter_packed_batches(dataset, batch_size):
+    """
+    Yield the file IDs and zero-copy tensors of a packed dataset in batches.
+    """
+    file_ids = dataset.file_ids
+    for start in range(0, len(dataset), batch_size):
+        stop = min(start + batch_size, len(dataset))
+        yield file_ids[start:stop], dataset.batch(start, stop)
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description="Embed ECGs with the model and append them to a memory-mapped embedding store."
+    )
+    parser.add_argument("source", help="Directory of .hd5 files, a manifest with one ECG path per line, or with --packed a packed dataset prefix")
+    parser.add_argument("prefix", help="Store path prefix; <prefix>.f32, <prefix>.ids and <prefix>.index.json are written")
+    parser.add_argument("--packed", action="store_true", help="Read the ECGs from a packed dataset (scripts/pack_ecgs.py)")
+    parser.add_argument("--config", default="config/config.yaml", help="Path to the application config")
+    parser.add_argument("--batch-size", type=int, help="ECGs per forward pass")
+    parser.add_argument("--layer", help="Layer to read the embedding from; defaults to the layer shared by all heads")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    with open(args.config) as f:
+        config = yaml.safe_load(f)
+    logging.config.dictConfig(config["logging"])
+
+    embedding_config = config.get("embeddings", {})
+    batch_size = args.batch_size or embedding_config.get("batch_size", 64)
+    # Embeddings come from the float32 Keras model, so skip the exports of the serving modes
+    model = build_ecg_model(
+        config,
+        inference_mode="keras",
+        warmup=False,
+        use_saved_model=False,
+        embedding_layer=args.layer or embedding_config.get("layer"),
+    )
+    store = EmbeddingStore(args.prefix, model_id=model.model_id)
+
+    if args.packed:
+        batches = iter_packed_batches(PackedECGDataset(args.source), batch_size)
+    else:
+        processor = build_processor(config)
+        # Files embedded by an earlier run are not read again
+        root = ecg_source_root(args.source)
+        ecg_files = [f for f in list_ecg_files(args.source) if file_id_of(f, root) not in store]
+        batches = iter_file_batches(ecg_files, processor, batch_size, root=root)
+
+    summary = build_embeddings(model, store, batches)
+    print(
+        f"Embedded {summary['embedded']} ECGs ({summary['skipped']} already stored) from layer "
+        f"{model.embedding_layer}; {len(store)} ECGs in {args.prefix}"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,42 @@
+import argparse
+import json
+import logging.config
+import os
+import sys
+
+import yaml
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from app.embedding_store import EmbeddingStore
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Find the ECGs most similar to a stored ECG by embedding cosine similarity.")
+    parser.add_argument("prefix", help="Embedding store path prefix (scripts/build_embeddings.py)")
+    parser.add_argument("file_ids", nargs="+", help="IDs of the query ECGs, i.e. their paths relative to the cohort directory without extension")
+    parser.add_argument("--config", default="config/config.yaml", help="Path to the application config")
+    parser.add_argument("-k", type=int, default=10, help="Neighbours per query")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    with open(args.config) as f:
+        config = yaml.safe_load(f)
+    logging.config.dictConfig(config["logging"])
+
+    store = EmbeddingStore(args.prefix)
+    missing = [file_id for file_id in args.file_ids if file_id not in store]
+    if missing:
+        print(f"Not in the embedding store: {', '.join(missing)}")
+        sys.exit(1)
+
+    queries = [store.vector(file_id) for file_id in args.file_ids]
+    ids, scores = store.search(queries, k=args.k, exclude=args.file_ids)
+    for file_id, neighbours, similarities in zip(args.file_ids, ids, scores):
+        print(json.dumps({"query": file_id, "neighbours": [{"id": n, "similarity": round(float(s), 6)} for n, s in zip(neighbours, similarities)]}))
+
+
+if __name__ == "__main__":
+    main()
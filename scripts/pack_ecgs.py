@@ -0,0 +1,41 @@
+import argparse
+import logging.config
+import os
+import sys
+
+import yaml
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from app.config import build_processor
+from app.batch_scoring import ecg_source_root, list_ecg_files
+from app.packed_dataset import pack_ecg_files
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description="Pack ECG HD5 files into one memory-mapped float32 array with an index."
+    )
+    parser.add_argument("source", help="Directory of .hd5 files or a manifest with one ECG path per line")
+    parser.add_argument("prefix", help="Output path prefix; <prefix>.f32 and <prefix>.index.json are written")
+    parser.add_argument("--config", default="config/config.yaml", help="Path to the application config")
+    parser.add_argument("--batch-size", type=int, default=64, help="ECG files read per batch")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    with open(args.config) as f:
+        config = yaml.safe_load(f)
+    logging.config.dictConfig(config["logging"])
+
+    processor = build_processor(config)
+    ecg_files = list_ecg_files(args.source)
+    dataset = pack_ecg_files(
+        ecg_files, args.prefix, processor, batch_size=args.batch_size, root=ecg_source_root(args.source)
+    )
+    print(f"Packed {len(dataset)} of {len(ecg_files)} ECG files into {args.prefix}")
+
+
+if __name__ == "__main__":
+    main()
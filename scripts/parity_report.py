@@ -0,0 +1,118 @@
+import argparse
+import json
+import logging.config
+import os
+import sys
+import time
+
+import numpy as np
+import yaml
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from app.model_handler import INFERENCE_MODES
+from app.config import build_ecg_model, build_processor
+from app.postprocessing import OUTPUT_FIELDS, OutputPostProcessor
+from app.batch_scoring import list_ecg_files
+
+logger = logging.getLogger(__name__)
+
+
+def compare_backends(baseline, candidate, processor, ecg_files, batch_size):
+    """
+    Run every ECG through both models and measure how far the candidate's post-processed outputs deviate.
+
+    Args:
+        baseline (ECGModel): The reference model, normally the float32 model.
+        candidate (ECGModel): The model under test.
+        processor (ECGProcessor): The processor building the input batches.
+        ecg_files (list): The ECG files to compare on.
+        batch_size (int): The ECGs per forward pass.
+
+    Returns:
+        dict: The max and mean absolute deviation of each output field and the inference time of each model.
+    """
+    postprocessor = OutputPostProcessor(baseline.model_output_names, baseline.output_tensormaps)
+    max_deviation = dict.fromkeys(OUTPUT_FIELDS, 0.0)
+    sum_deviation = dict.fromkeys(OUTPUT_FIELDS, 0.0)
+    counts = dict.fromkeys(OUTPUT_FIELDS, 0)
+    seconds = {"baseline": 0.0, "candidate": 0.0}
+
+    buffer = np.empty((batch_size, *processor.ecg_shape), dtype=np.float32)
+    for start in range(0, len(ecg_files), batch_size):
+        batch = processor.ecg_as_tensor_many(ecg_files[start:start + batch_size], out=buffer)
+        results = {}
+        for name, model in (("baseline", baseline), ("candidate", candidate)):
+            began = time.perf_counter()
+            predictions = model.predict(batch)
+            seconds[name] += time.perf_counter() - began
+            results[name] = postprocessor.process(predictions)
+
+        for field in OUTPUT_FIELDS:
+            deviation = np.abs(results["candidate"][field] - results["baseline"][field])
+            max_deviation[field] = max(max_deviation[field], float(deviation.max()))
+            sum_deviation[field] += float(deviation.sum())
+            counts[field] += deviation.size
+        logger.info("Compared %d of %d ECGs", min(start + batch_size, len(ecg_files)), len(ecg_files))
+
+    return {
+        "outputs": {
+            field: {"max_abs_deviation": max_deviation[field], "mean_abs_deviation": sum_deviation[field] / counts[field]}
+            for field in OUTPUT_FIELDS
+        },
+        "baseline_seconds": seconds["baseline"],
+        "candidate_seconds": seconds["candidate"],
+        "speedup": seconds["baseline"] / seconds["candidate"] if seconds["candidate"] else float("inf"),
+    }
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Compare a reduced-precision inference mode against the float32 model.")
+    parser.add_argument("source", help="Directory of .hd5 files or a manifest with one ECG path per line")
+    parser.add_argument("--mode", choices=INFERENCE_MODES, default="tflite_int8", help="Inference mode under test")
+    parser.add_argument("--baseline-mode", choices=INFERENCE_MODES, default="compiled", help="Reference inference mode")
+    parser.add_argument("--config", default="config/config.yaml", help="Path to the application config")
+    parser.add_argument("--limit", type=int, help="Compare on at most this many ECGs")
+    parser.add_argument("--batch-size", type=int, default=32, help="ECGs per forward pass")
+    parser.add_argument("--tolerance", type=float, default=0.01, help="Allowed max AF risk deviation")
+    parser.add_argument("--output", help="Where to write the JSON report")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    with open(args.config) as f:
+        config = yaml.safe_load(f)
+    logging.config.dictConfig(config["logging"])
+
+    ecg_files = list_ecg_files(args.source)[:args.limit]
+    if not ecg_files:
+        logger.error("No ECG files found in %s", args.source)
+        sys.exit(1)
+
+    baseline = build_ecg_model(config, inference_mode=args.baseline_mode)
+    candidate = build_ecg_model(config, inference_mode=args.mode)
+    processor = build_processor(config)
+
+    report = compare_backends(baseline, candidate, processor, ecg_files, args.batch_size)
+    report.update({"baseline_mode": args.baseline_mode, "mode": args.mode, "ecgs": len(ecg_files)})
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+    print(f"{args.mode} vs {args.baseline_mode} on {len(ecg_files)} ECGs")
+    for field, deviation in report["outputs"].items():
+        print(f"{field:10s} max {deviation['max_abs_deviation']:.6f}  mean {deviation['mean_abs_deviation']:.6f}")
+    print(
+        f"inference {report['baseline_seconds']:.2f} s -> {report['candidate_seconds']:.2f} s "
+        f"({report['speedup']:.2f}x speedup)"
+    )
+
+    af_risk_deviation = report["outputs"]["af_risk"]["max_abs_deviation"]
+    if af_risk_deviation > args.tolerance:
+        print(f"AF risk deviates by up to {af_risk_deviation:.6f}, above the tolerance of {args.tolerance}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
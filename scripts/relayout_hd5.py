@@ -0,0 +1,75 @@
+import argparse
+import logging.config
+import os
+import sys
+
+import yaml
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from app.config import build_processor
+from app.batch_scoring import ecg_source_root, list_ecg_files
+from app.hd5_layout import relayout_ecg_file
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description="Rewrite ECG HD5 files so their leads are one chunked (samples, leads) dataset."
+    )
+    parser.add_argument("source", help="Directory of .hd5 files or a manifest with one ECG path per line")
+    parser.add_argument(
+        "target",
+        help="Directory the rewritten files are written to, under their paths relative to the source directory or the manifest's directory",
+    )
+    parser.add_argument("--config", default="config/config.yaml", help="Path to the application config")
+    parser.add_argument(
+        "--compression", choices=["gzip", "lzf", "none"], default="gzip", help="Compression of the lead matrix"
+    )
+    parser.add_argument("--level", type=int, default=4, help="gzip compression level")
+    parser.add_argument("--chunk-kb", type=int, default=1024, help="Target chunk size of long recordings in KiB")
+    parser.add_argument("--overwrite", action="store_true", help="Rewrite files that already exist in the target")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    with open(args.config) as f:
+        config = yaml.safe_load(f)
+    logging.config.dictConfig(config["logging"])
+
+    processor = build_processor(config)
+    compression = None if args.compression == "none" else args.compression
+    ecg_files = list_ecg_files(args.source)
+    root = ecg_source_root(args.source)
+    rewritten, skipped, failed, source_bytes, target_bytes = 0, 0, 0, 0, 0
+    for ecg_file in ecg_files:
+        relative = os.path.relpath(ecg_file, root)
+        # Manifest entries outside the manifest's directory have no place under the target
+        if relative.startswith(os.pardir + os.sep):
+            logging.getLogger(__name__).warning("Skipping %s: not under %s", ecg_file, root)
+            failed += 1
+            continue
+        target = os.path.join(args.target, relative)
+        if os.path.exists(target) and not args.overwrite:
+            skipped += 1
+            continue
+        try:
+            result = relayout_ecg_file(
+                ecg_file, target, processor, compression, args.level, chunk_bytes=args.chunk_kb << 10
+            )
+        except (OSError, ValueError) as e:
+            logging.getLogger(__name__).warning("Skipping %s: %s", ecg_file, e)
+            failed += 1
+            continue
+        rewritten += 1
+        source_bytes += result["source_bytes"]
+        target_bytes += result["target_bytes"]
+
+    print(
+        f"Rewrote {rewritten} of {len(ecg_files)} ECG files into {args.target} "
+        f"({skipped} already present, {failed} failed): {source_bytes / 2**20:.1f} MiB -> {target_bytes / 2**20:.1f} MiB"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -1,45 +1,208 @@
+import time
+
+_process_start = time.perf_counter()
+
 import yaml
-from app.model_handler import ECGModel
-from app.ecg_processor import ECGProcessor
+from app.model_handler import ECGModel, BatchingPredictor
+from app.config import build_processor, get_model_path, model_kwargs
 from app.visualizer import Visualizer
 from app.interface import ECGGradioApp
+from app.prediction_cache import PredictionCache
+from app.metrics import METRICS, process_rss_bytes, start_metrics_server
+from app.replica_pool import ReplicaPool
+from app.model_registry import ModelRegistry
+from app.api import InferenceAPI
+from app.logging_setup import configure_logging
+from app.admission import AdmissionController
+import contextlib
 import sys
 import os
 import logging
 
+# Seconds spent in each startup phase, reported once the app is ready to launch
+startup_timings = {"imports": time.perf_counter() - _process_start}
+
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
 
 
-def get_model_path(model_path):
+@contextlib.contextmanager
+def startup_phase(name):
+    """
+    Record the duration of a startup phase in `startup_timings`.
+    """
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        startup_timings[name] = time.perf_counter() - start
+
+
+def build_model(config, model_path):
+    """
+    Build the predictor serving the app: the in-process model, optionally behind the batching front end,
+    or a pool of worker processes when replicas are enabled.
     """
-    Resolve the correct path for the model. If the provided path is not absolute,
-    convert it to an absolute path relative to the project root directory.
+    replica_config = config.get("replicas", {})
+    if replica_config.get("enabled", False):
+        return ReplicaPool(
+            model_path,
+            num_workers=replica_config.get("num_workers", 2),
+            threads_per_worker=replica_config.get("threads_per_worker", 1),
+            max_batch_size=replica_config.get("max_batch_size", 16),
+            input_shape=config["ecg_shape"],
+            model_kwargs=model_kwargs(config),
+            health_check_interval=replica_config.get("health_check_interval_s", 5),
+            request_timeout=replica_config.get("request_timeout_s", 60),
+        )
+
+    model = ECGModel(model_path, **model_kwargs(config))
+    startup_timings.update({f"model.{phase}": seconds for phase, seconds in model.startup_timings.items()})
+
+    batching_config = config.get("batching", {})
+    if batching_config.get("enabled", False):
+        model = BatchingPredictor(
+            model,
+            max_batch_size=batching_config.get("max_batch_size", 16),
+            max_wait_ms=batching_config.get("max_wait_ms", 10),
+        )
+    return model
+
+
+def build_registry(config):
     """
-    project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
-    if not os.path.isabs(model_path):
-        model_path = os.path.join(project_root, model_path)
+    Build the registry of named model versions from the `models` section, loading only the default model now.
+
+    Each version is built like the single model, with its own path and optional `inference` overrides. Without
+    a `models` section the registry serves `model_path` as its only version.
+    """
+    models_config = config.get("models") or {}
+    versions = models_config.get("versions") or {"default": {"path": config["model_path"]}}
+
+    def load_version(name, spec):
+        inference_config = {**config.get("inference", {}), **spec.get("inference", {})}
+        return build_model({**config, "inference": inference_config}, get_model_path(spec["path"]))
+
+    budget_mb = models_config.get("memory_budget_mb")
+    registry = ModelRegistry(
+        versions,
+        load_version,
+        default=models_config.get("default"),
+        memory_budget_bytes=int(budget_mb * (1 << 20)) if budget_mb else None,
+    )
+    registry.get()
+    return registry
+
+
+def main():
+    with startup_phase("config"):
+        with open("config/config.yaml") as f:
+            config = yaml.safe_load(f)
+
+        # Initialize logging behind a background queue
+        log_config = config.get("log_pipeline", {})
+        configure_logging(
+            config["logging"],
+            use_queue=log_config.get("queue", True),
+            queue_size=log_config.get("queue_size", 10000),
+            sample_every=log_config.get("sample_every", 1),
+            sample_level=log_config.get("sample_level", "INFO"),
+            sampled_loggers=log_config.get("sampled_loggers", ()),
+        )
+
+    logger = logging.getLogger(__name__)
+
+    with startup_phase("model"):
+        registry = build_registry(config)
+    # Only inspected for its type; requests run through the registry, which leases the model they use
+    model = registry.get()
+    # Log the model versions being served
+    logger.info("Serving model versions %s, default: %s (%s)", registry.names, registry.default, registry.model_id)
+
+    processor = build_processor(config)
+    visualizer = Visualizer(backend=config.get("visualization", {}).get("backend", "svg"))
+
+    cache_config = config.get("prediction_cache", {})
+    cache = None
+    if cache_config.get("enabled", False):
+        cache = PredictionCache(
+            max_entries=cache_config.get("max_entries", 1024),
+            disk_dir=cache_config.get("disk_dir"),
+        )
 
-    return os.path.abspath(model_path)
+    admission_config = config.get("admission", {})
+    admission = None
+    if admission_config.get("enabled", False):
+        admission = AdmissionController(
+            max_concurrency=admission_config.get("max_concurrency", 4),
+            max_queue=admission_config.get("max_queue", 16),
+            deadline_seconds=admission_config.get("deadline_seconds", 30),
+            retry_after=admission_config.get("retry_after_seconds", 1),
+        )
 
+    app = ECGGradioApp(registry, processor, visualizer, cache=cache, admission=admission)
 
-with open("config/config.yaml") as f:
-    config = yaml.safe_load(f)
+    metrics_config = config.get("metrics", {})
+    if metrics_config.get("enabled", False):
+        METRICS.enabled = True
+        METRICS.register_gauge("process_resident_memory_bytes", "Resident memory of the server process.", process_rss_bytes)
+        # Read through the registry so the gauges follow the default model after a swap
+        if isinstance(model, BatchingPredictor):
+            METRICS.register_gauge(
+                "batching_queue_depth", "Requests waiting for a batched forward pass.",
+                lambda: getattr(registry.get(), "queue_depth", 0),
+            )
+        if isinstance(model, ReplicaPool):
+            METRICS.register_gauge(
+                "replica_pool", "Busy model replicas and restarts per replica.",
+                lambda: getattr(registry.get(), "stats", dict)(),
+            )
+        METRICS.register_gauge(
+            "model_load_seconds", "Load time of each loaded model version.",
+            lambda: {name: stats["load_seconds"] for name, stats in registry.stats().items() if stats["loaded"]},
+        )
+        METRICS.register_gauge(
+            "model_memory_bytes", "Estimated resident memory of each loaded model version.",
+            lambda: {name: stats["memory_bytes"] for name, stats in registry.stats().items() if stats["loaded"]},
+        )
+        if admission is not None:
+            METRICS.register_gauge("admission", "Running, queued, admitted and shed requests.", admission.stats)
+        if cache is not None:
+            METRICS.register_gauge("prediction_cache", "Prediction cache counters and size.", cache.stats)
+        start_metrics_server(METRICS, host=metrics_config.get("host", "0.0.0.0"), port=metrics_config.get("port", 9100))
 
-# Initialize logging
-logging.config.dictConfig(config["logging"])
+    startup_timings["total"] = time.perf_counter() - _process_start
+    logger.info(
+        "Startup timings (s): %s",
+        ", ".join(f"{phase}={seconds:.3f}" for phase, seconds in startup_timings.items()),
+    )
+    api_config = config.get("api", {})
+    api = None
+    if api_config.get("enabled", False):
+        api = InferenceAPI(
+            app,
+            max_files=api_config.get("max_files", 32),
+            max_request_bytes=int(api_config.get("max_request_mb", 64) * (1 << 20)),
+            max_concurrency=api_config.get("max_concurrency", 4),
+            admission=admission,
+        )
 
-# Log the model path
-logger = logging.getLogger(__name__)
+    server_config = config.get("server", {})
+    if admission is not None:
+        # Gradio must hand every request the controller could admit or queue to a handler, so overload reaches the
+        # controller and is shed and counted there instead of waiting in Gradio's queue
+        admissible = admission.max_concurrency + admission.max_queue
+        if (server_config.get("concurrency_limit") or 1) <= admissible:
+            raise ValueError(
+                f"server.concurrency_limit must exceed admission.max_concurrency + admission.max_queue ({admissible})"
+            )
+    app.launch(
+        concurrency_limit=server_config.get("concurrency_limit"),
+        max_queue_size=server_config.get("max_queue_size"),
+        api=api,
+        port=server_config.get("port", 7860),
+    )
 
-model_path = get_model_path(config["model_path"])
-print(f"Model path**************** {model_path}")
-model = ECGModel(model_path)
-processor = ECGProcessor(
-    ecg_shape=config["ecg_shape"],
-    ecg_leads=config["ecg_leads"],
-    ecg_hd5_path=config["ecg_hd5_path"],
-)
-visualizer = Visualizer()
 
-app = ECGGradioApp(model, processor, visualizer)
-app.launch()
+# The guard keeps spawned replica processes from relaunching the app when they import this script
+if __name__ == "__main__":
+    main()
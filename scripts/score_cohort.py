@@ -0,0 +1,65 @@
+import argparse
+import logging.config
+import os
+import sys
+
+import yaml
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from app.config import build_ecg_model, build_processor
+from app.batch_scoring import CohortScorer, CSVResultWriter, ParquetResultWriter, list_ecg_files
+
+logger = logging.getLogger(__name__)
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Score a cohort of ECG HD5 files without the Gradio UI.")
+    parser.add_argument("source", help="Directory of .hd5 files or a manifest with one ECG path per line")
+    parser.add_argument("output", help="Output CSV file, or output directory when --format parquet")
+    parser.add_argument("--format", choices=["csv", "parquet"], default="csv", help="Output format")
+    parser.add_argument("--config", default="config/config.yaml", help="Path to the application config")
+    parser.add_argument("--batch-size", type=int, help="ECGs per forward pass")
+    parser.add_argument("--workers", type=int, help="Number of HD5 reader threads")
+    parser.add_argument("--prefetch-batches", type=int, help="Batches read ahead of the model")
+    parser.add_argument("--no-resume", action="store_true", help="Start a fresh run instead of resuming; refuses to run if the output already exists")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    with open(args.config) as f:
+        config = yaml.safe_load(f)
+    logging.config.dictConfig(config["logging"])
+
+    scoring_config = config.get("batch_scoring", {})
+    writer_class = ParquetResultWriter if args.format == "parquet" else CSVResultWriter
+
+    if args.no_resume and os.path.exists(args.output):
+        logger.error("Output %s already exists; remove it or drop --no-resume", args.output)
+        sys.exit(1)
+    completed = set() if args.no_resume else writer_class.completed_files(args.output)
+
+    model = build_ecg_model(config)
+    processor = build_processor(config)
+    scorer = CohortScorer(
+        model,
+        processor,
+        batch_size=args.batch_size or scoring_config.get("batch_size", 32),
+        num_workers=args.workers or scoring_config.get("num_workers", 4),
+        prefetch_batches=args.prefetch_batches or scoring_config.get("prefetch_batches", 2),
+    )
+
+    writer = writer_class(args.output)
+    try:
+        summary = scorer.score(list_ecg_files(args.source), writer, completed=completed)
+    finally:
+        writer.close()
+    print(
+        f"Scored {summary['scored']} files ({summary['failed']} failed, {summary['skipped']} skipped) "
+        f"at {summary['files_per_second']:.1f} files/s"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+import argparse
+import json
+import logging.config
+import os
+import sys
+
+import yaml
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from app.config import build_ecg_model, build_processor
+from app.streaming import StreamingScorer
+
+logger = logging.getLogger(__name__)
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Score long ECG recordings with a sliding 10 second window.")
+    parser.add_argument("recordings", nargs="+", help="HD5 recordings to score")
+    parser.add_argument("--output", help="Where to write the JSON reports; printed when omitted")
+    parser.add_argument("--config", default="config/config.yaml", help="Path to the application config")
+    parser.add_argument("--stride", type=float, help="Seconds between window starts")
+    parser.add_argument("--batch-size", type=int, help="Windows per forward pass")
+    parser.add_argument("--no-timeline", action="store_true", help="Only report the per-recording summary")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    with open(args.config) as f:
+        config = yaml.safe_load(f)
+    logging.config.dictConfig(config["logging"])
+
+    streaming_config = config.get("streaming", {})
+    model = build_ecg_model(config)
+    processor = build_processor(config)
+    scorer = StreamingScorer(
+        model,
+        processor,
+        stride_seconds=args.stride or streaming_config.get("stride_seconds", 5.0),
+        batch_size=args.batch_size or streaming_config.get("batch_size", 32),
+        af_threshold=streaming_config.get("af_threshold", 0.5),
+    )
+
+    reports = []
+    for recording in args.recordings:
+        try:
+            report = scorer.score(recording, include_timeline=not args.no_timeline)
+        except ValueError as e:
+            logger.error("Skipping %s: %s", recording, e)
+            continue
+        reports.append({"file": recording, **report})
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(reports, f)
+        print(f"Wrote {len(reports)} recording reports to {args.output}")
+    else:
+        print(json.dumps(reports, indent=2))
+    if len(reports) < len(args.recordings):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
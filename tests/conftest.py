@@ -0,0 +1,53 @@
+import importlib.util
+import sys
+import pytest
+
+# Minimal stand-in for the ml4h modules the app imports: the four ECG2AF output tensormaps and the custom objects
+# lookup. Written to disk rather than injected into sys.modules so spawned replica workers import it as well.
+ML4H_STUB = {
+    "ml4h/__init__.py": "",
+    "ml4h/models/__init__.py": "",
+    "ml4h/models/model_factory.py": "def get_custom_objects(tensormaps):\n    return {}\n",
+    "ml4h/tensormap/__init__.py": "",
+    "ml4h/tensormap/ukb/__init__.py": "",
+    "ml4h/tensormap/tensor_map.py": (
+        "class TensorMap:\n"
+        "    def __init__(self, name, interpretation, shape, days_window=None):\n"
+        "        self.name, self.interpretation, self.shape, self.days_window = name, interpretation, shape, days_window\n"
+        "\n"
+        "    def output_name(self):\n"
+        "        return f'output_{self.name}_{self.interpretation}'\n"
+        "\n"
+        "    def is_survival_curve(self):\n"
+        "        return self.interpretation == 'survival_curve'\n"
+    ),
+    "ml4h/tensormap/ukb/survival.py": (
+        "from ml4h.tensormap.tensor_map import TensorMap\n"
+        "mgb_afib_wrt_instance2 = TensorMap('survival_curve_af', 'survival_curve', (100,), days_window=3650)\n"
+    ),
+    "ml4h/tensormap/ukb/demographics.py": (
+        "from ml4h.tensormap.tensor_map import TensorMap\n"
+        "age_2_wide = TensorMap('age_2_wide', 'continuous', (1,))\n"
+        "af_dummy = TensorMap('af_in_read', 'categorical', (2,))\n"
+        "sex_dummy3 = TensorMap('sex', 'categorical', (2,))\n"
+    ),
+}
+
+
+@pytest.fixture(scope="session")
+def ml4h_tensormaps(tmp_path_factory):
+    """
+    Make the ml4h tensormaps importable, using a minimal stub package when ml4h is not installed.
+    """
+    if importlib.util.find_spec("ml4h") is not None:
+        yield
+        return
+    root = tmp_path_factory.mktemp("ml4h_stub")
+    for name, source in ML4H_STUB.items():
+        (root / name).parent.mkdir(parents=True, exist_ok=True)
+        (root / name).write_text(source)
+    sys.path.insert(0, str(root))
+    yield
+    sys.path.remove(str(root))
+    for module in [m for m in sys.modules if m == "ml4h" or m.startswith("ml4h.")]:
+        del sys.modules[module]
@@ -0,0 +1,104 @@
+import threading
+import time
+import pytest
+from app.admission import AdmissionController, ServerBusy, admit, check_deadline
+from app.metrics import request_timings
+
+
+def hold_slots(controller, count):
+    # Occupy slots from other threads until the returned event is set
+    release, entered = threading.Event(), threading.Barrier(count + 1)
+
+    def hold():
+        with controller.admit():
+            entered.wait()
+            release.wait()
+
+    threads = [threading.Thread(target=hold) for _ in range(count)]
+    for thread in threads:
+        thread.start()
+    entered.wait()
+    return release, threads
+
+
+def test_requests_beyond_the_queue_are_shed_at_once():
+    controller = AdmissionController(max_concurrency=1, max_queue=1, deadline_seconds=5)
+    release, threads = hold_slots(controller, 1)
+    queued = controller.reserve()
+    started = time.monotonic()
+    with pytest.raises(ServerBusy) as error:
+        controller.reserve()
+    assert error.value.reason == "queue_full"
+    assert time.monotonic() - started < 0.5
+
+    release.set()
+    for thread in threads:
+        thread.join()
+    with controller.enter(queued):
+        assert controller.stats()["active"] == 1
+    stats = controller.stats()
+    assert stats["shed_queue_full"] == 1 and stats["admitted"] == 2
+    assert stats["active"] == 0 and stats["waiting"] == 0
+
+
+def test_queued_requests_are_dropped_at_their_deadline():
+    controller = AdmissionController(max_concurrency=1, max_queue=4)
+    release, threads = hold_slots(controller, 1)
+    with request_timings() as timings:
+        with pytest.raises(ServerBusy) as error:
+            with controller.admit(deadline_seconds=0.05):
+                pass
+    assert error.value.reason == "deadline"
+    assert timings["admission_wait"] >= 0.05
+    release.set()
+    for thread in threads:
+        thread.join()
+    assert controller.stats()["shed_deadline"] == 1 and controller.stats()["waiting"] == 0
+
+
+def test_ticket_expired_before_entering_is_dropped_with_a_free_slot():
+    controller = AdmissionController(max_concurrency=2, max_queue=0)
+    ticket = controller.reserve(deadline_seconds=0.01)
+    time.sleep(0.02)
+    with pytest.raises(ServerBusy) as error:
+        with controller.enter(ticket):
+            pass
+    assert error.value.reason == "deadline"
+    stats = controller.stats()
+    assert stats["shed_deadline"] == 1 and stats["admitted"] == 0 and stats["waiting"] == 0
+
+
+def test_cancelled_ticket_gives_back_its_place_once():
+    controller = AdmissionController(max_concurrency=1, max_queue=1)
+    ticket = controller.reserve()
+    assert controller.cancel(ticket)
+    assert not controller.cancel(ticket)
+    assert controller.stats()["waiting"] == 0
+    # The place is free again, and the cancelled ticket can no longer take a slot
+    controller.cancel(controller.reserve())
+    with pytest.raises(RuntimeError):
+        with controller.enter(ticket):
+            pass
+    # An entered ticket is owned by the request and cancelling it does nothing
+    entered = controller.reserve()
+    with controller.enter(entered):
+        assert not controller.cancel(entered)
+    assert controller.stats()["waiting"] == 0 and controller.stats()["active"] == 0
+
+
+def test_expired_work_is_dropped_before_the_model():
+    controller = AdmissionController(max_concurrency=2, max_queue=0)
+    with controller.admit(deadline_seconds=0.01):
+        check_deadline()
+        time.sleep(0.02)
+        with pytest.raises(ServerBusy) as error:
+            check_deadline()
+    assert error.value.reason == "expired"
+    assert controller.stats()["shed_expired"] == 1
+    # Outside an admitted request there is no deadline
+    check_deadline()
+
+
+def test_admit_without_controller_runs_unguarded():
+    with admit(None):
+        check_deadline()
@@ -0,0 +1,171 @@
+import asyncio
+import threading
+import types
+import pytest
+import numpy as np
+import yaml
+from app.ecg_processor import ECGProcessor
+from app.postprocessing import OutputPostProcessor
+from data.synthetic import write_synthetic_ecg
+
+pytest.importorskip("fastapi")
+pytest.importorskip("httpx")
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from app.api import InferenceAPI
+
+
+class FakeTensorMap:
+    def __init__(self, shape, survival=False, days_window=None):
+        self.shape = shape
+        self.survival = survival
+        self.days_window = days_window
+
+    def is_survival_curve(self):
+        return self.survival
+
+
+class FakeModel:
+    # Predicts an age equal to the batch row so results can be matched to uploads
+    model_id = "fake"
+    model_output_names = ["survival", "sex", "age", "af"]
+    output_tensormaps = {
+        "survival": FakeTensorMap((100,), survival=True, days_window=3650),
+        "sex": FakeTensorMap((2,)),
+        "age": FakeTensorMap((1,)),
+        "af": FakeTensorMap((2,)),
+    }
+
+    def predict(self, ecg_tensor):
+        n = len(ecg_tensor)
+        return [np.full((n, 100), 0.99), np.full((n, 2), 0.5), np.arange(n, dtype=float)[:, None], np.full((n, 2), 0.5)]
+
+
+@pytest.fixture
+def client():
+    with open("config/config.yaml") as f:
+        config = yaml.safe_load(f)
+    model = FakeModel()
+    ecg_app = types.SimpleNamespace(
+        model=model,
+        processor=ECGProcessor(config["ecg_shape"], config["ecg_leads"], config["ecg_hd5_path"]),
+        postprocessor=OutputPostProcessor(model.model_output_names, model.output_tensormaps),
+    )
+    server = FastAPI()
+    server.include_router(InferenceAPI(ecg_app, max_files=3, max_request_bytes=1 << 20).router())
+    return TestClient(server), ecg_app.processor
+
+
+def upload(processor, tmp_path, name):
+    path = write_synthetic_ecg(str(tmp_path / name), processor.ecg_leads, processor.ecg_hd5_path, seed=0)
+    with open(path, "rb") as f:
+        return ("files", (name, f.read(), "application/octet-stream"))
+
+
+def test_predict_returns_one_record_per_file(client, tmp_path):
+    client, processor = client
+    files = [upload(processor, tmp_path, f"ecg_{i}.hd5") for i in range(2)]
+    response = client.post("/api/predict", files=files)
+    assert response.status_code == 200
+    results = response.json()["results"]
+    assert [result["file"] for result in results] == ["ecg_0.hd5", "ecg_1.hd5"]
+    assert [result["age"] for result in results] == [0.0, 1.0]
+
+
+def test_predict_enforces_limits(client, tmp_path):
+    client, processor = client
+    files = [upload(processor, tmp_path, f"ecg_{i}.hd5") for i in range(4)]
+    assert client.post("/api/predict", files=files).status_code == 413
+
+
+def test_predict_rejects_non_hd5(client):
+    client, _ = client
+    response = client.post("/api/predict", files=[("files", ("notes.txt", b"not an ecg", "text/plain"))])
+    assert response.status_code == 422
+
+
+def test_predict_sheds_requests_when_busy(tmp_path):
+    from app.admission import AdmissionController
+
+    with open("config/config.yaml") as f:
+        config = yaml.safe_load(f)
+    model = FakeModel()
+    ecg_app = types.SimpleNamespace(
+        model=model,
+        processor=ECGProcessor(config["ecg_shape"], config["ecg_leads"], config["ecg_hd5_path"]),
+        postprocessor=OutputPostProcessor(model.model_output_names, model.output_tensormaps),
+    )
+    admission = AdmissionController(max_concurrency=1, max_queue=0)
+    api = InferenceAPI(ecg_app, max_concurrency=4, admission=admission)
+    # Every request the controller lets in gets a thread, so none waits outside the controller
+    assert api._executor._max_workers == 1
+    server = FastAPI()
+    server.include_router(api.router())
+    client = TestClient(server)
+
+    files = [upload(ecg_app.processor, tmp_path, "ecg_0.hd5")]
+    with admission.admit():
+        response = client.post("/api/predict", files=files)
+    assert response.status_code == 503
+    assert response.headers["retry-after"] == "1"
+    assert client.post("/api/predict", files=files).status_code == 200
+
+
+def test_cancelled_request_gives_back_its_admission_ticket():
+    # A client that disconnects while its request is queued on the thread pool must not hold a queue place forever
+    from app.admission import AdmissionController
+
+    admission = AdmissionController(max_concurrency=1, max_queue=1)
+    api = InferenceAPI(types.SimpleNamespace(model=FakeModel()), admission=admission)
+    release = threading.Event()
+    blockers = [api._executor.submit(release.wait) for _ in range(api._executor._max_workers)]
+
+    async def cancel_queued_request():
+        task = asyncio.create_task(api._submit([b""], ["ecg_0.hd5"]))
+        await asyncio.sleep(0.05)
+        assert admission.stats()["waiting"] == 1
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    try:
+        asyncio.run(cancel_queued_request())
+        assert admission.stats()["waiting"] == 0
+    finally:
+        release.set()
+        for blocker in blockers:
+            blocker.result(timeout=5)
+        api._executor.shutdown(wait=True)
+    # The abandoned job finds its ticket cancelled and never takes a slot
+    assert admission.stats()["waiting"] == 0
+    assert admission.stats()["active"] == 0
+
+
+def test_predict_rejects_oversized_body_while_streaming(client, tmp_path):
+    # A chunked body has no content length, so the limit must be enforced on the bytes received
+    client, processor = client
+    boundary = "ecgboundary"
+    body = (
+        f'--{boundary}\r\nContent-Disposition: form-data; name="files"; filename="big.hd5"\r\n'
+        "Content-Type: application/octet-stream\r\n\r\n"
+    ).encode() + b"\0" * (4 << 20) + f"\r\n--{boundary}--\r\n".encode()
+
+    def chunks():
+        for start in range(0, len(body), 64 << 10):
+            yield body[start:start + (64 << 10)]
+
+    response = client.post(
+        "/api/predict", content=chunks(), headers={"Content-Type": f"multipart/form-data; boundary={boundary}"}
+    )
+    assert response.status_code == 413
+
+
+@pytest.mark.parametrize("content_length", ["abc", "-5"])
+def test_predict_rejects_malformed_content_length(client, content_length):
+    client, _ = client
+    response = client.post(
+        "/api/predict",
+        content=b"--x--\r\n",
+        headers={"Content-Type": "multipart/form-data; boundary=x", "Content-Length": content_length},
+    )
+    assert response.status_code == 400
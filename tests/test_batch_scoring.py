@@ -0,0 +1,117 @@
+import csv
+import pytest
+import numpy as np
+import yaml
+from app.ecg_processor import ECGProcessor
+from app.batch_scoring import CohortScorer, CSVResultWriter, ParquetResultWriter, RESULT_COLUMNS, list_ecg_files
+from data.synthetic import write_synthetic_ecg
+
+
+class FakeTensorMap:
+    def __init__(self, shape, survival=False, days_window=None):
+        self.shape = shape
+        self.survival = survival
+        self.days_window = days_window
+
+    def is_survival_curve(self):
+        return self.survival
+
+
+class FakeModel:
+    # Predicts an age equal to the mean of the first lead's first samples, so results can be matched to files
+    model_output_names = ["survival", "sex", "age", "af"]
+    output_tensormaps = {
+        "survival": FakeTensorMap((100,), survival=True, days_window=3650),
+        "sex": FakeTensorMap((2,)),
+        "age": FakeTensorMap((1,)),
+        "af": FakeTensorMap((2,)),
+    }
+
+    def __init__(self):
+        self.batch_sizes = []
+
+    def predict(self, ecg_tensor):
+        n = len(ecg_tensor)
+        self.batch_sizes.append(n)
+        return [np.full((n, 100), 0.99), np.full((n, 2), 0.5), ecg_tensor[:, :10, 0].mean(axis=1, keepdims=True), np.full((n, 2), 0.5)]
+
+
+@pytest.fixture
+def processor():
+    with open("config/config.yaml") as f:
+        config = yaml.safe_load(f)
+    return ECGProcessor(config["ecg_shape"], config["ecg_leads"], config["ecg_hd5_path"])
+
+
+@pytest.fixture
+def cohort(processor, tmp_path):
+    ecg_dir = tmp_path / "cohort" / "site_a"
+    ecg_dir.mkdir(parents=True)
+    ecg_files = [
+        write_synthetic_ecg(str(ecg_dir / f"{1000 + i}_20205_2_0.hd5"), processor.ecg_leads, processor.ecg_hd5_path, seed=i)
+        for i in range(5)
+    ]
+    (ecg_dir / "broken.hd5").write_bytes(b"not an hd5 file")
+    # Sorted, so the broken file comes last
+    return sorted(ecg_files + [str(ecg_dir / "broken.hd5")])
+
+
+def expected_age(processor, ecg_file):
+    return float(processor.ecg_as_tensor(ecg_file)[0, :10, 0].mean())
+
+
+def test_list_ecg_files_from_directory_and_manifest(cohort, tmp_path):
+    assert list_ecg_files(str(tmp_path / "cohort")) == cohort
+    manifest = tmp_path / "cohort" / "manifest.txt"
+    manifest.write_text(f"# first two files\nsite_a/1001_20205_2_0.hd5\n\n{cohort[0]}\n")
+    assert list_ecg_files(str(manifest)) == sorted([str(tmp_path / "cohort" / "site_a" / "1001_20205_2_0.hd5"), cohort[0]])
+    with pytest.raises(ValueError):
+        list_ecg_files(str(tmp_path / "missing"))
+
+
+def test_scorer_skips_failed_files_and_resumes(processor, cohort, tmp_path):
+    output = str(tmp_path / "results.csv")
+    model = FakeModel()
+    scorer = CohortScorer(model, processor, batch_size=2, num_workers=2, prefetch_batches=1)
+
+    writer = CSVResultWriter(output)
+    summary = scorer.score(cohort[:3] + cohort[-1:], writer)
+    writer.close()
+    assert (summary["scored"], summary["failed"], summary["skipped"]) == (3, 1, 0)
+    # The batch with the broken file is compacted instead of dropped
+    assert model.batch_sizes == [2, 1]
+
+    completed = CSVResultWriter.completed_files(output)
+    assert completed == set(cohort[:3])
+    writer = CSVResultWriter(output)
+    summary = scorer.score(cohort, writer, completed=completed)
+    writer.close()
+    # Failed files are retried on resume, so the broken file fails again
+    assert (summary["scored"], summary["failed"], summary["skipped"]) == (2, 1, 3)
+
+    with open(output, newline="") as f:
+        rows = list(csv.DictReader(f))
+    assert list(rows[0]) == RESULT_COLUMNS
+    assert sorted(row["file"] for row in rows) == [f for f in cohort if not f.endswith("broken.hd5")]
+    for row in rows:
+        assert float(row["age"]) == pytest.approx(expected_age(processor, row["file"]), abs=1e-5)
+        assert float(row["sex_male_prob"]) == pytest.approx(0.5)
+        # The first half of the survival output holds the per-bin survival probabilities
+        assert float(row["af_risk"]) == pytest.approx(1 - 0.99 ** 50)
+
+
+def test_parquet_writer_appends_parts(processor, cohort, tmp_path):
+    pq = pytest.importorskip("pyarrow.parquet")
+    output = str(tmp_path / "results")
+    scorer = CohortScorer(FakeModel(), processor, batch_size=2, num_workers=2)
+    good_files = [f for f in cohort if not f.endswith("broken.hd5")]
+
+    scorer.score(good_files[:2], ParquetResultWriter(output))
+    completed = ParquetResultWriter.completed_files(output)
+    assert completed == set(good_files[:2])
+    scorer.score(good_files, ParquetResultWriter(output), completed=completed)
+
+    table = pq.read_table(output)
+    assert sorted(table.column("file").to_pylist()) == good_files
+    assert set(table.column_names) == set(RESULT_COLUMNS)
+    assert ParquetResultWriter.completed_files(output) == set(good_files)
@@ -0,0 +1,30 @@
+import os
+import pytest
+import yaml
+import app.config as app_config
+
+
+@pytest.fixture
+def config():
+    with open("config/config.yaml") as f:
+        return yaml.safe_load(f)
+
+
+def test_model_paths_resolve_against_the_project_root(tmp_path):
+    assert app_config.get_model_path("models/ecg2af.h5") == os.path.join(app_config.PROJECT_ROOT, "models", "ecg2af.h5")
+    assert app_config.get_model_path(str(tmp_path / "model.h5")) == str(tmp_path / "model.h5")
+
+
+def test_build_processor_follows_the_config(config):
+    processor = app_config.build_processor(config)
+    assert processor.ecg_shape == config["ecg_shape"]
+    assert processor.ecg_hd5_path == config["ecg_hd5_path"]
+
+
+def test_build_ecg_model_applies_overrides(config, monkeypatch):
+    built = {}
+    monkeypatch.setattr(app_config, "ECGModel", lambda path, **kwargs: built.update(path=path, **kwargs))
+    app_config.build_ecg_model(config, inference_mode="keras", warmup=False)
+    assert built["path"] == app_config.get_model_path(config["model_path"])
+    assert built["inference_mode"] == "keras" and built["warmup"] is False
+    assert built["use_saved_model"] == config.get("inference", {}).get("saved_model_cache", True)
@@ -1,7 +1,9 @@
 import pytest
 import numpy as np
+import h5py
 import yaml
 from app.ecg_processor import ECGProcessor  # Adjust import based on your structure
+from data.synthetic import write_synthetic_ecg
 
 @pytest.fixture
 def processor():
@@ -14,11 +16,145 @@ def processor():
     ecg_hd5_path = config["ecg_hd5_path"]  # Load HD5 path from config
     return ECGProcessor(ecg_shape, ecg_leads, ecg_hd5_path)
 
-def test_ecg_as_tensor(processor):
-    ecg_file = 'data/fake_0.hd5'
+@pytest.fixture
+def ecg_file(processor, tmp_path):
+    return write_synthetic_ecg(str(tmp_path / "fake_0.hd5"), processor.ecg_leads, processor.ecg_hd5_path, seed=0)
+
+def test_ecg_as_tensor(processor, ecg_file):
     tensor = processor.ecg_as_tensor(ecg_file)
     assert tensor.shape == (1, *processor.ecg_shape)  # Check the shape
+    assert abs(tensor.mean()) < 1e-3 and abs(tensor.std() - 1) < 1e-3  # Check the normalization
 
 def test_ecg_as_tensor_invalid_file(processor):
     with pytest.raises(ValueError):
         processor.ecg_as_tensor('invalid_file.hd5')
+
+def test_ecg_as_tensor_many_fills_buffer(processor, tmp_path):
+    ecg_files = []
+    for i in range(3):
+        ecg_file = str(tmp_path / f"ecg_{i}.hd5")
+        with h5py.File(ecg_file, "w") as hd5:
+            for lead in processor.ecg_leads:
+                hd5[f"{processor.ecg_hd5_path}/{lead}/instance_0"] = np.random.randn(processor.ecg_shape[0]) * (i + 1)
+        ecg_files.append(ecg_file)
+
+    buffer = np.empty((4, *processor.ecg_shape), dtype=np.float32)
+    batch = processor.ecg_as_tensor_many(ecg_files, out=buffer)
+    assert batch.shape == (3, *processor.ecg_shape)
+    assert np.shares_memory(batch, buffer)
+    for i, ecg_file in enumerate(ecg_files):
+        np.testing.assert_allclose(batch[i], processor.ecg_as_tensor(ecg_file)[0], atol=1e-5)
+
+def test_ecg_as_tensor_many_rejects_small_buffer(processor):
+    with pytest.raises(ValueError):
+        processor.ecg_as_tensor_many(["a.hd5", "b.hd5"], out=np.empty((1, *processor.ecg_shape), dtype=np.float32))
+
+def test_ecg_as_tensor_from_bytes(processor, ecg_file):
+    with open(ecg_file, "rb") as f:
+        ecg_bytes = f.read()
+    expected = processor.ecg_as_tensor(ecg_file)
+    np.testing.assert_array_equal(processor.ecg_as_tensor(ecg_bytes), expected)
+    with open(ecg_file, "rb") as f:
+        np.testing.assert_array_equal(processor.ecg_as_tensor_many([f]), expected)
+
+def test_is_hd5(processor, ecg_file):
+    with open(ecg_file, "rb") as f:
+        assert ECGProcessor.is_hd5(f.read())
+    assert not ECGProcessor.is_hd5(b"not an ecg" * 100)
+    assert ECGProcessor.is_hd5(b"\0" * 512 + b"\x89HDF\r\n\x1a\n")
+
+def write_leads(path, processor, signals, **attrs):
+    with h5py.File(path, "w") as hd5:
+        for lead, column in processor.ecg_leads.items():
+            dataset = hd5.create_dataset(f"{processor.ecg_hd5_path}/{lead}/instance_0", data=signals[column])
+            dataset.attrs.update(attrs)
+    return path
+
+@pytest.mark.parametrize("sample_rate,seconds", [(250, 10), (1000, 10), (500, 20), (1000, 6)])
+def test_ecg_as_tensor_adapts_sample_rate_and_length(processor, tmp_path, sample_rate, seconds):
+    # A 5 Hz sine per lead, recorded at the given rate and duration, should match the same sine at 500 Hz for 10 s
+    def sine(rate, duration):
+        t = np.arange(int(rate * duration)) / rate
+        return np.stack([np.sin(2 * np.pi * 5 * t + column) for column in range(12)]).astype(np.float32)
+
+    expected = sine(500, 10)
+    expected[:, int(500 * seconds):] = 0
+    expected_file = write_leads(str(tmp_path / "expected.hd5"), processor, expected, sample_rate=500)
+    ecg_file = write_leads(str(tmp_path / "ecg.hd5"), processor, sine(sample_rate, seconds), sample_rate=sample_rate)
+
+    tensor = processor.ecg_as_tensor(ecg_file)
+    assert tensor.shape == (1, *processor.ecg_shape)
+    np.testing.assert_allclose(tensor, processor.ecg_as_tensor(expected_file), atol=1e-2)
+
+def test_ecg_as_tensor_many_mixes_sample_rates(processor, tmp_path):
+    ecg_files = [
+        write_synthetic_ecg(str(tmp_path / "a.hd5"), processor.ecg_leads, processor.ecg_hd5_path, seed=0),
+        write_synthetic_ecg(str(tmp_path / "b.hd5"), processor.ecg_leads, processor.ecg_hd5_path, n_samples=10000, sample_rate=1000, seed=1),
+        write_synthetic_ecg(str(tmp_path / "c.hd5"), processor.ecg_leads, processor.ecg_hd5_path, n_samples=2500, sample_rate=250, seed=2),
+    ]
+    batch = processor.ecg_as_tensor_many(ecg_files)
+    for i, ecg_file in enumerate(ecg_files):
+        np.testing.assert_allclose(batch[i], processor.ecg_as_tensor(ecg_file)[0], atol=1e-5)
+
+def test_ecg_as_tensor_rejects_malformed_headers(processor, tmp_path):
+    signals = np.zeros((12, 5000), dtype=np.float32)
+    with pytest.raises(ValueError, match="sample_rate"):
+        processor.ecg_as_tensor(write_leads(str(tmp_path / "rate.hd5"), processor, signals, sample_rate=-1))
+    unequal = [np.zeros(5000 if column else 4000, dtype=np.float32) for column in range(12)]
+    with pytest.raises(ValueError, match="different numbers of samples"):
+        processor.ecg_as_tensor(write_leads(str(tmp_path / "unequal.hd5"), processor, unequal))
+    with h5py.File(str(tmp_path / "missing.hd5"), "w") as hd5:
+        hd5["other"] = np.zeros(5000)
+    with pytest.raises(ValueError, match="Missing lead dataset"):
+        processor.ecg_as_tensor_many([str(tmp_path / "missing.hd5")])
+
+def test_iter_windows_covers_recording(processor, tmp_path):
+    ecg_file = write_synthetic_ecg(
+        str(tmp_path / "holter.hd5"), processor.ecg_leads, processor.ecg_hd5_path, n_samples=63 * 1000, sample_rate=1000, seed=0
+    )
+    batches = [(starts.copy(), batch.copy()) for starts, batch in processor.iter_windows(ecg_file, stride_seconds=5, batch_size=4)]
+    starts = np.concatenate([starts for starts, _ in batches])
+    np.testing.assert_array_equal(starts, [0, 5, 10, 15, 20, 25, 30, 35, 40, 45, 50, 53])
+    assert all(batch.shape[1:] == tuple(processor.ecg_shape) for _, batch in batches)
+
+    # The first window is the first 10 seconds resampled and normalized like a 10 second file
+    with h5py.File(ecg_file, "r") as hd5:
+        first = np.stack([hd5[f"{processor.ecg_hd5_path}/{lead}/instance_0"][:10000] for lead in processor.ecg_leads])
+    expected = processor.normalize_batch(processor.adapt_signals(first[None].astype(np.float32), 1000))
+    np.testing.assert_allclose(batches[0][1][0], expected[0], atol=1e-5)
+
+def test_iter_windows_pads_short_recording(processor, tmp_path):
+    ecg_file = write_synthetic_ecg(str(tmp_path / "short.hd5"), processor.ecg_leads, processor.ecg_hd5_path, n_samples=3000, seed=0)
+    (starts, batch), = list(processor.iter_windows(ecg_file))
+    assert list(starts) == [0] and batch.shape == (1, *processor.ecg_shape)
+    np.testing.assert_allclose(batch, processor.ecg_as_tensor(ecg_file))
+
+def test_ecg_as_tensor_many_closes_each_file_before_the_next(processor, tmp_path, monkeypatch):
+    ecg_files = [
+        write_synthetic_ecg(str(tmp_path / f"{i}.hd5"), processor.ecg_leads, processor.ecg_hd5_path, seed=i) for i in range(4)
+    ]
+    open_hd5, opened = ECGProcessor._open_hd5, []
+
+    def tracking_open(ecg_file):
+        # Every earlier file must be closed by the time the next one is opened
+        assert all(not hd5.id.valid for hd5 in opened)
+        opened.append(open_hd5(ecg_file))
+        return opened[-1]
+
+    monkeypatch.setattr(ECGProcessor, "_open_hd5", staticmethod(tracking_open))
+    processor.ecg_as_tensor_many(ecg_files)
+    assert len(opened) == 4 and not any(hd5.id.valid for hd5 in opened)
+
+def test_long_recordings_are_cropped_before_resampling(processor, tmp_path, monkeypatch):
+    # Two minutes at 1000 Hz give the same tensor as its first 10 seconds, and only those are resampled
+    holter = write_synthetic_ecg(
+        str(tmp_path / "holter.hd5"), processor.ecg_leads, processor.ecg_hd5_path, n_samples=120 * 1000, sample_rate=1000, seed=0
+    )
+    with h5py.File(holter, "r") as hd5:
+        first = np.stack([hd5[f"{processor.ecg_hd5_path}/{lead}/instance_0"][:10000] for lead in processor.ecg_leads])
+    expected = write_leads(str(tmp_path / "first.hd5"), processor, first, sample_rate=1000)
+
+    adapt_signals, lengths = processor.adapt_signals, []
+    monkeypatch.setattr(processor, "adapt_signals", lambda signals, rate: lengths.append(signals.shape[-1]) or adapt_signals(signals, rate))
+    np.testing.assert_allclose(processor.ecg_as_tensor_many([holter])[0], processor.ecg_as_tensor(expected)[0], atol=1e-6)
+    assert lengths[0] == 10000
@@ -0,0 +1,120 @@
+import os
+import pytest
+import numpy as np
+from app.embedding_store import EmbeddingStore, build_embeddings, embedding_paths, normalize_rows
+import app.embedding_store as embedding_store
+
+
+def brute_force(vectors, query, k):
+    scores = normalize_rows(vectors) @ normalize_rows(query[None])[0]
+    return list(np.argsort(-scores, kind="stable")[:k]), np.sort(scores)[::-1][:k]
+
+
+@pytest.fixture
+def vectors():
+    return np.random.default_rng(0).normal(size=(500, 16)).astype(np.float32)
+
+
+def test_search_matches_brute_force_across_blocks(tmp_path, vectors, monkeypatch):
+    monkeypatch.setattr(embedding_store, "SEARCH_BLOCK_ROWS", 64)
+    store = EmbeddingStore(str(tmp_path / "emb"))
+    ids = [f"ecg_{i}" for i in range(len(vectors))]
+    store.append(ids[:200], vectors[:200])
+    store.append(ids[200:], vectors[200:])
+
+    queries = np.random.default_rng(1).normal(size=(3, 16))
+    found_ids, scores = store.search(queries, k=5)
+    for query, query_ids, query_scores in zip(queries, found_ids, scores):
+        expected_rows, expected_scores = brute_force(vectors, query, 5)
+        assert query_ids == [ids[row] for row in expected_rows]
+        np.testing.assert_allclose(query_scores, expected_scores, rtol=1e-5)
+
+
+def test_search_id_excludes_the_query(tmp_path, vectors):
+    store = EmbeddingStore(str(tmp_path / "emb"))
+    store.append([f"ecg_{i}" for i in range(len(vectors))], vectors)
+    neighbours, scores = store.search_id("ecg_7", k=4)
+    assert "ecg_7" not in neighbours and len(neighbours) == 4
+    assert np.all(np.diff(scores) <= 0)
+
+
+def test_store_reopens_and_rolls_back_interrupted_appends(tmp_path, vectors):
+    prefix = str(tmp_path / "emb")
+    store = EmbeddingStore(prefix, model_id="m1")
+    store.append(["a", "b"], vectors[:2])
+    data_path, ids_path, _ = embedding_paths(prefix)
+    # Simulate an append whose index was never written
+    with open(data_path, "ab") as f:
+        f.write(vectors[2].tobytes())
+    with open(ids_path, "a") as f:
+        f.write("c\n")
+
+    reopened = EmbeddingStore(prefix, model_id="m1")
+    assert reopened.ids == ["a", "b"] and "c" not in reopened
+    np.testing.assert_allclose(reopened.vector("b"), normalize_rows(vectors[1:2])[0], rtol=1e-6)
+    # Opening is read-only, the uncommitted row is only dropped by the next append
+    assert os.path.getsize(data_path) == 3 * 16 * 4
+    with pytest.raises(ValueError):
+        reopened.append(["a"], vectors[:1])
+    reopened.append(["d"], vectors[3:4])
+    assert EmbeddingStore(prefix).ids == ["a", "b", "d"]
+    assert os.path.getsize(data_path) == 3 * 16 * 4
+    np.testing.assert_allclose(EmbeddingStore(prefix).vector("d"), normalize_rows(vectors[3:4])[0], rtol=1e-6)
+    with pytest.raises(ValueError):
+        EmbeddingStore(prefix, model_id="m2")
+
+
+def test_reader_does_not_disturb_a_running_build(tmp_path, vectors, monkeypatch):
+    prefix = str(tmp_path / "emb")
+    writer = EmbeddingStore(prefix)
+    writer.append(["a"], vectors[:1])
+    readers = []
+    dump = embedding_store.json.dump
+
+    # Open a reader while the writer has written its rows but not yet committed the index
+    def dump_after_reader(*args, **kwargs):
+        readers.append(EmbeddingStore(prefix))
+        return dump(*args, **kwargs)
+
+    monkeypatch.setattr(embedding_store.json, "dump", dump_after_reader)
+    writer.append(["b"], vectors[1:2])
+    monkeypatch.undo()
+
+    assert readers[0].ids == ["a"]
+    reopened = EmbeddingStore(prefix)
+    assert reopened.ids == ["a", "b"]
+    np.testing.assert_allclose(reopened.vector("b"), normalize_rows(vectors[1:2])[0], rtol=1e-6)
+
+
+def test_build_embeddings_skips_stored_ecgs(tmp_path):
+    class FakeModel:
+        def embed(self, ecg_tensor):
+            return ecg_tensor[:, 0, :]
+
+    tensors = np.random.default_rng(0).normal(size=(6, 10, 4)).astype(np.float32)
+    store = EmbeddingStore(str(tmp_path / "emb"))
+    batches = [([f"ecg_{i}" for i in range(3)], tensors[:3])]
+    assert build_embeddings(FakeModel(), store, batches) == {"embedded": 3, "skipped": 0}
+    batches = [([f"ecg_{i}" for i in range(2, 6)], tensors[2:])]
+    assert build_embeddings(FakeModel(), store, batches) == {"embedded": 3, "skipped": 1}
+    assert store.ids == [f"ecg_{i}" for i in range(6)]
+    np.testing.assert_allclose(store.vector("ecg_4"), normalize_rows(tensors[4:5, 0])[0], rtol=1e-6)
+    batches = [(["ecg_6", "ecg_6"], tensors[:2])]
+    assert build_embeddings(FakeModel(), store, batches) == {"embedded": 1, "skipped": 1}
+
+
+def test_files_with_the_same_name_get_distinct_ids(tmp_path):
+    import yaml
+    from app.ecg_processor import ECGProcessor
+    from data.synthetic import write_synthetic_ecg
+
+    with open("config/config.yaml") as f:
+        config = yaml.safe_load(f)
+    processor = ECGProcessor(config["ecg_shape"], config["ecg_leads"], config["ecg_hd5_path"])
+    ecg_files = []
+    for i, site in enumerate(("site_a", "site_b")):
+        (tmp_path / "cohort" / site).mkdir(parents=True)
+        ecg_file = str(tmp_path / "cohort" / site / "1000_20205_2_0.hd5")
+        ecg_files.append(write_synthetic_ecg(ecg_file, processor.ecg_leads, processor.ecg_hd5_path, seed=i))
+    batches = list(embedding_store.iter_file_batches(ecg_files, processor, batch_size=2, root=str(tmp_path / "cohort")))
+    assert batches[0][0] == ["site_a/1000_20205_2_0", "site_b/1000_20205_2_0"]
@@ -0,0 +1,103 @@
+import pytest
+import numpy as np
+import h5py
+import yaml
+from app.ecg_processor import ECGProcessor
+from app.hd5_layout import LEAD_MATRIX_DATASET, LEAD_NAMES_ATTRIBUTE, lead_matrix_chunks, relayout_ecg_file
+from data.synthetic import write_synthetic_ecg
+
+
+@pytest.fixture
+def processor():
+    with open("config/config.yaml") as f:
+        config = yaml.safe_load(f)
+    return ECGProcessor(config["ecg_shape"], config["ecg_leads"], config["ecg_hd5_path"])
+
+
+def lead_matrix(path, processor):
+    with h5py.File(path, "r") as hd5:
+        dataset = hd5[f"{processor.ecg_hd5_path}/{LEAD_MATRIX_DATASET}"]
+        return dataset[()], list(dataset.attrs[LEAD_NAMES_ATTRIBUTE]), dataset.chunks
+
+
+@pytest.mark.parametrize("compression", ["gzip", "lzf", None])
+def test_relayout_reads_like_per_lead_layout(processor, tmp_path, compression):
+    source = write_synthetic_ecg(str(tmp_path / "ecg.hd5"), processor.ecg_leads, processor.ecg_hd5_path, seed=0)
+    with h5py.File(source, "a") as hd5:
+        hd5["ukb_ecg_rest/ecg_rest_text/instance_0"] = "Sinus rhythm"
+    target = str(tmp_path / "relaid" / "ecg.hd5")
+    result = relayout_ecg_file(source, target, processor, compression=compression)
+
+    assert result["samples"] == processor.ecg_shape[0]
+    matrix, names, chunks = lead_matrix(target, processor)
+    assert matrix.shape == tuple(processor.ecg_shape) and chunks == tuple(processor.ecg_shape)
+    assert names == sorted(processor.ecg_leads, key=processor.ecg_leads.get)
+    with h5py.File(target, "r") as hd5:
+        assert hd5["ukb_ecg_rest/ecg_rest_text/instance_0"][()] == b"Sinus rhythm"
+        assert "instance_0" not in hd5["ukb_ecg_rest/strip_I"]
+
+    np.testing.assert_array_equal(processor.ecg_as_tensor(target), processor.ecg_as_tensor(source))
+    np.testing.assert_allclose(processor.ecg_as_tensor_many([target, source])[0], processor.ecg_as_tensor(source)[0], atol=1e-5)
+    with pytest.raises(ValueError, match="already"):
+        relayout_ecg_file(target, str(tmp_path / "again.hd5"), processor)
+
+
+def test_lead_matrix_in_another_order(processor, tmp_path):
+    source = write_synthetic_ecg(str(tmp_path / "ecg.hd5"), processor.ecg_leads, processor.ecg_hd5_path, seed=1)
+    target = str(tmp_path / "shuffled.hd5")
+    names = list(reversed(sorted(processor.ecg_leads, key=processor.ecg_leads.get))) + ["strip_extra"]
+    with h5py.File(source, "r") as src, h5py.File(target, "w") as dst:
+        columns = [src[f"{processor.ecg_hd5_path}/{lead}/instance_0"][()] for lead in names[:-1]]
+        dataset = dst.create_dataset(
+            f"{processor.ecg_hd5_path}/{LEAD_MATRIX_DATASET}", data=np.stack(columns + [columns[0]], axis=1)
+        )
+        dataset.attrs[LEAD_NAMES_ATTRIBUTE] = names
+        dataset.attrs["sample_rate"] = 500
+
+    np.testing.assert_array_equal(processor.ecg_as_tensor(target), processor.ecg_as_tensor(source))
+
+    with h5py.File(target, "a") as hd5:
+        hd5[f"{processor.ecg_hd5_path}/{LEAD_MATRIX_DATASET}"].attrs[LEAD_NAMES_ATTRIBUTE] = ["strip_I"] * 13
+    with pytest.raises(ValueError, match="Missing lead strip_II"):
+        processor.ecg_as_tensor(target)
+
+
+def test_relaid_long_recording_windows(processor, tmp_path):
+    source = write_synthetic_ecg(
+        str(tmp_path / "holter.hd5"), processor.ecg_leads, processor.ecg_hd5_path, n_samples=63 * 1000, sample_rate=1000, seed=0
+    )
+    target = str(tmp_path / "holter_relaid.hd5")
+    relayout_ecg_file(source, target, processor, compression="lzf", chunk_bytes=64 << 10)
+
+    matrix, names, chunks = lead_matrix(target, processor)
+    assert chunks == lead_matrix_chunks(63 * 1000, 12, 4, 64 << 10)
+    # Written slice by slice, including the partial last chunk, the matrix holds every sample of every lead
+    with h5py.File(source, "r") as hd5:
+        expected_matrix = np.stack([hd5[f"{processor.ecg_hd5_path}/{lead}/instance_0"][()] for lead in names], axis=1)
+    np.testing.assert_array_equal(matrix, expected_matrix)
+    assert processor.read_header(target) == processor.read_header(source)
+    expected = [(starts.copy(), batch.copy()) for starts, batch in processor.iter_windows(source, stride_seconds=5, batch_size=4)]
+    for (starts, batch), (expected_starts, expected_batch) in zip(processor.iter_windows(target, stride_seconds=5, batch_size=4), expected):
+        np.testing.assert_array_equal(starts, expected_starts)
+        np.testing.assert_allclose(batch, expected_batch, atol=1e-6)
+
+
+def test_relayout_script_keeps_manifest_paths(processor, tmp_path, monkeypatch):
+    from scripts import relayout_hd5
+
+    for i, site in enumerate(("a", "b")):
+        (tmp_path / "cohort" / site).mkdir(parents=True)
+        write_synthetic_ecg(str(tmp_path / "cohort" / site / "1.hd5"), processor.ecg_leads, processor.ecg_hd5_path, seed=i)
+    manifest = tmp_path / "cohort" / "manifest.txt"
+    manifest.write_text("a/1.hd5\nb/1.hd5\n")
+    target = tmp_path / "relaid"
+    monkeypatch.setattr("sys.argv", ["relayout_hd5.py", str(manifest), str(target), "--compression", "lzf"])
+    # Keep the script from pointing the test run's logging at the application log file
+    monkeypatch.setattr(relayout_hd5.logging.config, "dictConfig", lambda config: None)
+    relayout_hd5.main()
+
+    # Files with the same name in different directories are both rewritten, each from its own source
+    for site in ("a", "b"):
+        np.testing.assert_array_equal(
+            processor.ecg_as_tensor(str(target / site / "1.hd5")), processor.ecg_as_tensor(str(tmp_path / "cohort" / site / "1.hd5"))
+        )
@@ -0,0 +1,59 @@
+import json
+import logging
+import pytest
+from app.logging_setup import SamplingFilter, configure_logging, request_log
+from app.metrics import timed
+
+
+@pytest.fixture
+def restore_root():
+    root = logging.getLogger()
+    handlers, level = list(root.handlers), root.level
+    yield root
+    root.handlers[:] = handlers
+    root.setLevel(level)
+
+
+def make_record(name, msg, level=logging.INFO):
+    return logging.LogRecord(name, level, __file__, 0, msg, (), None)
+
+
+def test_sampling_filter_keeps_one_in_every():
+    sampler = SamplingFilter(every=10, level="INFO", loggers=["app.ecg_processor"])
+    kept = [sampler.filter(make_record("app.ecg_processor", "Processing ECG file: %s")) for _ in range(25)]
+    assert sum(kept) == 3 and kept[0]
+    assert sampler.filter(make_record("app.ecg_processor", "Failed", logging.ERROR))
+    assert all(sampler.filter(make_record("app.requests", "line")) for _ in range(5))
+
+
+def test_configure_logging_moves_handlers_behind_queue(restore_root):
+    config = {
+        "version": 1,
+        "disable_existing_loggers": False,
+        "handlers": {"memory": {"class": "logging.handlers.BufferingHandler", "capacity": 1000}},
+        "root": {"level": "INFO", "handlers": ["memory"]},
+    }
+    listener = configure_logging(config, sample_every=2, sampled_loggers=["test.sampled"])
+    memory = listener.handlers[0]
+    assert [type(handler).__name__ for handler in restore_root.handlers] == ["DroppingQueueHandler"]
+
+    for i in range(4):
+        logging.getLogger("test.sampled").info("line %d", i)
+    logging.getLogger("test.other").warning("kept")
+    listener.stop()
+    messages = [record.getMessage() for record in memory.buffer]
+    assert messages[-3:] == ["line 0", "line 2", "kept"]
+
+
+def test_request_log_writes_stage_timings(caplog):
+    @timed("ecg_read")
+    def read():
+        return 1
+
+    with caplog.at_level(logging.INFO, logger="app.requests"):
+        with request_log("gradio", bytes=10) as entry:
+            read()
+            entry["cache"] = "miss"
+    line = json.loads(caplog.records[-1].getMessage())
+    assert line["request"] == "gradio" and line["status"] == "ok" and line["cache"] == "miss"
+    assert line["ecg_read_ms"] >= 0 and line["total_ms"] >= line["ecg_read_ms"]
@@ -0,0 +1,32 @@
+import pytest
+from app.metrics import MetricsRegistry
+
+
+def test_disabled_registry_records_nothing():
+    registry = MetricsRegistry(enabled=False)
+    with registry.time("inference"):
+        pass
+    assert "inference" not in registry.render()
+
+
+def test_stage_latency_and_errors_are_rendered():
+    registry = MetricsRegistry(enabled=True, buckets=(0.1, 1.0))
+    registry.observe("inference", 0.05)
+    registry.observe("inference", 0.5)
+    with pytest.raises(RuntimeError):
+        with registry.time("inference"):
+            raise RuntimeError("boom")
+    text = registry.render()
+    assert 'ecg2af_stage_duration_seconds_bucket{stage="inference",le="0.1"} 2' in text
+    assert 'ecg2af_stage_duration_seconds_bucket{stage="inference",le="1.0"} 3' in text
+    assert 'ecg2af_stage_duration_seconds_count{stage="inference"} 3' in text
+    assert 'ecg2af_stage_errors_total{stage="inference"} 1' in text
+
+
+def test_gauges_are_rendered():
+    registry = MetricsRegistry(enabled=True)
+    registry.register_gauge("queue_depth", "Pending requests.", lambda: 3)
+    registry.register_gauge("cache", "Cache counters.", lambda: {"hits": 2})
+    text = registry.render()
+    assert "ecg2af_queue_depth 3" in text
+    assert 'ecg2af_cache{key="hits"} 2' in text
@@ -0,0 +1,202 @@
+import threading
+import time
+import pytest
+import numpy as np
+from app.model_handler import BatchingPredictor
+
+
+class FakeModel:
+    # Mimics ECGModel.predict with four outputs derived from each sample's first value
+    model_output_names = ["survival", "sex", "age", "af"]
+    output_tensormaps = {}
+
+    def __init__(self):
+        self.batch_sizes = []
+
+    def predict(self, ecg_tensor):
+        self.batch_sizes.append(len(ecg_tensor))
+        first = ecg_tensor[:, 0, :1]
+        return [np.repeat(first, 4, axis=1), np.repeat(first, 2, axis=1), first, np.repeat(first, 2, axis=1)]
+
+
+@pytest.fixture
+def fake_model():
+    return FakeModel()
+
+
+def test_batching_predictor_returns_caller_slices(fake_model):
+    # The first forward pass blocks until the other callers are queued, so they are merged into the next one
+    entered, release = threading.Event(), threading.Event()
+    predict = fake_model.predict
+
+    def blocking_predict(ecg_tensor):
+        entered.set()
+        release.wait()
+        return predict(ecg_tensor)
+
+    fake_model.predict = blocking_predict
+    predictor = BatchingPredictor(fake_model, max_batch_size=8, max_wait_ms=50)
+    results = {}
+
+    def call(value):
+        tensor = np.full((1, 5000, 12), value, dtype=np.float32)
+        results[value] = predictor.predict(tensor)
+
+    threads = [threading.Thread(target=call, args=(i,)) for i in range(6)]
+    threads[0].start()
+    assert entered.wait(5)
+    for thread in threads[1:]:
+        thread.start()
+    deadline = time.monotonic() + 5
+    while predictor.queue_depth < 5 and time.monotonic() < deadline:
+        time.sleep(0.001)
+    release.set()
+    for thread in threads:
+        thread.join()
+    predictor.close()
+
+    for value, outputs in results.items():
+        assert len(outputs) == 4
+        assert outputs[2].shape == (1, 1)
+        assert outputs[2][0, 0] == value
+    assert fake_model.batch_sizes == [1, 5]
+
+
+def test_batching_predictor_respects_max_batch_size(fake_model):
+    predictor = BatchingPredictor(fake_model, max_batch_size=2, max_wait_ms=50)
+    threads = [
+        threading.Thread(target=predictor.predict, args=(np.zeros((1, 5000, 12), dtype=np.float32),))
+        for _ in range(5)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    predictor.close()
+    assert max(fake_model.batch_sizes) <= 2
+
+
+def test_batching_predictor_propagates_errors():
+    class FailingModel(FakeModel):
+        def predict(self, ecg_tensor):
+            raise RuntimeError("boom")
+
+    predictor = BatchingPredictor(FailingModel(), max_batch_size=4, max_wait_ms=1)
+    with pytest.raises(RuntimeError):
+        predictor.predict(np.zeros((1, 5000, 12), dtype=np.float32))
+    predictor.close()
+
+
+def test_batching_predictor_drops_requests_that_time_out(fake_model):
+    # A request that times out while a forward pass is running is removed instead of run for nobody
+    entered, release = threading.Event(), threading.Event()
+    predict = fake_model.predict
+
+    def blocking_predict(ecg_tensor):
+        entered.set()
+        release.wait()
+        return predict(ecg_tensor)
+
+    fake_model.predict = blocking_predict
+    predictor = BatchingPredictor(fake_model, max_batch_size=8, max_wait_ms=1)
+    running = threading.Thread(target=predictor.predict, args=(np.zeros((1, 5000, 12), dtype=np.float32),))
+    running.start()
+    assert entered.wait(5)
+    try:
+        with pytest.raises(TimeoutError):
+            predictor.predict(np.ones((2, 5000, 12), dtype=np.float32), timeout=0.05)
+        assert predictor.queue_depth == 0
+    finally:
+        release.set()
+        running.join()
+        predictor.close()
+    assert fake_model.batch_sizes == [1]
+
+
+@pytest.fixture(scope="module")
+def standin_model_path(tmp_path_factory, ml4h_tensormaps):
+    pytest.importorskip("tensorflow")
+    from benchmarks.standin import build_standin_model
+
+    return build_standin_model(str(tmp_path_factory.mktemp("model") / "standin.h5"))
+
+
+def test_compiled_inference_matches_keras(standin_model_path, tmp_path):
+    from app.model_handler import ECGModel
+
+    ecg_tensor = np.random.default_rng(0).normal(size=(3, 5000, 12)).astype(np.float32)
+    compiled = ECGModel(standin_model_path, saved_model_dir=str(tmp_path / "export")).predict(ecg_tensor)
+    keras = ECGModel(standin_model_path, inference_mode="keras").predict(ecg_tensor)
+    assert [output.shape[0] for output in compiled] == [3, 3, 3, 3]
+    for compiled_output, keras_output in zip(compiled, keras):
+        np.testing.assert_allclose(compiled_output, keras_output, atol=1e-5)
+
+
+def test_saved_model_export_is_reused(standin_model_path, tmp_path, monkeypatch):
+    import app.model_handler as model_handler
+
+    export_dir = str(tmp_path / "export")
+    first = model_handler.ECGModel(standin_model_path, saved_model_dir=export_dir, warmup=False)
+
+    # Booting from the export needs neither ml4h nor the Keras model
+    def no_ml4h():
+        raise ImportError("ml4h is not installed")
+
+    monkeypatch.setattr(model_handler, "output_tensormap_list", no_ml4h)
+    second = model_handler.ECGModel(standin_model_path, saved_model_dir=export_dir, warmup=False)
+    assert "export_saved_model" in first.startup_timings
+    assert "load_saved_model" in second.startup_timings
+    assert second.model_output_names == first.model_output_names
+    assert model_handler.describe_tensormaps(second.output_tensormaps.values()) == model_handler.describe_tensormaps(
+        first.output_tensormaps.values()
+    )
+
+
+@pytest.mark.parametrize("mode", ["tflite_fp16", "tflite_int8"])
+def test_tflite_inference_is_close_and_cached(standin_model_path, tmp_path, mode):
+    from app.model_handler import ECGModel
+
+    ecg_tensor = np.random.default_rng(0).normal(size=(3, 5000, 12)).astype(np.float32)
+    tflite_path = str(tmp_path / "model.tflite")
+    converted = ECGModel(standin_model_path, inference_mode=mode, tflite_path=tflite_path)
+    cached = ECGModel(standin_model_path, inference_mode=mode, tflite_path=tflite_path)
+    keras = ECGModel(standin_model_path, inference_mode="keras").predict(ecg_tensor)
+    assert "convert_tflite" in converted.startup_timings
+    assert "load_tflite" in cached.startup_timings and cached.model is None
+    for tflite_output, keras_output in zip(cached.predict(ecg_tensor), keras):
+        assert tflite_output.shape == keras_output.shape
+        np.testing.assert_allclose(tflite_output, keras_output, atol=1e-2)
+
+
+def test_embedding_layer_is_detected_in_every_mode(standin_model_path, tmp_path):
+    from app.model_handler import ECGModel
+
+    ecg_tensor = np.random.default_rng(0).normal(size=(3, 5000, 12)).astype(np.float32)
+    keras = ECGModel(standin_model_path, inference_mode="keras", warmup=False)
+    embeddings = keras.embed(ecg_tensor)
+    # The stand-in's heads all read the "embed" dense layer
+    assert keras.embedding_layer == "embed"
+    assert embeddings.shape == (3, 64) and embeddings.dtype == np.float32
+
+    export_dir = str(tmp_path / "export")
+    ECGModel(standin_model_path, saved_model_dir=export_dir, warmup=False)
+    exported = ECGModel(standin_model_path, saved_model_dir=export_dir, warmup=False)
+    # The export carries the embedding function, so the .h5 is not loaded again
+    exported.load_model_from_path = None
+    np.testing.assert_allclose(exported.embed(ecg_tensor), embeddings, atol=1e-5)
+    assert exported.embedding_layer == "embed"
+
+
+def test_file_digest_is_cached_until_the_file_changes(tmp_path, monkeypatch):
+    from app.model_handler import ECGModel
+
+    model_path = tmp_path / "model.h5"
+    model_path.write_bytes(b"weights")
+    digest = ECGModel.cached_file_digest(str(model_path))
+    assert digest == ECGModel.file_digest(str(model_path))
+
+    hashed = []
+    monkeypatch.setattr(ECGModel, "file_digest", staticmethod(lambda path: hashed.append(path) or "rehashed"))
+    assert ECGModel.cached_file_digest(str(model_path)) == digest and not hashed
+    model_path.write_bytes(b"new weights")
+    assert ECGModel.cached_file_digest(str(model_path)) == "rehashed" and len(hashed) == 1
@@ -0,0 +1,146 @@
+import threading
+import pytest
+import numpy as np
+import app.model_registry as model_registry
+from app.model_registry import ModelRegistry, lease_model
+
+MODEL_BYTES = 100 << 20
+
+
+class FakeModel:
+    def __init__(self, name, outputs=("survival", "sex", "age", "af")):
+        self.model_id = name
+        self.model_output_names = list(outputs)
+        self.output_tensormaps = {}
+        self.closed = False
+
+    def predict(self, ecg_tensor):
+        return [np.full((len(ecg_tensor), 1), self.model_id)]
+
+    def close(self):
+        self.closed = True
+
+
+@pytest.fixture
+def registry(monkeypatch):
+    # Every load grows the measured resident memory by MODEL_BYTES
+    rss = {"bytes": 0}
+    monkeypatch.setattr(model_registry, "process_rss_bytes", lambda: rss["bytes"])
+    loaded = []
+
+    def load(name, spec):
+        rss["bytes"] += MODEL_BYTES
+        model = FakeModel(name, spec.get("outputs", ("survival", "sex", "age", "af")))
+        loaded.append(model)
+        return model
+
+    specs = {"a": {}, "b": {}, "c": {}, "other": {"outputs": ("age",)}}
+    registry = ModelRegistry(specs, load, default="a", memory_budget_bytes=2 * MODEL_BYTES)
+    return registry, loaded
+
+
+def test_models_load_lazily_once(registry):
+    registry, loaded = registry
+    assert loaded == []
+    assert registry.predict(np.zeros((2, 5000, 12)))[0][0, 0] == "a"
+    registry.get()
+    registry.get("b")
+    assert [model.model_id for model in loaded] == ["a", "b"]
+    stats = registry.stats()
+    assert stats["a"]["loaded"] and stats["a"]["default"] and stats["a"]["memory_bytes"] == MODEL_BYTES
+    assert stats["a"]["load_seconds"] is not None
+    assert not stats["c"]["loaded"]
+
+
+def test_least_recently_used_model_is_evicted_over_budget(registry):
+    registry, loaded = registry
+    registry.get()
+    b = registry.get("b")
+    c = registry.get("c")
+    assert b.closed and not c.closed
+    assert not registry.stats()["b"]["loaded"]
+    # The default is kept even when it is the least recently used
+    assert registry.stats()["a"]["loaded"]
+    registry.get("b")
+    assert c.closed
+    assert registry.stats()["b"]["loads"] == 2
+
+
+def test_evicted_model_closes_after_its_last_lease(registry):
+    registry, _ = registry
+    registry.get()
+    with registry.lease("b") as b:
+        registry.get("c")
+        assert not registry.stats()["b"]["loaded"]
+        assert not b.closed
+        assert b.predict(np.zeros((1, 5000, 12)))[0][0, 0] == "b"
+    assert b.closed
+
+
+def test_model_reloaded_while_leased_closes_each_instance(registry):
+    registry, loaded = registry
+    with registry.lease("b") as first:
+        registry.unload("b")
+        with registry.lease("b") as second:
+            assert second is not first
+            assert registry.stats()["b"]["leases"] == 1
+        assert not first.closed and not second.closed
+    assert first.closed and not second.closed
+    registry.close()
+    assert [model.closed for model in loaded] == [True, True]
+
+
+def test_swap_keeps_in_flight_requests_on_the_old_model(registry):
+    registry, _ = registry
+    with lease_model(registry) as model:
+        registry.set_default("b")
+        assert model.model_id == "a"
+        assert registry.model_id == "b"
+    assert registry.stats()["b"]["default"]
+    assert registry.predict(np.zeros((1, 5000, 12)))[0][0, 0] == "b"
+
+
+def test_swap_rejects_unknown_and_incompatible_models(registry):
+    registry, _ = registry
+    with pytest.raises(KeyError):
+        registry.set_default("missing")
+    with pytest.raises(ValueError):
+        registry.set_default("other")
+    assert registry.default == "a"
+    with pytest.raises(ValueError):
+        registry.unload("a")
+
+
+def test_concurrent_requests_load_a_model_once(registry):
+    registry, loaded = registry
+    threads = [threading.Thread(target=registry.get, args=("b",)) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert [model.model_id for model in loaded] == ["b"]
+
+
+def test_metadata_is_read_under_a_lease(registry, monkeypatch):
+    registry, loaded = registry
+    registry.get()
+    leases = []
+
+    def output_tensormaps(model):
+        # Record the leases open on the model while its metadata is read
+        leases.append(registry.stats()["a"]["leases"])
+        return {}
+
+    monkeypatch.setattr(FakeModel, "output_tensormaps", property(output_tensormaps), raising=False)
+    names = registry.model_output_names
+    assert registry.output_tensormaps == {} and leases == [1]
+    # The caller gets a copy, so it cannot mutate or outlive the leased model's metadata
+    names.append("extra")
+    assert registry.model_output_names == ["survival", "sex", "age", "af"]
+    assert registry.stats()["a"]["leases"] == 0
+
+
+def test_lease_model_passes_plain_models_through():
+    model = FakeModel("plain")
+    with lease_model(model) as leased:
+        assert leased is model
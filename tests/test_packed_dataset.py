@@ -0,0 +1,53 @@
+import pytest
+import numpy as np
+import h5py
+import yaml
+from app.ecg_processor import ECGProcessor
+from app.packed_dataset import pack_ecg_files
+
+
+@pytest.fixture
+def processor():
+    with open("config/config.yaml") as f:
+        config = yaml.safe_load(f)
+    return ECGProcessor(config["ecg_shape"], config["ecg_leads"], config["ecg_hd5_path"])
+
+
+def test_pack_and_read_batches(processor, tmp_path):
+    ecg_files = []
+    for i in range(5):
+        ecg_file = str(tmp_path / f"{1000 + i}_20205_2_0.hd5")
+        with h5py.File(ecg_file, "w") as hd5:
+            for lead in processor.ecg_leads:
+                hd5[f"{processor.ecg_hd5_path}/{lead}/instance_0"] = np.random.randn(processor.ecg_shape[0])
+        ecg_files.append(ecg_file)
+    bad_file = tmp_path / "broken.hd5"
+    bad_file.write_bytes(b"not an hd5 file")
+
+    pack_ecg_files(ecg_files[:2] + [str(bad_file)] + ecg_files[2:], str(tmp_path / "cohort"), processor, batch_size=2)
+    dataset = processor.open_packed(str(tmp_path / "cohort"))
+
+    assert len(dataset) == 5
+    assert dataset.sample_ids == [str(1000 + i) for i in range(5)]
+    row = dataset.row_of("1003_20205_2_0")
+    np.testing.assert_allclose(dataset.batch(row, row + 1), processor.ecg_as_tensor(ecg_files[3]), atol=1e-5)
+    assert sum(len(batch) for _, batch in dataset.iter_batches(2)) == 5
+
+
+def test_files_with_the_same_name_keep_distinct_ids(processor, tmp_path):
+    ecg_files = []
+    for site in ("site_a", "site_b"):
+        ecg_file = tmp_path / "cohort" / site / "1000_20205_2_0.hd5"
+        ecg_file.parent.mkdir(parents=True)
+        with h5py.File(ecg_file, "w") as hd5:
+            for lead in processor.ecg_leads:
+                hd5[f"{processor.ecg_hd5_path}/{lead}/instance_0"] = np.random.randn(processor.ecg_shape[0])
+        ecg_files.append(str(ecg_file))
+
+    dataset = pack_ecg_files(ecg_files, str(tmp_path / "cohort"), processor, root=str(tmp_path / "cohort"))
+    assert dataset.file_ids == ["site_a/1000_20205_2_0", "site_b/1000_20205_2_0"]
+    assert dataset.sample_ids == ["1000", "1000"]
+    np.testing.assert_allclose(dataset.take(["site_b/1000_20205_2_0"]), processor.ecg_as_tensor(ecg_files[1]), atol=1e-5)
+
+    with pytest.raises(ValueError, match="repeated"):
+        pack_ecg_files(ecg_files, str(tmp_path / "flat"), processor)
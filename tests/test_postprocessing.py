@@ -0,0 +1,44 @@
+import numpy as np
+from app.postprocessing import OutputPostProcessor
+
+
+class FakeTensorMap:
+    def __init__(self, shape, survival=False, days_window=None):
+        self.shape = shape
+        self.survival = survival
+        self.days_window = days_window
+
+    def is_survival_curve(self):
+        return self.survival
+
+
+OUTPUT_NAMES = ["survival", "sex", "age", "af"]
+TENSORMAPS = {
+    "survival": FakeTensorMap((100,), survival=True, days_window=3650),
+    "sex": FakeTensorMap((2,)),
+    "age": FakeTensorMap((1,)),
+    "af": FakeTensorMap((2,)),
+}
+
+
+def test_process_matches_single_sample_computation():
+    rng = np.random.default_rng(0)
+    predictions = [rng.random((3, 100)), rng.random((3, 2)), rng.random((3, 1)) * 80, rng.random((3, 2))]
+    results = OutputPostProcessor(OUTPUT_NAMES, TENSORMAPS).process(predictions)
+
+    for i in range(3):
+        survival = np.cumprod(predictions[0][i:i + 1, :50], axis=1)
+        assert np.isclose(results["af_risk"][i], 1 - survival[0, -1])
+        np.testing.assert_allclose(results["survival_curve"][i], survival[0])
+        assert results["age"][i] == predictions[2][i, 0]
+    np.testing.assert_array_equal(results["sex_probs"], predictions[1])
+    assert results["survival_days"][0] == 74 and results["survival_days"][-1] == 74 * 50
+
+
+def test_to_records():
+    predictions = [np.full((2, 100), 0.99), np.array([[0.9, 0.1], [0.2, 0.8]]), np.array([[50.0], [60.0]]), np.full((2, 2), 0.5)]
+    processor = OutputPostProcessor(OUTPUT_NAMES, TENSORMAPS)
+    records = processor.to_records(processor.process(predictions), include_curve=True)
+    assert [record["age"] for record in records] == [50.0, 60.0]
+    assert records[1]["sex_female_prob"] == 0.8
+    assert len(records[0]["survival_curve"]) == len(records[0]["survival_days"]) == 50
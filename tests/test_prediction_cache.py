@@ -0,0 +1,62 @@
+import threading
+import time
+import pytest
+import numpy as np
+from app.prediction_cache import PredictionCache
+
+
+def outputs(value):
+    return [np.full((1, 4), value), np.full((1, 2), value), np.full((1, 1), value), np.full((1, 2), value)]
+
+
+def test_cache_hit_skips_compute():
+    cache = PredictionCache(max_entries=2)
+    key = cache.make_key(b"ecg", "model")
+    calls = []
+    first = cache.get_or_compute(key, lambda: calls.append(1) or outputs(1.0))
+    second = cache.get_or_compute(key, lambda: calls.append(1) or outputs(2.0))
+    assert len(calls) == 1
+    assert second[0][0, 0] == 1.0 and first is second
+    assert cache.stats()["hits"] == 1 and cache.stats()["misses"] == 1
+
+
+def test_cache_key_depends_on_model():
+    assert PredictionCache.make_key(b"ecg", "model_a") != PredictionCache.make_key(b"ecg", "model_b")
+
+
+def test_cache_evicts_least_recently_used():
+    cache = PredictionCache(max_entries=2)
+    cache.get_or_compute("a", lambda: outputs(1.0))
+    cache.get_or_compute("b", lambda: outputs(2.0))
+    cache.get_or_compute("a", lambda: outputs(1.0))
+    cache.get_or_compute("c", lambda: outputs(3.0))
+    stats = cache.stats()
+    assert stats["evictions"] == 1 and stats["entries"] == 2
+    cache.get_or_compute("a", lambda: pytest.fail("a should still be cached"))
+
+
+def test_cache_shares_in_flight_computation():
+    cache = PredictionCache()
+    calls = []
+
+    def slow_compute():
+        calls.append(1)
+        time.sleep(0.1)
+        return outputs(1.0)
+
+    threads = [threading.Thread(target=cache.get_or_compute, args=("key", slow_compute)) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(calls) == 1
+    assert cache.stats()["shared"] == 3
+
+
+def test_cache_disk_tier_survives_restart(tmp_path):
+    PredictionCache(disk_dir=str(tmp_path)).get_or_compute("key", lambda: outputs(5.0))
+    cache = PredictionCache(disk_dir=str(tmp_path))
+    entry = cache.get_or_compute("key", lambda: pytest.fail("entry should come from disk"))
+    assert entry[3][0, 1] == 5.0
+    assert cache.stats()["disk_hits"] == 1
+    assert not entry[0].flags.writeable
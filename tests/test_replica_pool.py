@@ -0,0 +1,104 @@
+import threading
+import time
+import pytest
+import numpy as np
+
+
+@pytest.fixture(scope="module")
+def standin_model_path(tmp_path_factory, ml4h_tensormaps):
+    pytest.importorskip("tensorflow")
+    from benchmarks.standin import build_standin_model
+
+    return build_standin_model(str(tmp_path_factory.mktemp("model") / "standin.h5"))
+
+
+@pytest.fixture(scope="module")
+def pool(standin_model_path):
+    from app.replica_pool import ReplicaPool
+
+    pool = ReplicaPool(
+        standin_model_path,
+        num_workers=2,
+        max_batch_size=4,
+        model_kwargs={"use_saved_model": False},
+        health_check_interval=0.5,
+    )
+    yield pool
+    pool.close()
+
+
+def test_replica_pool_matches_in_process_model(pool, standin_model_path):
+    from app.model_handler import ECGModel
+
+    ecg_tensor = np.random.default_rng(0).normal(size=(6, 5000, 12)).astype(np.float32)
+    expected = ECGModel(standin_model_path, use_saved_model=False).predict(ecg_tensor)
+    outputs = pool.predict(ecg_tensor)
+    assert len(outputs) == len(expected)
+    for output, expected_output in zip(outputs, expected):
+        np.testing.assert_allclose(output, expected_output, atol=1e-5)
+
+
+def test_replica_pool_serves_concurrent_requests(pool):
+    results = {}
+
+    def call(value):
+        results[value] = pool.predict(np.full((1, 5000, 12), value, dtype=np.float32))
+
+    threads = [threading.Thread(target=call, args=(i,)) for i in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert sorted(results) == [0, 1, 2, 3]
+    assert all(outputs[0].shape[0] == 1 for outputs in results.values())
+
+
+def test_dead_worker_fails_fast_and_is_restarted_in_the_background(standin_model_path):
+    from app.replica_pool import ReplicaPool
+
+    pool = ReplicaPool(
+        standin_model_path, num_workers=1, max_batch_size=2, model_kwargs={"use_saved_model": False}, health_check_interval=60
+    )
+    try:
+        ecg_tensor = np.zeros((1, 5000, 12), dtype=np.float32)
+        pool._replicas[0].process.kill()
+        pool._replicas[0].process.join()
+        # The request hitting the dead worker and the one after it fail without waiting for the restart
+        started = time.monotonic()
+        for _ in range(2):
+            with pytest.raises(RuntimeError):
+                pool.predict(ecg_tensor)
+        assert time.monotonic() - started < 5
+
+        deadline = time.monotonic() + 120
+        while pool.stats()["restarting_workers"] and time.monotonic() < deadline:
+            time.sleep(0.2)
+        assert pool.stats()["worker_0_restarts"] == 1
+        assert pool.predict(ecg_tensor)[0].shape[0] == 1
+    finally:
+        pool.close()
+
+
+def test_hung_idle_worker_is_restarted_by_the_health_check(standin_model_path):
+    import os
+    import signal
+    from app.replica_pool import ReplicaPool
+
+    pool = ReplicaPool(
+        standin_model_path,
+        num_workers=1,
+        max_batch_size=2,
+        model_kwargs={"use_saved_model": False},
+        health_check_interval=0.2,
+        request_timeout=1,
+    )
+    try:
+        # A stopped process is alive but never answers the ping
+        os.kill(pool._replicas[0].process.pid, signal.SIGSTOP)
+        deadline = time.monotonic() + 120
+        while (pool.stats()["worker_0_restarts"] == 0 or pool.stats()["restarting_workers"]) and time.monotonic() < deadline:
+            time.sleep(0.1)
+        assert pool.stats()["worker_0_restarts"] == 1
+        assert pool.predict(np.zeros((1, 5000, 12), dtype=np.float32), timeout=120)[0].shape[0] == 1
+    finally:
+        pool.close()
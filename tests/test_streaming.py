@@ -0,0 +1,66 @@
+import pytest
+import numpy as np
+import yaml
+from app.ecg_processor import ECGProcessor
+from app.streaming import StreamingScorer
+from data.synthetic import write_synthetic_ecg
+
+
+class FakeTensorMap:
+    def __init__(self, shape, survival=False, days_window=None):
+        self.shape = shape
+        self.survival = survival
+        self.days_window = days_window
+
+    def is_survival_curve(self):
+        return self.survival
+
+
+class FakeModel:
+    # Classifies every other window as AF
+    model_output_names = ["survival", "sex", "age", "af"]
+    output_tensormaps = {
+        "survival": FakeTensorMap((100,), survival=True, days_window=3650),
+        "sex": FakeTensorMap((2,)),
+        "age": FakeTensorMap((1,)),
+        "af": FakeTensorMap((2,)),
+    }
+
+    def __init__(self):
+        self.windows = 0
+        self.batch_sizes = []
+
+    def predict(self, ecg_tensor):
+        n = len(ecg_tensor)
+        af_yes = (np.arange(self.windows, self.windows + n) % 2).astype(float)
+        self.windows += n
+        self.batch_sizes.append(n)
+        return [np.full((n, 100), 0.99), np.full((n, 2), 0.5), np.full((n, 1), 60.0), np.stack([af_yes, 1 - af_yes], axis=1)]
+
+
+@pytest.fixture
+def processor():
+    with open("config/config.yaml") as f:
+        config = yaml.safe_load(f)
+    return ECGProcessor(config["ecg_shape"], config["ecg_leads"], config["ecg_hd5_path"])
+
+
+def test_score_summarizes_windows(processor, tmp_path):
+    ecg_file = write_synthetic_ecg(
+        str(tmp_path / "holter.hd5"), processor.ecg_leads, processor.ecg_hd5_path, n_samples=120 * 500, seed=0
+    )
+    model = FakeModel()
+    report = StreamingScorer(model, processor, stride_seconds=10, batch_size=5).score(ecg_file)
+
+    assert report["seconds"] == 120 and report["window_seconds"] == 10
+    assert report["timeline"]["start_seconds"] == [10.0 * i for i in range(12)]
+    assert model.batch_sizes == [5, 5, 2]
+    summary = report["summary"]
+    assert summary["windows"] == 12 and summary["af_windows"] == 6
+    assert summary["af_burden"] == 0.5 and summary["first_af_start_seconds"] == 10.0
+
+
+def test_score_without_timeline(processor, tmp_path):
+    ecg_file = write_synthetic_ecg(str(tmp_path / "ecg.hd5"), processor.ecg_leads, processor.ecg_hd5_path, seed=0)
+    report = StreamingScorer(FakeModel(), processor).score(ecg_file, include_timeline=False)
+    assert "timeline" not in report and report["summary"]["windows"] == 1
@@ -0,0 +1,34 @@
+import pytest
+from app.visualizer import Visualizer
+
+
+def test_svg_bar_chart_contains_labels_and_percentages():
+    chart = Visualizer(backend="svg").render_bar_chart([0.25, 0.75], labels=["Yes", "No"])
+    assert chart.startswith("<svg") and chart.endswith("</svg>")
+    assert ">Yes<" in chart and ">No<" in chart
+    assert "25.0%" in chart and "75.0%" in chart
+
+
+def test_svg_bar_chart_escapes_labels():
+    chart = Visualizer(backend="svg").render_bar_chart([0.5, 0.5], labels=["<b>", "{x}"])
+    assert "&lt;b&gt;" in chart and "{x}" in chart
+
+
+def test_matplotlib_figures_are_not_tracked_by_pyplot():
+    plt = pytest.importorskip("matplotlib.pyplot")
+    open_figures = len(plt.get_fignums())
+    for _ in range(5):
+        Visualizer(backend="matplotlib").render_bar_chart([0.4, 0.6])
+    assert len(plt.get_fignums()) == open_figures
+
+
+def test_static_bar_chart_keeps_returning_a_figure():
+    from matplotlib.figure import Figure
+
+    assert isinstance(Visualizer.plot_probability_bar_chart([0.4, 0.6], labels=["Yes", "No"]), Figure)
+    assert Visualizer().backend == "svg"
+
+
+def test_unknown_backend():
+    with pytest.raises(ValueError):
+        Visualizer(backend="png")